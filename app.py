@@ -1,41 +1,91 @@
 import os
 import logging
+from importlib import import_module
 from flask import Flask, render_template, redirect, url_for
-from flask_migrate import Migrate
 from flask_login import LoginManager
 from flask_wtf.csrf import CSRFProtect
 from werkzeug.middleware.proxy_fix import ProxyFix
 from database import db
+import query_stats
+import metrics
+import master_data
+import rollups
+import db_config
+import db_routing
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 
-migrate = Migrate()
 login_manager = LoginManager()
 csrf = CSRFProtect()
 
-def create_app():
+# (module, blueprint, url prefix)
+BLUEPRINTS = [
+    ('auth', 'auth_bp', '/auth'),
+    ('views.main', 'main_bp', None),
+    ('views.masters', 'masters_bp', '/masters'),
+    ('views.stock_entry', 'stock_entry_bp', '/stock'),
+    ('views.stock_issue', 'stock_issue_bp', '/requests'),
+    ('views.stock_return', 'stock_return_bp', '/returns'),
+    ('views.approvals', 'approvals_bp', '/approvals'),
+    ('views.user_management', 'user_management_bp', '/admin'),
+    ('views.warehouse_management', 'warehouse_management_bp', '/warehouse'),
+    ('views.low_stock', 'low_stock_bp', '/low-stock'),
+    ('views.location_inventory', 'location_inventory_bp', '/location-inventory'),
+    ('views.reports', 'reports_bp', '/reports'),
+    ('views.admin_transactions', 'admin_transactions_bp', '/admin'),
+    ('views.hod_transactions', 'hod_transactions_bp', '/hod'),
+    ('views.audit', 'audit_bp', '/audit'),
+    ('views.metrics', 'metrics_bp', None),
+    ('views.export_jobs', 'export_jobs_bp', '/exports'),
+]
+
+# (module, click command)
+COMMANDS = [
+    ('bootstrap', 'init_db_command'),
+    ('bootstrap', 'create_admin_command'),
+    ('ledger', 'backfill_ledger_command'),
+    ('index_advisor', 'index_advice_command'),
+    ('item_search', 'rebuild_item_search_command'),
+    ('return_totals', 'check_return_totals_command'),
+    ('return_totals', 'backfill_return_totals_command'),
+    ('rollups', 'refresh_rollups_command'),
+]
+
+def create_app(config_overrides=None):
     app = Flask(__name__)
 
     # Configuration
     app.config.from_object('config.Config')
+    if config_overrides:
+        app.config.update(config_overrides)
     app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
     app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
     # Initialize extensions
+    db_config.configure(app)
     db.init_app(app)
-    migrate.init_app(app, db)
+    db_config.init_app(app)
+    db_routing.init_app(app)
+    if not app.config['FAST_STARTUP']:
+        # Flask-Migrate loads alembic, which only the "flask db" commands need
+        from flask_migrate import Migrate
+        Migrate(app, db, directory=os.path.join(app.root_path, 'migrations'))
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Please log in to access this page.'
     csrf.init_app(app)
 
-    # Import models to ensure they're registered
-    from models import User, UserRole, Department, Location, Employee, Item, StockBalance, StockEntry, StockIssueRequest, StockIssueLine, StockReturn, Audit
+    query_stats.init_app(app)
+    metrics.init_app(app)
+    master_data.init_app(app)
+    rollups.init_app(app)
+
+    from models import User
 
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return User.load_principal(int(user_id))
 
     # Add template filters
     from utils import format_ist_datetime
@@ -45,55 +95,12 @@ def create_app():
         return format_ist_datetime(dt)
     
     # Register blueprints
-    from auth import auth_bp
-    from views.main import main_bp
-    from views.masters import masters_bp
-    from views.stock_entry import stock_entry_bp
-    from views.stock_issue import stock_issue_bp
-    from views.stock_return import stock_return_bp
-    from views.approvals import approvals_bp
-    from views.user_management import user_management_bp
-    from views.warehouse_management import warehouse_management_bp
-    from views.low_stock import low_stock_bp
-    from views.location_inventory import location_inventory_bp
-    from views.reports import reports_bp
-    from views.admin_transactions import admin_transactions_bp
-    from views.hod_transactions import hod_transactions_bp
-    from views.audit import audit_bp
-
-    app.register_blueprint(auth_bp, url_prefix='/auth')
-    app.register_blueprint(main_bp)
-    app.register_blueprint(masters_bp, url_prefix='/masters')
-    app.register_blueprint(stock_entry_bp, url_prefix='/stock')
-    app.register_blueprint(stock_issue_bp, url_prefix='/requests')
-    app.register_blueprint(stock_return_bp, url_prefix='/returns')
-    app.register_blueprint(approvals_bp, url_prefix='/approvals')
-    app.register_blueprint(user_management_bp, url_prefix='/admin')
-    app.register_blueprint(warehouse_management_bp, url_prefix='/warehouse')
-    app.register_blueprint(low_stock_bp, url_prefix='/low-stock')
-    app.register_blueprint(location_inventory_bp, url_prefix='/location-inventory')
-    app.register_blueprint(reports_bp, url_prefix='/reports')
-    app.register_blueprint(admin_transactions_bp, url_prefix='/admin')
-    app.register_blueprint(hod_transactions_bp, url_prefix='/hod')
-    app.register_blueprint(audit_bp, url_prefix='/audit')
-
-    # Create tables and create single superadmin demo account
-    with app.app_context():
-        db.create_all()
-
-        # Create single superadmin demo account if no users exist
-        if User.query.count() == 0:
-            from werkzeug.security import generate_password_hash
-            admin_user = User(
-                username='admin',
-                password_hash=generate_password_hash('admin123'),
-                full_name='System Administrator',
-                email='admin@company.com',
-                role=UserRole.SUPERADMIN,
-                is_active=True
-            )
-            db.session.add(admin_user)
-            db.session.commit()
+    for module, name, url_prefix in BLUEPRINTS:
+        app.register_blueprint(getattr(import_module(module), name), url_prefix=url_prefix)
+
+    # Schema and the first admin are set up with "flask init-db" / "flask create-admin"
+    for module, name in COMMANDS:
+        app.cli.add_command(getattr(import_module(module), name))
 
     @app.errorhandler(404)
     def not_found(error):
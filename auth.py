@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, g
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import check_password_hash, generate_password_hash
 from models import User
@@ -6,6 +6,11 @@ from database import db
 
 auth_bp = Blueprint('auth', __name__)
 
+@auth_bp.before_app_request
+def _reset_principal():
+    # User.accessible_location_ids is memoized per request
+    g.pop('_accessible_location_ids', None)
+
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
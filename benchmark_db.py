@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Concurrent write benchmark for the SQLite connection profile.
+
+Runs several writer processes (stock movement transactions: read a balance,
+update it, append a ledger row) alongside reader processes (balance
+aggregates) against a scratch database, once with SQLAlchemy's default
+SQLite engine and once with the db_config profile (WAL, busy timeout,
+pragmas). Prints committed transactions per second, lock errors and commit
+latency for each.
+
+    python benchmark_db.py --writers 4 --readers 2 --seconds 10
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from config import Config
+import db_config
+
+ITEMS = 200
+LOCATIONS = 5
+
+SCHEMA = [
+    'CREATE TABLE balances (item_id INTEGER, location_id INTEGER, quantity NUMERIC NOT NULL, '
+    'PRIMARY KEY (item_id, location_id))',
+    'CREATE TABLE movements (id INTEGER PRIMARY KEY, item_id INTEGER, location_id INTEGER, '
+    'quantity NUMERIC NOT NULL, ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP)',
+]
+
+
+def settings():
+    return dict((name, getattr(Config, name)) for name in dir(Config) if name.isupper())
+
+
+def make_engine(uri, tuned):
+    if not tuned:
+        return create_engine(uri)
+    config = dict(settings(), SQLALCHEMY_DATABASE_URI=uri)
+    engine = create_engine(uri, **db_config.engine_options(config))
+    db_config.apply_pragmas(engine, db_config.sqlite_pragmas(config))
+    return engine
+
+
+def prepare(uri):
+    engine = create_engine(uri)
+    with engine.begin() as conn:
+        for statement in SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(text('INSERT INTO balances VALUES (:i, :l, 1000)'),
+                     [{'i': i, 'l': l} for i in range(ITEMS) for l in range(LOCATIONS)])
+    engine.dispose()
+
+
+def writer(uri, tuned, deadline, results):
+    engine = make_engine(uri, tuned)
+    committed, errors, latencies = 0, 0, []
+    while time.time() < deadline:
+        item, location = random.randrange(ITEMS), random.randrange(LOCATIONS)
+        quantity = random.choice([-1, 1])
+        start = time.perf_counter()
+        try:
+            with engine.begin() as conn:
+                conn.execute(text('SELECT quantity FROM balances WHERE item_id = :i AND location_id = :l'),
+                             {'i': item, 'l': location}).scalar()
+                conn.execute(text('UPDATE balances SET quantity = quantity + :q '
+                                  'WHERE item_id = :i AND location_id = :l'),
+                             {'q': quantity, 'i': item, 'l': location})
+                conn.execute(text('INSERT INTO movements (item_id, location_id, quantity) VALUES (:i, :l, :q)'),
+                             {'q': quantity, 'i': item, 'l': location})
+            committed += 1
+            latencies.append(time.perf_counter() - start)
+        except OperationalError:
+            errors += 1
+    engine.dispose()
+    results.put(('writer', committed, errors, latencies))
+
+
+def reader(uri, tuned, deadline, results):
+    engine = make_engine(uri, tuned)
+    completed, errors = 0, 0
+    while time.time() < deadline:
+        try:
+            with engine.connect() as conn:
+                conn.execute(text('SELECT location_id, SUM(quantity) FROM balances GROUP BY location_id')).all()
+                conn.execute(text('SELECT COUNT(*) FROM movements')).scalar()
+            completed += 1
+        except OperationalError:
+            errors += 1
+    engine.dispose()
+    results.put(('reader', completed, errors, []))
+
+
+def run(tuned, writers, readers, seconds):
+    directory = tempfile.mkdtemp()
+    uri = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    try:
+        prepare(uri)
+        results = multiprocessing.Queue()
+        deadline = time.time() + seconds
+        processes = [multiprocessing.Process(target=writer, args=(uri, tuned, deadline, results))
+                     for _ in range(writers)]
+        processes += [multiprocessing.Process(target=reader, args=(uri, tuned, deadline, results))
+                      for _ in range(readers)]
+        for process in processes:
+            process.start()
+        outcomes = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    writes = [o for o in outcomes if o[0] == 'writer']
+    latencies = sorted(l for o in writes for l in o[3])
+    return {
+        'commits_per_s': sum(o[1] for o in writes) / seconds,
+        'write_errors': sum(o[2] for o in writes),
+        'reads_per_s': sum(o[1] for o in outcomes if o[0] == 'reader') / seconds,
+        'read_errors': sum(o[2] for o in outcomes if o[0] == 'reader'),
+        'p50_ms': latencies[len(latencies) // 2] * 1000 if latencies else 0,
+        'p99_ms': latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    print(f'{args.writers} writers, {args.readers} readers, {args.seconds:g}s per run')
+    print(f"{'profile':<10}{'commits/s':>11}{'errors':>8}{'reads/s':>10}{'errors':>8}{'p50 ms':>9}{'p99 ms':>9}")
+    for label, tuned in (('default', False), ('tuned', True)):
+        r = run(tuned, args.writers, args.readers, args.seconds)
+        print(f"{label:<10}{r['commits_per_s']:>11.0f}{r['write_errors']:>8}{r['reads_per_s']:>10.0f}"
+              f"{r['read_errors']:>8}{r['p50_ms']:>9.2f}{r['p99_ms']:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
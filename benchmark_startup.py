@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Worker startup benchmark.
+
+Starts fresh interpreters one after another, as a process manager boots
+workers, and times in each: importing the ``app`` module (cold import of
+every extension and blueprint), the first request (the login page) and the
+first request that hits the database (logging in). Runs once with the
+default startup and once with FAST_STARTUP, against a scratch SQLite
+database prepared with ``flask init-db`` and ``flask create-admin``.
+
+    python benchmark_startup.py --workers 5
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+WORKER = '''
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.app.config['WTF_CSRF_ENABLED'] = False
+client = app.app.test_client()
+assert client.get('/auth/login').status_code == 200
+first = time.perf_counter()
+assert client.post('/auth/login', data={'username': 'bench', 'password': 'bench-password'}).status_code == 302
+login = time.perf_counter()
+print(json.dumps({'import_ms': (imported - start) * 1000, 'first_request_ms': (first - imported) * 1000,
+                  'first_login_ms': (login - first) * 1000}))
+'''
+
+
+def flask(env, *args):
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', *args], env=env, check=True,
+                   capture_output=True)
+
+
+def run(env, workers):
+    timings = []
+    for _ in range(workers):
+        result = subprocess.run([sys.executable, '-c', WORKER], env=env, check=True, capture_output=True,
+                                text=True)
+        timings.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=5)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(directory, 'bench.db')}", FAST_STARTUP='false')
+    try:
+        flask(env, 'init-db')
+        flask(env, 'create-admin', '--username', 'bench', '--password', 'bench-password',
+              '--email', 'bench@example.com')
+        print(f'{args.workers} workers per profile, median (max) in ms')
+        print(f"{'profile':<10}{'import':>16}{'first request':>18}{'first login':>16}")
+        for label, fast in (('default', 'false'), ('fast', 'true')):
+            timings = run(dict(env, FAST_STARTUP=fast), args.workers)
+            columns = ''.join(
+                f"{statistics.median(t[key] for t in timings):>{width - 8}.0f} ({max(t[key] for t in timings):>5.0f})"
+                for key, width in (('import_ms', 16), ('first_request_ms', 18), ('first_login_ms', 16)))
+            print(f'{label:<10}{columns}')
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Database setup commands.
+
+Creating the schema and the first account used to happen inside
+``create_app`` on every worker start; they are now explicit steps:
+
+    flask init-db
+    flask create-admin --username admin
+
+On an empty database ``init-db`` creates the schema from the models and
+stamps it with the newest migration. On an existing database it applies the
+pending migrations first (the same as ``flask db upgrade``), because
+``create_all`` never adds columns or indexes to tables that already exist.
+After pulling a release that ships a migration, run ``flask db upgrade`` (or
+``flask init-db`` again) before starting the workers.
+
+``init-db`` also fills the daily reporting rollups when the database already
+holds requests or stock entries from before they existed, so reports do not
+show zeros on an upgraded installation.
+"""
+
+import os
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from werkzeug.security import generate_password_hash
+from database import db
+import models  # noqa: F401  (registers every table on the metadata)
+from models import User, UserRole
+import rollups
+
+
+def create_admin(username, password, full_name, email):
+    """Add a superadmin account; returns None if the username or email is taken"""
+    taken = User.query.filter((User.username == username) | (User.email == email)).first()
+    if taken is not None:
+        return None
+    user = User(username=username, password_hash=generate_password_hash(password), full_name=full_name,
+                email=email, role=UserRole.SUPERADMIN, is_active=True)
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create or upgrade the schema and backfill the reporting rollups."""
+    from flask_migrate import Migrate, upgrade, stamp
+
+    # FAST_STARTUP leaves Flask-Migrate out of the app; this command always needs it
+    if 'migrate' not in current_app.extensions:
+        Migrate(current_app, db, directory=os.path.join(current_app.root_path, 'migrations'))
+
+    if db.inspect(db.engine).get_table_names():
+        upgrade()
+        # Tables added to the models without a migration of their own
+        db.create_all()
+        click.echo('Database upgraded.')
+    else:
+        db.create_all()
+        stamp()
+        click.echo('Database tables created.')
+    if rollups.ensure_populated():
+        click.echo('Backfilled the daily reporting rollups from existing data.')
+
+
+@click.command('create-admin')
+@click.option('--username', default='admin', show_default=True)
+@click.option('--password', prompt=True, hide_input=True, confirmation_prompt=True)
+@click.option('--full-name', default='System Administrator', show_default=True)
+@click.option('--email', default='admin@company.com', show_default=True)
+@with_appcontext
+def create_admin_command(username, password, full_name, email):
+    """Create a superadmin account."""
+    if create_admin(username, password, full_name, email) is None:
+        raise click.ClickException(f'A user named "{username}" or with email {email} already exists.')
+    click.echo(f'Created superadmin "{username}".')
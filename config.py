@@ -3,7 +3,42 @@ from datetime import timezone, timedelta
 
 class Config:
     SECRET_KEY = os.environ.get('SESSION_SECRET', 'dev-secret-key')
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///stock_management.db'
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///stock_management.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # SQLite connection pragmas (see db_config); WAL lets readers run alongside the writer
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '15000'))
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', '65536'))
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+    # Connection pool for server databases (ignored for SQLite)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '5'))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', '10'))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', '30'))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', '1800'))
+    # Read replica for report pages (see db_routing): a URL, or for SQLite a read-only pool on the same file
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL', '')
+    SQLITE_READ_ONLY_POOL = os.environ.get('SQLITE_READ_ONLY_POOL', 'false').lower() == 'true'
+    # After a user's own write, their reports read from the primary for this long
+    DB_REPLICA_STALENESS_SECONDS = int(os.environ.get('DB_REPLICA_STALENESS_SECONDS', '10'))
+    # Web workers can skip loading Flask-Migrate/alembic; leave off wherever "flask db" is run
+    FAST_STARTUP = os.environ.get('FAST_STARTUP', 'false').lower() == 'true'
+    # Seconds between background rollup refreshes in each worker (0: run "flask refresh-rollups" from cron)
+    ROLLUP_REFRESH_INTERVAL = int(os.environ.get('ROLLUP_REFRESH_INTERVAL', '60'))
     # IST timezone (UTC+5:30)
     IST_TIMEZONE = timezone(timedelta(hours=5, minutes=30))
+    # Request/return numbers reserved per worker at a time (1 = allocate inside each transaction)
+    DOCUMENT_NUMBER_BLOCK_SIZE = int(os.environ.get('DOCUMENT_NUMBER_BLOCK_SIZE', '1'))
+    # SQL instrumentation: statements slower than this, or requests running more statements, are logged
+    SLOW_QUERY_THRESHOLD_MS = int(os.environ.get('SLOW_QUERY_THRESHOLD_MS', '200'))
+    QUERY_COUNT_LOG_THRESHOLD = int(os.environ.get('QUERY_COUNT_LOG_THRESHOLD', '50'))
+    # Optional bearer token required to scrape /metrics
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # Background exports: pool threads per worker process (0 runs them inline), artifact reuse window, artifact directory
+    EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', '2'))
+    EXPORT_CACHE_TTL = int(os.environ.get('EXPORT_CACHE_TTL', '600'))
+    EXPORT_DIR = os.environ.get('EXPORT_DIR')
+    # Queued/running jobs older than this are treated as abandoned (their worker died) and failed
+    EXPORT_STALE_AFTER = int(os.environ.get('EXPORT_STALE_AFTER', '1800'))
+    # Issue/return tracker: stop counting rows past this many and show the total as "N+" (0 counts exactly)
+    AUDIT_TRACKER_COUNT_LIMIT = int(os.environ.get('AUDIT_TRACKER_COUNT_LIMIT', '0'))
@@ -1,8 +1,25 @@
-
+from flask import current_app, g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from sqlalchemy.orm import DeclarativeBase
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+
+class RoutingSession(Session):
+    """Session that sends plain SELECTs to the read replica while the request allows it (see db_routing)"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context() and current_app.extensions.get('db_replica') is not None:
+            if self._flushing or getattr(clause, 'is_dml', False):
+                # A write pins the rest of the request to the primary so it reads its own changes
+                g._db_read_replica = False
+                g._db_wrote = True
+            elif (g.get('_db_read_replica') and getattr(clause, 'is_select', False)
+                  and getattr(clause, '_for_update_arg', None) is None):
+                return current_app.extensions['db_replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(model_class=Base, session_options={'class_': RoutingSession})
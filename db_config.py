@@ -0,0 +1,74 @@
+"""
+Database connection settings.
+
+The URI comes from ``DATABASE_URL`` (default: the bundled SQLite file) and
+the engine options from the ``SQLITE_*`` / ``DB_POOL_*`` settings in
+``config.Config``, so deployments tune them through the environment.
+
+SQLite connections are opened in WAL mode with a busy timeout: readers no
+longer block the writer, and a worker that finds the database locked waits
+for it instead of failing with "database is locked". Server databases
+(PostgreSQL, MySQL) get a sized connection pool that is pre-pinged and
+recycled before idle connections are dropped by the server.
+"""
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from database import db
+
+
+def is_sqlite(uri):
+    return make_url(uri).get_backend_name() == 'sqlite'
+
+
+def sqlite_pragmas(config):
+    """(pragma, value) pairs applied to every new SQLite connection, in order"""
+    return [
+        ('journal_mode', config['SQLITE_JOURNAL_MODE']),
+        ('synchronous', config['SQLITE_SYNCHRONOUS']),
+        ('busy_timeout', config['SQLITE_BUSY_TIMEOUT_MS']),
+        # Negative values are KiB rather than pages
+        ('cache_size', -config['SQLITE_CACHE_SIZE_KB']),
+        ('mmap_size', config['SQLITE_MMAP_SIZE']),
+        ('temp_store', 'MEMORY'),
+    ]
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database URI"""
+    if is_sqlite(config['SQLALCHEMY_DATABASE_URI']):
+        # pysqlite's own lock timeout, in seconds, matching the busy_timeout pragma
+        return {'connect_args': {'timeout': config['SQLITE_BUSY_TIMEOUT_MS'] / 1000}}
+
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': True,
+    }
+
+
+def apply_pragmas(engine, pragmas):
+    """Run ``pragmas`` on each connection ``engine`` opens"""
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+
+def configure(app):
+    """Fill in SQLALCHEMY_ENGINE_OPTIONS (unless set explicitly); call before db.init_app"""
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+
+
+def init_app(app):
+    """Install the SQLite pragmas on the app's engine; call after db.init_app"""
+    if not is_sqlite(app.config['SQLALCHEMY_DATABASE_URI']):
+        return
+    with app.app_context():
+        apply_pragmas(db.engine, sqlite_pragmas(app.config))
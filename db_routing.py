@@ -0,0 +1,80 @@
+"""
+Read/write routing for the report pages.
+
+GET requests to the read-only pages in REPLICA_ROUTES send their plain
+SELECTs to a replica engine, so report scans stop competing with the
+issue/return writes for the primary's connections. The replica is
+``DATABASE_REPLICA_URL``, or, for a SQLite primary with
+``SQLITE_READ_ONLY_POOL`` set, a separate pool of read-only connections to
+the same WAL-mode file. With neither, every query uses the primary.
+
+Staleness guard: a request that writes stamps the user's session, and for
+``DB_REPLICA_STALENESS_SECONDS`` afterwards that user's pages read from the
+primary, so they see their own changes however far the replica lags. Inside
+a request, flushes and DML (e.g. a rollup refresh) always go to the primary
+and move the rest of the request there; SELECT ... FOR UPDATE does too.
+"""
+
+import time
+from flask import current_app, g, request, session
+from sqlalchemy import create_engine
+from database import db
+import db_config
+
+# Blueprints, or single endpoints, whose GET requests may read from the replica
+REPLICA_ROUTES = ('reports', 'admin_transactions', 'location_inventory', 'audit.issue_return_tracker')
+
+LAST_WRITE_KEY = 'db_last_write'
+
+
+def replica_uri(config, primary_url):
+    """URI of the read replica for ``config``, or None when reads stay on the primary"""
+    if config['DATABASE_REPLICA_URL']:
+        return config['DATABASE_REPLICA_URL']
+    if (config['SQLITE_READ_ONLY_POOL'] and primary_url.get_backend_name() == 'sqlite'
+            and primary_url.database not in (None, '', ':memory:')):
+        return f'sqlite:///file:{primary_url.database}?mode=ro&uri=true'
+    return None
+
+
+def replica_pragmas(config):
+    """The primary's SQLite pragmas minus those that write, plus query_only"""
+    return [(name, value) for name, value in db_config.sqlite_pragmas(config)
+            if name not in ('journal_mode', 'synchronous')] + [('query_only', 'ON')]
+
+
+def create_replica_engine(config, uri):
+    engine = create_engine(uri, **db_config.engine_options(dict(config, SQLALCHEMY_DATABASE_URI=uri)))
+    if db_config.is_sqlite(uri):
+        db_config.apply_pragmas(engine, replica_pragmas(config))
+    return engine
+
+
+def reads_from_replica():
+    """Whether the current request may read from the replica"""
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if request.blueprint not in REPLICA_ROUTES and request.endpoint not in REPLICA_ROUTES:
+        return False
+    last_write = session.get(LAST_WRITE_KEY)
+    return last_write is None or time.time() - last_write >= current_app.config['DB_REPLICA_STALENESS_SECONDS']
+
+
+def init_app(app):
+    """Create the replica engine and the per-request routing hooks; call after db.init_app"""
+    with app.app_context():
+        uri = replica_uri(app.config, db.engine.url)
+    if uri is None:
+        return
+    app.extensions['db_replica'] = create_replica_engine(app.config, uri)
+
+    @app.before_request
+    def _route_reads():
+        g._db_wrote = False
+        g._db_read_replica = reads_from_replica()
+
+    @app.after_request
+    def _remember_write(response):
+        if g.get('_db_wrote'):
+            session[LAST_WRITE_KEY] = time.time()
+        return response
@@ -0,0 +1,194 @@
+"""
+Background report exports.
+
+Exports are recorded as ExportJob rows and run on a small per-process thread
+pool, so the web worker that accepted the request is free again right away.
+Each job writes a gzipped CSV under EXPORT_DIR (default: instance/exports).
+The UI polls the job's status and downloads the artifact when it is done.
+
+A finished export is reused for identical requests (same kind, filters and
+visibility scope) until it is EXPORT_CACHE_TTL seconds old. An identical
+export that is still queued or running is joined instead of started again,
+unless it has been in flight longer than EXPORT_STALE_AFTER seconds: jobs
+live on in-process threads, so one whose worker was restarted never
+finishes, and purge_expired marks it failed so the export is resubmitted.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from flask import current_app
+from database import db
+from models import ExportJob, ExportStatus, User, UserRole
+from exports import (csv_chunks, request_rows, stock_balance_rows, department_stats_rows,
+                     full_balance_rows, REQUESTS_HEADER, STOCK_BALANCES_HEADER,
+                     DEPARTMENT_STATS_HEADER, FULL_BALANCE_HEADER)
+from utils import get_ist_now
+
+# kind -> (filename stem, header, rows(params, user))
+EXPORTS = {
+    'requests': ('stock_requests', REQUESTS_HEADER, lambda params, user: request_rows()),
+    'stock': ('stock_balances', STOCK_BALANCES_HEADER, lambda params, user: stock_balance_rows()),
+    'departments': ('department_stats', DEPARTMENT_STATS_HEADER, lambda params, user: department_stats_rows()),
+    'full_balance': ('full_balance_report', FULL_BALANCE_HEADER, full_balance_rows),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(app):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=app.config.get('EXPORT_WORKERS', 2),
+                                           thread_name_prefix='export')
+        return _executor
+
+
+def export_dir(app=None):
+    app = app or current_app
+    path = app.config.get('EXPORT_DIR') or os.path.join(app.instance_path, 'exports')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _scope(kind, user):
+    # Only the full-balance export depends on who asks (HODs see their department)
+    if kind != 'full_balance' or user.role != UserRole.HOD:
+        return 'all'
+    return f'department:{user.managed_department.id if user.managed_department else None}'
+
+
+def cache_key(kind, params, user):
+    payload = json.dumps([kind, params, _scope(kind, user)], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def can_access(job, user):
+    """Superadmins, the requester, and anyone whose identical request would share the artifact"""
+    return (user.role == UserRole.SUPERADMIN or job.requested_by == user.id or
+            cache_key(job.kind, json.loads(job.params or '{}'), user) == job.cache_key)
+
+
+def submit_export(kind, params, user):
+    """Return a job for the export, reusing a cached or in-flight one when possible"""
+    if kind not in EXPORTS:
+        raise ValueError(f'Unknown export type: {kind}')
+
+    purge_expired()
+
+    key = cache_key(kind, params, user)
+    existing = ExportJob.query.filter(
+        ExportJob.cache_key == key,
+        db.or_(
+            db.and_(ExportJob.status.in_([ExportStatus.QUEUED, ExportStatus.RUNNING]),
+                    db.func.coalesce(ExportJob.started_at, ExportJob.created_at) > _stale_cutoff()),
+            db.and_(ExportJob.status == ExportStatus.DONE, ExportJob.expires_at > get_ist_now())
+        )
+    ).order_by(ExportJob.id.desc()).first()
+    if existing and (existing.status != ExportStatus.DONE or os.path.exists(existing.file_path)):
+        return existing
+
+    job = ExportJob(kind=kind, params=json.dumps(params), cache_key=key, requested_by=user.id)
+    db.session.add(job)
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    if app.config.get('EXPORT_WORKERS', 2) > 0:
+        _get_executor(app).submit(run_job, app, job.id)
+    else:
+        run_job(app, job.id)
+        db.session.refresh(job)
+    return job
+
+
+def run_job(app, job_id):
+    """Produce a job's artifact (runs on a pool thread with its own app context and session)"""
+    with app.app_context():
+        job = db.session.get(ExportJob, job_id)
+        job.status = ExportStatus.RUNNING
+        job.started_at = get_ist_now()
+        db.session.commit()
+
+        stem, header, make_rows = EXPORTS[job.kind]
+        filename = f'{stem}_{get_ist_now().strftime("%Y%m%d_%H%M")}.csv.gz'
+        path = os.path.join(export_dir(app), f'{job.id}_{filename}')
+        try:
+            user = db.session.get(User, job.requested_by)
+            counted = _Counter(make_rows(json.loads(job.params or '{}'), user))
+            with gzip.open(path, 'wt', encoding='utf-8', newline='') as artifact:
+                for chunk in csv_chunks(header, counted):
+                    artifact.write(chunk)
+
+            job.status = ExportStatus.DONE
+            job.file_path = path
+            job.filename = filename
+            job.row_count = counted.count
+        except Exception as e:
+            db.session.rollback()
+            app.logger.exception('Export job %s failed', job_id)
+            if os.path.exists(path):
+                os.remove(path)
+            job = db.session.get(ExportJob, job_id)
+            job.status = ExportStatus.FAILED
+            job.error = str(e)
+        finally:
+            job.finished_at = get_ist_now()
+            job.expires_at = job.finished_at + timedelta(seconds=app.config.get('EXPORT_CACHE_TTL', 600))
+            db.session.commit()
+            db.session.remove()
+
+
+class _Counter:
+    """Iterator wrapper that counts the rows it passes through"""
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.count = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = next(self.rows)
+        self.count += 1
+        return row
+
+
+def _stale_cutoff():
+    return get_ist_now() - timedelta(seconds=current_app.config.get('EXPORT_STALE_AFTER', 1800))
+
+
+def fail_abandoned():
+    """Mark queued/running jobs older than EXPORT_STALE_AFTER failed; returns how many"""
+    now = get_ist_now()
+    abandoned = ExportJob.query.filter(
+        ExportJob.status.in_([ExportStatus.QUEUED, ExportStatus.RUNNING]),
+        db.func.coalesce(ExportJob.started_at, ExportJob.created_at) <= _stale_cutoff()
+    ).all()
+    for job in abandoned:
+        job.status = ExportStatus.FAILED
+        job.error = 'Abandoned: the worker running this export stopped before it finished.'
+        job.finished_at = now
+        job.expires_at = now
+    return len(abandoned)
+
+
+def purge_expired():
+    """Fail abandoned jobs, then delete artifacts and job rows past their cache lifetime; returns the number removed"""
+    fail_abandoned()
+    expired = ExportJob.query.filter(
+        ExportJob.status.in_([ExportStatus.DONE, ExportStatus.FAILED]),
+        ExportJob.expires_at <= get_ist_now()
+    ).all()
+    for job in expired:
+        if job.file_path and os.path.exists(job.file_path):
+            os.remove(job.file_path)
+        db.session.delete(job)
+    db.session.commit()
+    return len(expired)
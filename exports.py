@@ -0,0 +1,288 @@
+"""
+CSV exports.
+
+Each export is a ``(header, rows)`` pair where ``rows`` is a generator that
+reads its query with ``yield_per`` (a server-side cursor on PostgreSQL, an
+incrementally stepped statement on SQLite). ``csv_response`` streams the
+encoded lines as they are produced, so memory stays flat and the first bytes
+go out as soon as the first batch is fetched, whatever the row count.
+"""
+
+import csv
+from itertools import islice
+from flask import Response, stream_with_context
+from sqlalchemy.orm import joinedload
+from database import db
+from models import (StockIssueRequest, StockBalance, Item, User, Department, Location, UserRole,
+                    StockMovement)
+from ledger import movement_history, balance_after, reference_labels
+from utils import convert_to_ist
+from reporting import department_request_stats
+
+# Rows fetched per round trip while streaming
+EXPORT_BATCH_SIZE = 500
+
+# CSV lines joined into one chunk before it is handed to the server
+_LINES_PER_CHUNK = 100
+
+
+class _LineBuffer:
+    """File-like target for csv.writer that hands back each formatted line"""
+
+    def write(self, line):
+        return line
+
+
+def _ist(dt):
+    return convert_to_ist(dt).strftime('%Y-%m-%d %H:%M IST') if dt else ''
+
+
+def csv_chunks(header, rows):
+    """Yield the CSV text in chunks of a few lines"""
+    writer = csv.writer(_LineBuffer())
+    chunk = [writer.writerow(header)]
+    for row in rows:
+        chunk.append(writer.writerow(row))
+        if len(chunk) >= _LINES_PER_CHUNK:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def csv_response(filename, header, rows):
+    """Stream an export as a CSV attachment"""
+    response = Response(stream_with_context(csv_chunks(header, rows)), mimetype='text/csv')
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+
+REQUESTS_HEADER = ['Request No', 'Created Date', 'Requester', 'Department',
+                   'Location Office', 'Location Room', 'Purpose', 'Status',
+                   'Approved Date', 'Issued Date']
+
+
+def request_rows():
+    query = db.session.query(
+        StockIssueRequest.request_no,
+        StockIssueRequest.created_at,
+        User.full_name.label('requester'),
+        Department.name.label('department'),
+        Location.office.label('location_office'),
+        Location.room.label('location_room'),
+        StockIssueRequest.purpose,
+        StockIssueRequest.status,
+        StockIssueRequest.approved_at,
+        StockIssueRequest.issued_at
+    ).join(User, StockIssueRequest.requester_id == User.id)\
+     .join(Department, StockIssueRequest.department_id == Department.id)\
+     .join(Location, StockIssueRequest.location_id == Location.id)\
+     .order_by(StockIssueRequest.created_at.desc())
+
+    for req in query.yield_per(EXPORT_BATCH_SIZE):
+        yield [
+            req.request_no,
+            _ist(req.created_at),
+            req.requester,
+            req.department,
+            req.location_office,
+            req.location_room,
+            req.purpose,
+            req.status.value if hasattr(req.status, 'value') else req.status,
+            _ist(req.approved_at),
+            _ist(req.issued_at)
+        ]
+
+
+STOCK_BALANCES_HEADER = ['Item Code', 'Item Name', 'Department', 'Location Office',
+                         'Location Room', 'Current Stock', 'Low Stock Threshold']
+
+
+def stock_balance_rows():
+    query = db.session.query(
+        Item.code.label('item_code'),
+        Item.name.label('item_name'),
+        Item.low_stock_threshold,
+        Department.name.label('department_name'),
+        Location.office.label('location_office'),
+        Location.room.label('location_room'),
+        StockBalance.quantity
+    ).join(StockBalance, Item.id == StockBalance.item_id
+    ).join(Location, StockBalance.location_id == Location.id
+    ).outerjoin(Department, Item.department_id == Department.id
+    ).order_by(Item.name)
+
+    for balance in query.yield_per(EXPORT_BATCH_SIZE):
+        yield [
+            balance.item_code,
+            balance.item_name,
+            balance.department_name or 'N/A',
+            balance.location_office,
+            balance.location_room,
+            float(balance.quantity),
+            balance.low_stock_threshold
+        ]
+
+
+DEPARTMENT_STATS_HEADER = ['Department', 'Total Requests', 'Pending', 'Approved', 'Issued',
+                           'Rejected', 'Efficiency %']
+
+
+def department_stats_rows():
+    # One aggregate row per department, so there is nothing to stream from the cursor
+    for stat in department_request_stats():
+        yield [
+            stat['name'],
+            stat['total_requests'],
+            stat['pending_requests'],
+            stat['approved_requests'],
+            stat['issued_requests'],
+            stat['rejected_requests'],
+            stat['efficiency']
+        ]
+
+
+STOCK_HISTORY_HEADER = ['Date', 'Type', 'Reference', 'Quantity', 'Balance', 'User', 'Remarks']
+
+
+def stock_history_rows(item_id, location_id, date_from=None, date_to=None):
+    """Every ledger movement in the range, newest first, with the balance after it"""
+    movements = iter(movement_history(item_id, location_id, date_from, date_to).options(
+        joinedload(StockMovement.user)).yield_per(EXPORT_BATCH_SIZE))
+    running = None
+    while True:
+        batch = list(islice(movements, EXPORT_BATCH_SIZE))
+        if not batch:
+            break
+        if running is None:
+            running = balance_after(batch[0])
+        labels = reference_labels(batch)
+        for movement in batch:
+            yield [
+                _ist(movement.ts),
+                movement.movement_type.value,
+                labels[(movement.reference_type, movement.reference_id)],
+                float(movement.quantity),
+                float(running),
+                movement.user.full_name if movement.user else 'System',
+                movement.remarks or ''
+            ]
+            running -= movement.quantity
+
+
+def full_balance_filters(args):
+    """Parse the full-balance report filters from request args"""
+    return {
+        'department_id': args.get('department_id', type=int),
+        'location_id': args.get('location_id', type=int),
+        'show_zero_stock': args.get('show_zero_stock', 'no') == 'yes',
+        'show_low_stock_only': args.get('show_low_stock_only', 'no') == 'yes',
+        'search': args.get('search', '').strip(),
+        'sort_by': args.get('sort_by', 'item_code'),
+        'sort_order': args.get('sort_order', 'asc'),
+    }
+
+
+def full_balance_query(filters, user):
+    """Balance rows for the full-balance report, restricted to what ``user`` may see"""
+    query = db.session.query(
+        Item.code.label('item_code'),
+        Item.name.label('item_name'),
+        Item.make,
+        Item.variant,
+        Item.low_stock_threshold,
+        Department.name.label('department_name'),
+        Location.office.label('location_office'),
+        Location.room.label('location_room'),
+        StockBalance.quantity,
+        StockBalance.last_updated
+    ).select_from(Item).outerjoin(
+        Department, Item.department_id == Department.id
+    ).join(
+        StockBalance, Item.id == StockBalance.item_id
+    ).join(
+        Location, StockBalance.location_id == Location.id
+    )
+
+    search_query = filters.get('search')
+    if search_query:
+        query = query.filter(db.or_(
+            Item.code.ilike(f'%{search_query}%'),
+            Item.name.ilike(f'%{search_query}%'),
+            Item.make.ilike(f'%{search_query}%'),
+            Item.variant.ilike(f'%{search_query}%'),
+            Department.name.ilike(f'%{search_query}%'),
+            Location.office.ilike(f'%{search_query}%'),
+            Location.room.ilike(f'%{search_query}%')
+        ))
+
+    if filters.get('department_id'):
+        query = query.filter(Item.department_id == filters['department_id'])
+
+    if filters.get('location_id'):
+        query = query.filter(StockBalance.location_id == filters['location_id'])
+
+    if not filters.get('show_zero_stock'):
+        query = query.filter(StockBalance.quantity > 0)
+
+    if filters.get('show_low_stock_only'):
+        query = query.filter(StockBalance.quantity <= Item.low_stock_threshold)
+
+    # Filter based on user role
+    if user.role == UserRole.HOD:
+        if user.managed_department:
+            query = query.filter(
+                db.or_(
+                    Item.department_id == user.managed_department.id,
+                    Item.department_id.is_(None)
+                )
+            )
+        else:
+            # HOD with no managed department sees nothing
+            query = query.filter(Item.department_id == -1)
+
+    sort_column_map = {
+        'item_code': Item.code,
+        'item_name': Item.name,
+        'department': Department.name,
+        'location': Location.office,
+        'quantity': StockBalance.quantity,
+        'threshold': Item.low_stock_threshold,
+        'last_updated': StockBalance.last_updated
+    }
+
+    sort_by = filters.get('sort_by')
+    if sort_by in sort_column_map:
+        sort_column = sort_column_map[sort_by]
+        ordered = sort_column.desc() if filters.get('sort_order') == 'desc' else sort_column.asc()
+        if sort_by == 'department':
+            ordered = ordered.nullslast()
+        query = query.order_by(ordered)
+    else:
+        # Default sort by item code ascending
+        query = query.order_by(Item.code.asc())
+
+    return query
+
+
+FULL_BALANCE_HEADER = ['Item Code', 'Item Name', 'Make', 'Variant', 'Department',
+                       'Location Office', 'Location Room', 'Current Stock',
+                       'Low Stock Threshold', 'Stock Status', 'Last Updated']
+
+
+def full_balance_rows(filters, user):
+    for row in full_balance_query(filters, user).yield_per(EXPORT_BATCH_SIZE):
+        stock_status = 'Low Stock' if row.quantity <= row.low_stock_threshold else 'Normal'
+        yield [
+            row.item_code,
+            row.item_name,
+            row.make or '',
+            row.variant or '',
+            row.department_name or 'No Department',
+            row.location_office,
+            row.location_room,
+            float(row.quantity),
+            row.low_stock_threshold,
+            stock_status,
+            _ist(row.last_updated)
+        ]
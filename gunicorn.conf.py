@@ -0,0 +1,12 @@
+"""
+Gunicorn settings, picked up automatically when gunicorn starts in this directory.
+
+Worker count, bind address and timeouts are left to the command line; this
+file only holds the server hooks the app depends on.
+"""
+
+
+def child_exit(server, worker):
+    """Drop an exited worker's live Prometheus gauges (see metrics.py)"""
+    import metrics
+    metrics.mark_worker_dead(worker.pid)
@@ -0,0 +1,109 @@
+"""
+Query plan advisor for the app's hot access paths.
+
+Runs EXPLAIN QUERY PLAN over a canonical set of queries (the filters the
+views actually issue) and flags any step that scans a whole table instead of
+searching an index. Run ``flask index-advice`` after changing a view or an
+index; ``--strict`` exits non-zero when a full scan is found.
+"""
+
+import re
+from datetime import datetime, timedelta
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import text
+from database import db
+from models import (StockIssueRequest, StockIssueLine, StockReturn, StockEntry, Audit,
+                    RequestStatus, ReturnStatus)
+
+# "SCAN stock_returns" is a full scan; "SCAN t USING [COVERING] INDEX ..." walks an index in order
+_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+_NOT_A_TABLE = {'CONSTANT', 'SUBQUERY'}
+
+
+def canonical_queries():
+    """(name, query) pairs mirroring the filters used by the views"""
+    since = datetime.utcnow() - timedelta(days=30)
+    return [
+        ('pending approvals (department)', StockIssueRequest.query.filter_by(
+            department_id=1, status=RequestStatus.PENDING
+        ).order_by(StockIssueRequest.created_at.desc())),
+        ('pending approvals (all)', StockIssueRequest.query.filter_by(
+            status=RequestStatus.PENDING
+        ).order_by(StockIssueRequest.created_at.desc())),
+        ('my requests', StockIssueRequest.query.filter_by(
+            requester_id=1
+        ).order_by(StockIssueRequest.created_at.desc()).limit(20)),
+        ('issued since', StockIssueRequest.query.filter(
+            StockIssueRequest.issued_at >= since
+        )),
+        ('request lines', StockIssueLine.query.filter_by(request_id=1)),
+        ('item issue history', StockIssueLine.query.filter_by(item_id=1)),
+        ('completed returns for line', StockReturn.query.filter_by(
+            issue_line_id=1, status=ReturnStatus.COMPLETED
+        )),
+        ('pending returns', StockReturn.query.filter_by(
+            status=ReturnStatus.PENDING
+        ).order_by(StockReturn.created_at.desc()).limit(20)),
+        ('my returns', StockReturn.query.filter_by(
+            returned_by=1
+        ).order_by(StockReturn.created_at.desc()).limit(20)),
+        ('entries for item at location', StockEntry.query.filter_by(
+            item_id=1, location_id=1
+        ).order_by(StockEntry.created_at.desc())),
+        ('entries since', StockEntry.query.filter(StockEntry.created_at >= since)),
+        ('audit trail for entity', Audit.query.filter_by(
+            entity_type='StockIssueRequest', entity_id=1
+        ).order_by(Audit.timestamp.desc())),
+    ]
+
+
+def explain(query):
+    """Return the EXPLAIN QUERY PLAN detail lines for an ORM query or selectable"""
+    statement = getattr(query, 'statement', query)
+    compiled = statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+    rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {compiled}'))
+    return [row[-1] for row in rows]
+
+
+def full_scans(plan):
+    """Tables read with a full scan in a plan"""
+    tables = []
+    for step in plan:
+        match = _SCAN.match(step)
+        if match and 'USING' not in step and match.group(1) not in _NOT_A_TABLE:
+            tables.append(match.group(1))
+    return tables
+
+
+def advise(queries=None):
+    """Explain each query; returns [(name, plan, scanned_tables)]"""
+    results = []
+    for name, query in (queries or canonical_queries()):
+        plan = explain(query)
+        results.append((name, plan, full_scans(plan)))
+    return results
+
+
+@click.command('index-advice')
+@click.option('--strict', is_flag=True, help='Exit with status 1 if any query does a full table scan.')
+@click.option('--verbose', is_flag=True, help='Print the full plan for every query.')
+@with_appcontext
+def index_advice_command(strict, verbose):
+    """Report full table scans in the app's canonical queries (SQLite only)."""
+    if db.engine.dialect.name != 'sqlite':
+        raise click.ClickException('index-advice uses EXPLAIN QUERY PLAN and only supports SQLite.')
+
+    flagged = 0
+    for name, plan, scans in advise():
+        if scans:
+            flagged += 1
+            click.echo(f'FULL SCAN  {name}: {", ".join(scans)}')
+        else:
+            click.echo(f'ok         {name}')
+        if verbose or scans:
+            for step in plan:
+                click.echo(f'             {step}')
+
+    if strict and flagged:
+        raise SystemExit(1)
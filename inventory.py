@@ -0,0 +1,154 @@
+"""
+Stock balance mutation service.
+
+All changes to StockBalance.quantity go through here. Each change is a
+single conditional UPDATE evaluated by the database, so concurrent workers
+can never both pass an availability check and overdraw a balance. Each
+change is mirrored in the movement ledger in the same transaction.
+
+A request or return being processed is first claimed with ``claim`` so
+that two workers cannot process the same document and move its stock twice.
+"""
+
+from collections import namedtuple
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import update, tuple_
+from sqlalchemy.exc import IntegrityError
+from database import db
+from models import StockBalance, StockIssueLine, ReturnStatus, MovementType
+from ledger import record_movement
+from utils import get_ist_now
+
+# A deduction that could not be applied; ``available`` is the balance seen after the failed attempt
+Shortage = namedtuple('Shortage', ['item_id', 'location_id', 'requested', 'available', 'reference'])
+
+
+def claim(query):
+    """Lock the first row of ``query`` until commit, or return None if another worker holds it.
+
+    Uses SELECT ... FOR UPDATE SKIP LOCKED, so a concurrent claim fails fast
+    instead of queueing behind the holder; put the state the caller requires
+    (e.g. a status) in the query so a row processed meanwhile is not returned.
+    SQLite, which allows only one writer, ignores the clause.
+    """
+    return query.with_for_update(skip_locked=True).populate_existing().first()
+
+
+def current_quantity(item_id, location_id):
+    """Read the committed balance for an item/location (0 when no balance row exists)"""
+    quantity = db.session.query(StockBalance.quantity).filter_by(
+        item_id=item_id, location_id=location_id
+    ).scalar()
+    return quantity if quantity is not None else Decimal('0')
+
+
+def quantities(pairs):
+    """Read balances for many (item_id, location_id) pairs in one query (0 where no row exists)"""
+    pairs = set(pairs)
+    found = {}
+    if pairs:
+        rows = db.session.query(StockBalance.item_id, StockBalance.location_id, StockBalance.quantity).filter(
+            tuple_(StockBalance.item_id, StockBalance.location_id).in_(pairs)
+        )
+        found = dict(((item_id, location_id), quantity) for item_id, location_id, quantity in rows)
+    return dict((pair, found.get(pair, Decimal('0'))) for pair in pairs)
+
+
+def deduct(item_id, location_id, quantity, user_id=None, reference_type=None, reference_id=None):
+    """Atomically remove stock; returns False (and changes nothing) if the balance is insufficient"""
+    quantity = Decimal(quantity)
+    result = db.session.execute(
+        update(StockBalance).where(
+            StockBalance.item_id == item_id,
+            StockBalance.location_id == location_id,
+            StockBalance.quantity >= quantity
+        ).values(
+            quantity=StockBalance.quantity - quantity,
+            last_updated=get_ist_now()
+        ).execution_options(synchronize_session='fetch')
+    )
+    if result.rowcount != 1:
+        return False
+
+    record_movement(item_id, location_id, MovementType.OUT, quantity, user_id=user_id,
+                    reference_type=reference_type, reference_id=reference_id)
+    return True
+
+
+def credit(item_id, location_id, quantity, movement_type=MovementType.IN, user_id=None,
+           reference_type=None, reference_id=None):
+    """Atomically add stock, creating the balance row on first receipt"""
+    quantity = Decimal(quantity)
+    if not _increment(item_id, location_id, quantity):
+        try:
+            with db.session.begin_nested():
+                db.session.add(StockBalance(item_id=item_id, location_id=location_id, quantity=quantity))
+        except IntegrityError:
+            # Another worker created the row first; apply to it instead
+            if not _increment(item_id, location_id, quantity):
+                raise
+
+    record_movement(item_id, location_id, movement_type, quantity, user_id=user_id,
+                    reference_type=reference_type, reference_id=reference_id)
+
+
+def _increment(item_id, location_id, quantity):
+    result = db.session.execute(
+        update(StockBalance).where(
+            StockBalance.item_id == item_id,
+            StockBalance.location_id == location_id
+        ).values(
+            quantity=StockBalance.quantity + quantity,
+            last_updated=get_ist_now()
+        ).execution_options(synchronize_session='fetch')
+    )
+    return result.rowcount == 1
+
+
+def deduct_many(location_id, deductions, user_id=None, reference_type=None):
+    """Apply several deductions at one location.
+
+    ``deductions`` is an iterable of ``(item_id, quantity, reference)`` where
+    ``reference`` is an id (e.g. an issue line id) recorded on the movement and
+    echoed back in any Shortage. Every line is attempted so that all failures
+    are reported together; the caller should roll back if any are returned.
+    """
+    shortages = []
+    for item_id, quantity, reference in deductions:
+        if not deduct(item_id, location_id, quantity, user_id=user_id,
+                      reference_type=reference_type, reference_id=reference):
+            shortages.append(Shortage(item_id, location_id, Decimal(quantity),
+                                      current_quantity(item_id, location_id), reference))
+    return shortages
+
+
+def complete_return(stock_return, user_id, remarks=None):
+    """Complete a pending return: add it to the line's returned total and put the stock back.
+
+    The total is raised with one conditional UPDATE, so concurrent completions
+    can never return more than was issued; returns False (changing nothing) if
+    this return would. The caller commits.
+    """
+    line = stock_return.issue_line
+    quantity = Decimal(stock_return.quantity_returned)
+    result = db.session.execute(
+        update(StockIssueLine).where(
+            StockIssueLine.id == line.id,
+            StockIssueLine.quantity_returned_total + quantity <= StockIssueLine.quantity_issued
+        ).values(
+            quantity_returned_total=StockIssueLine.quantity_returned_total + quantity
+        ).execution_options(synchronize_session='fetch')
+    )
+    if result.rowcount != 1:
+        return False
+
+    stock_return.status = ReturnStatus.COMPLETED
+    stock_return.processed_by = user_id
+    stock_return.processed_at = datetime.utcnow()
+    if remarks is not None:
+        stock_return.remarks = remarks
+
+    credit(line.item_id, line.request.location_id, quantity, movement_type=MovementType.RETURN,
+           user_id=user_id, reference_type='StockReturn', reference_id=stock_return.id)
+    return True
@@ -0,0 +1,160 @@
+"""
+Typeahead search over the item master.
+
+On SQLite the items are indexed in an FTS5 table (items_fts) using the
+trigram tokenizer, so any fragment of three or more characters matches
+anywhere in the code, name, make, variant or description ("crew" finds
+"Screwdriver", "4GB" finds "DDR4 4GB"). The index is an external-content
+table kept in step with ``items`` by triggers; ``flask rebuild-item-search``
+recreates it for databases created before it existed. Shorter fragments and
+databases without the index fall back to LIKE matching.
+
+Results are ranked exact code first, then code prefix, then FTS relevance,
+and are paged without a COUNT by fetching one row past the page.
+"""
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, text, DDL, literal_column, table, column
+from database import db
+from models import Item, Department, UserRole
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+
+# Trigram tokens need at least three characters
+_MIN_FTS_TERM = 3
+
+_items_fts = table('items_fts', column('rowid'), column('rank'))
+
+_CREATE_INDEX = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+        code, name, make, variant, description,
+        content='items', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS items_fts_insert AFTER INSERT ON items BEGIN
+        INSERT INTO items_fts(rowid, code, name, make, variant, description)
+        VALUES (new.id, new.code, new.name, new.make, new.variant, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS items_fts_delete AFTER DELETE ON items BEGIN
+        INSERT INTO items_fts(items_fts, rowid, code, name, make, variant, description)
+        VALUES ('delete', old.id, old.code, old.name, old.make, old.variant, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS items_fts_update AFTER UPDATE ON items BEGIN
+        INSERT INTO items_fts(items_fts, rowid, code, name, make, variant, description)
+        VALUES ('delete', old.id, old.code, old.name, old.make, old.variant, old.description);
+        INSERT INTO items_fts(rowid, code, name, make, variant, description)
+        VALUES (new.id, new.code, new.name, new.make, new.variant, new.description);
+    END""",
+]
+
+# Keep the index alongside the items table whenever create_all/drop_all run
+for _statement in _CREATE_INDEX:
+    event.listen(Item.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+event.listen(Item.__table__, 'before_drop',
+             DDL('DROP TABLE IF EXISTS items_fts').execute_if(dialect='sqlite'))
+
+
+def create_index(connection):
+    """Create the FTS table and triggers if missing and (re)build the index from items"""
+    for statement in _CREATE_INDEX:
+        connection.execute(text(statement))
+    connection.execute(text("INSERT INTO items_fts(items_fts) VALUES ('rebuild')"))
+
+
+def has_index():
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    return db.session.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'items_fts'")
+    ).first() is not None
+
+
+def visible_department_ids(user):
+    """Departments whose items ``user`` may pick (None means every item)
+
+    Mirrors stock entry: a HOD with a department sees that department's items
+    plus unassigned ones; everyone else sees all items.
+    """
+    if user.role == UserRole.HOD and user.managed_department:
+        return [user.managed_department.id]
+    return None
+
+
+def _phrase(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_items(q, user, page=1, per_page=DEFAULT_PAGE_SIZE):
+    """Return (items, has_more) for one page of matches, best first"""
+    per_page = max(1, min(per_page, MAX_PAGE_SIZE))
+    page = max(1, page)
+    terms = q.split()
+
+    query = db.session.query(Item).outerjoin(Department, Item.department_id == Department.id)\
+        .add_columns(Department.name.label('department_name'))
+
+    department_ids = visible_department_ids(user)
+    if department_ids is not None:
+        query = query.filter(db.or_(Item.department_id.in_(department_ids), Item.department_id.is_(None)))
+
+    fts_terms = [t for t in terms if len(t) >= _MIN_FTS_TERM]
+    like_terms = [t for t in terms if len(t) < _MIN_FTS_TERM]
+    ranking = []
+
+    if fts_terms and has_index():
+        match = ' AND '.join(_phrase(t) for t in fts_terms)
+        query = query.join(_items_fts, _items_fts.c.rowid == Item.id)\
+            .filter(literal_column('items_fts').op('MATCH')(match))
+        ranking.append(_items_fts.c.rank)
+    else:
+        like_terms = terms
+
+    for term in like_terms:
+        pattern = f'%{_escape_like(term)}%'
+        query = query.filter(db.or_(*[field.ilike(pattern, escape='\\') for field in
+                                      (Item.code, Item.name, Item.make, Item.variant, Item.description)]))
+
+    if q.strip():
+        whole = _escape_like(q.strip())
+        query = query.order_by(
+            db.case((Item.code.ilike(whole, escape='\\'), 0),
+                    (Item.code.ilike(f'{whole}%', escape='\\'), 1),
+                    else_=2),
+            *ranking
+        )
+    query = query.order_by(Item.code)
+
+    rows = query.offset((page - 1) * per_page).limit(per_page + 1).all()
+    return rows[:per_page], len(rows) > per_page
+
+
+def as_json(row):
+    """Search result in the shape select2 expects, plus the fields the forms display"""
+    item, department_name = row
+    return {
+        'id': item.id,
+        'text': f'{item.code} - {item.name}',
+        'code': item.code,
+        'name': item.name,
+        'make': item.make,
+        'variant': item.variant,
+        'description': item.description,
+        'department': department_name,
+    }
+
+
+@click.command('rebuild-item-search')
+@with_appcontext
+def rebuild_item_search_command():
+    """Create or rebuild the FTS index behind the item search API"""
+    if db.engine.dialect.name != 'sqlite':
+        click.echo('Item search uses LIKE matching on this database; nothing to build.')
+        return
+    with db.engine.begin() as connection:
+        create_index(connection)
+    click.echo('Item search index rebuilt.')
@@ -0,0 +1,289 @@
+"""
+Append-only stock movement ledger.
+
+Every change to a StockBalance is mirrored by a StockMovement row written in
+the same transaction. Point-in-time balances are answered from the most
+recent StockSnapshot checkpoint plus the (at most SNAPSHOT_INTERVAL)
+movements recorded after it, so lookups never replay the full history.
+"""
+
+from datetime import datetime
+from decimal import Decimal
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func
+from database import db
+from models import (StockMovement, StockSnapshot, MovementType, StockBalance, StockEntry,
+                    StockIssueRequest, StockIssueLine, StockReturn, ReturnStatus)
+from utils import get_ist_now, convert_to_ist
+
+# Number of movements per item/location between balance checkpoints
+SNAPSHOT_INTERVAL = 100
+
+
+def record_movement(item_id, location_id, movement_type, quantity, user_id=None,
+                    reference_type=None, reference_id=None, remarks=None, ts=None):
+    """Append a movement to the ledger (caller commits).
+
+    ``quantity`` is the magnitude for IN/OUT/RETURN; OUT is stored negative.
+    ADJUST movements take a signed quantity.
+    """
+    quantity = Decimal(quantity)
+    if movement_type == MovementType.OUT:
+        quantity = -abs(quantity)
+    elif movement_type in (MovementType.IN, MovementType.RETURN):
+        quantity = abs(quantity)
+
+    movement = StockMovement(
+        item_id=item_id,
+        location_id=location_id,
+        movement_type=movement_type,
+        quantity=quantity,
+        ts=ts or get_ist_now(),
+        reference_type=reference_type,
+        reference_id=reference_id,
+        created_by=user_id,
+        remarks=remarks
+    )
+    db.session.add(movement)
+    db.session.flush()
+
+    _checkpoint_if_due(item_id, location_id, movement)
+    return movement
+
+
+def _latest_snapshot(item_id, location_id, as_of=None):
+    query = StockSnapshot.query.filter_by(item_id=item_id, location_id=location_id)
+    if as_of is not None:
+        query = query.filter(StockSnapshot.ts <= as_of)
+    return query.order_by(StockSnapshot.ts.desc(), StockSnapshot.movement_id.desc()).first()
+
+
+def _movements_after(snapshot, item_id, location_id):
+    query = db.session.query(StockMovement).filter(
+        StockMovement.item_id == item_id,
+        StockMovement.location_id == location_id
+    )
+    if snapshot:
+        query = query.filter(
+            StockMovement.ts >= snapshot.ts,
+            StockMovement.id > snapshot.movement_id
+        )
+    return query
+
+
+def _checkpoint_if_due(item_id, location_id, movement):
+    snapshot = _latest_snapshot(item_id, location_id)
+    pending = _movements_after(snapshot, item_id, location_id).with_entities(
+        func.count(StockMovement.id),
+        func.coalesce(func.sum(StockMovement.quantity), 0)
+    ).one()
+
+    if pending[0] >= SNAPSHOT_INTERVAL:
+        base = snapshot.quantity if snapshot else Decimal('0')
+        db.session.add(StockSnapshot(
+            item_id=item_id,
+            location_id=location_id,
+            movement_id=movement.id,
+            ts=movement.ts,
+            quantity=base + Decimal(pending[1])
+        ))
+
+
+def balance_as_of(item_id, location_id, as_of=None):
+    """Return the ledger balance of an item at a location as of a timestamp (default: now)"""
+    as_of = as_of or get_ist_now()
+    snapshot = _latest_snapshot(item_id, location_id, as_of)
+
+    delta = _movements_after(snapshot, item_id, location_id).filter(
+        StockMovement.ts <= as_of
+    ).with_entities(func.coalesce(func.sum(StockMovement.quantity), 0)).scalar()
+
+    base = snapshot.quantity if snapshot else Decimal('0')
+    return base + Decimal(delta)
+
+
+def balance_after(movement):
+    """Return the ledger balance immediately after ``movement`` (snapshot plus later movements)"""
+    total = balance_as_of(movement.item_id, movement.location_id, movement.ts)
+    # Movements sharing the timestamp but recorded afterwards are included in ``total``
+    tied = db.session.query(func.coalesce(func.sum(StockMovement.quantity), 0)).filter(
+        StockMovement.item_id == movement.item_id,
+        StockMovement.location_id == movement.location_id,
+        StockMovement.ts == movement.ts,
+        StockMovement.id > movement.id
+    ).scalar()
+    return total - Decimal(tied)
+
+
+def movement_history(item_id, location_id, date_from=None, date_to=None):
+    """Return ledger rows for an item/location, newest first"""
+    query = StockMovement.query.filter_by(item_id=item_id, location_id=location_id)
+    if date_from:
+        query = query.filter(StockMovement.ts >= date_from)
+    if date_to:
+        query = query.filter(StockMovement.ts < date_to)
+    return query.order_by(StockMovement.ts.desc(), StockMovement.id.desc())
+
+
+# What each reference_type is called when the referenced row has no number of its own
+REFERENCE_LABELS = {
+    'StockEntry': 'Stock Entry',
+    'StockIssueLine': 'Issue Line',
+    'StockReturn': 'Return',
+    'StockBalance': 'Opening Balance',
+}
+
+
+def reference_labels(movements):
+    """Describe what each movement came from, keyed by (reference_type, reference_id).
+
+    Issue lines are named after their request number and returns after their
+    return number, looked up with one query per reference type.
+    """
+    ids = {}
+    for movement in movements:
+        if movement.reference_id:
+            ids.setdefault(movement.reference_type, set()).add(movement.reference_id)
+
+    found = {}
+    if ids.get('StockIssueLine'):
+        lines = db.session.query(StockIssueLine.id, StockIssueRequest.request_no).join(
+            StockIssueRequest, StockIssueLine.request_id == StockIssueRequest.id
+        ).filter(StockIssueLine.id.in_(ids['StockIssueLine']))
+        found.update((('StockIssueLine', line_id), f'Issue {request_no}') for line_id, request_no in lines)
+    if ids.get('StockReturn'):
+        returns = db.session.query(StockReturn.id, StockReturn.return_no).filter(
+            StockReturn.id.in_(ids['StockReturn']))
+        found.update((('StockReturn', return_id), f'Return {return_no}') for return_id, return_no in returns)
+    if ids.get('StockEntry'):
+        entries = db.session.query(StockEntry.id, StockEntry.description).filter(
+            StockEntry.id.in_(ids['StockEntry']))
+        for entry_id, description in entries:
+            label = f'Stock Entry #{entry_id}'
+            found[('StockEntry', entry_id)] = f'{label}: {description}' if description else label
+
+    labels = {}
+    for movement in movements:
+        key = (movement.reference_type, movement.reference_id)
+        if key not in found:
+            label = REFERENCE_LABELS.get(movement.reference_type, 'Movement')
+            found[key] = f'{label} #{movement.reference_id}' if movement.reference_id else label
+        labels[key] = found[key]
+    return labels
+
+
+def rebuild_snapshots():
+    """Recompute every checkpoint from the ledger (used after backfills)"""
+    StockSnapshot.query.delete()
+
+    running = {}
+    since_checkpoint = {}
+    movements = db.session.query(
+        StockMovement.id, StockMovement.item_id, StockMovement.location_id,
+        StockMovement.ts, StockMovement.quantity
+    ).order_by(StockMovement.item_id, StockMovement.location_id, StockMovement.ts, StockMovement.id)
+
+    for movement in movements.yield_per(1000):
+        key = (movement.item_id, movement.location_id)
+        running[key] = running.get(key, Decimal('0')) + movement.quantity
+        since_checkpoint[key] = since_checkpoint.get(key, 0) + 1
+        if since_checkpoint[key] >= SNAPSHOT_INTERVAL:
+            db.session.add(StockSnapshot(
+                item_id=movement.item_id,
+                location_id=movement.location_id,
+                movement_id=movement.id,
+                ts=movement.ts,
+                quantity=running[key]
+            ))
+            since_checkpoint[key] = 0
+
+
+def _utc_to_ist(dt):
+    # issued_at/processed_at are written with utcnow(); ledger timestamps are IST
+    return convert_to_ist(dt).replace(tzinfo=None) if dt else None
+
+
+def backfill_movements():
+    """Seed an empty ledger from existing entries, issues and completed returns.
+
+    Any remaining difference to the current StockBalance (e.g. seeded or
+    manually edited balances) is recorded as an ADJUST movement.
+    """
+    if StockMovement.query.first():
+        return 0
+
+    rows = []
+    for entry in StockEntry.query.all():
+        rows.append(StockMovement(
+            item_id=entry.item_id, location_id=entry.location_id,
+            movement_type=MovementType.IN, quantity=entry.quantity_procured,
+            ts=entry.created_at, reference_type='StockEntry', reference_id=entry.id,
+            created_by=entry.created_by
+        ))
+
+    issued_lines = db.session.query(StockIssueLine, StockIssueRequest).join(
+        StockIssueRequest, StockIssueLine.request_id == StockIssueRequest.id
+    ).filter(
+        StockIssueRequest.issued_at.isnot(None),
+        StockIssueLine.quantity_issued > 0
+    )
+    for line, request in issued_lines:
+        rows.append(StockMovement(
+            item_id=line.item_id, location_id=request.location_id,
+            movement_type=MovementType.OUT, quantity=-line.quantity_issued,
+            ts=_utc_to_ist(request.issued_at), reference_type='StockIssueLine', reference_id=line.id,
+            created_by=request.issued_by
+        ))
+
+    completed_returns = db.session.query(StockReturn, StockIssueLine, StockIssueRequest).join(
+        StockIssueLine, StockReturn.issue_line_id == StockIssueLine.id
+    ).join(
+        StockIssueRequest, StockIssueLine.request_id == StockIssueRequest.id
+    ).filter(StockReturn.status == ReturnStatus.COMPLETED)
+    for stock_return, line, request in completed_returns:
+        rows.append(StockMovement(
+            item_id=line.item_id, location_id=request.location_id,
+            movement_type=MovementType.RETURN, quantity=stock_return.quantity_returned,
+            ts=_utc_to_ist(stock_return.processed_at) or stock_return.created_at,
+            reference_type='StockReturn', reference_id=stock_return.id,
+            created_by=stock_return.processed_by
+        ))
+
+    rows.sort(key=lambda m: m.ts or datetime.min)
+    db.session.add_all(rows)
+    db.session.flush()
+    count = len(rows)
+
+    ledger_totals = dict(
+        ((item_id, location_id), total) for item_id, location_id, total in db.session.query(
+            StockMovement.item_id, StockMovement.location_id, func.sum(StockMovement.quantity)
+        ).group_by(StockMovement.item_id, StockMovement.location_id)
+    )
+    now = get_ist_now()
+    for balance in StockBalance.query.all():
+        difference = balance.quantity - Decimal(ledger_totals.get((balance.item_id, balance.location_id)) or 0)
+        if difference:
+            db.session.add(StockMovement(
+                item_id=balance.item_id, location_id=balance.location_id,
+                movement_type=MovementType.ADJUST, quantity=difference, ts=now,
+                reference_type='StockBalance', reference_id=balance.id,
+                remarks='Opening balance reconciliation'
+            ))
+            count += 1
+
+    db.session.flush()
+    rebuild_snapshots()
+    return count
+
+
+@click.command('backfill-ledger')
+@with_appcontext
+def backfill_ledger_command():
+    """Populate the stock movement ledger from existing transactions."""
+    count = backfill_movements()
+    db.session.commit()
+    if count:
+        click.echo(f'Recorded {count} stock movements.')
+    else:
+        click.echo('Ledger already populated; nothing to do.')
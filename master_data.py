@@ -0,0 +1,140 @@
+"""
+Process-local cache of the item, location and department master lists.
+
+Dropdowns and filters on most pages need the full master lists. Each worker
+keeps them in memory as read-only snapshots and checks a single version row
+(cache_versions.name = 'masters') once per request. The masters views call
+``bump_version()`` in the same transaction as any create, edit or delete, so
+every worker reloads the lists on its next request after the change commits.
+
+Snapshots carry the column values (and, for items, their department
+snapshot); they are not ORM instances, so use the model query for anything
+that needs to write or follow other relationships.
+"""
+
+import threading
+import uuid
+from flask import g, has_request_context
+from sqlalchemy import select, update, insert
+from sqlalchemy.exc import IntegrityError
+from database import db
+from models import CacheVersion, Item, Location, Department
+
+MASTERS = 'masters'
+
+_lock = threading.Lock()
+_cache = {'version': None}
+
+
+class Snapshot:
+    """Read-only copy of a master row"""
+
+    def __init__(self, **values):
+        self.__dict__.update(values)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is read-only')
+
+    def __repr__(self):
+        return f'<Snapshot {self.__dict__.get("code", self.__dict__.get("id"))}>'
+
+
+def _columns(row, model):
+    return dict((column.key, getattr(row, column.key)) for column in model.__table__.columns)
+
+
+def _new_token():
+    return uuid.uuid4().hex
+
+
+def current_version():
+    """The masters version token, read once per request"""
+    if has_request_context() and '_masters_version' in g:
+        return g._masters_version
+
+    version = db.session.execute(
+        select(CacheVersion.version).where(CacheVersion.name == MASTERS)
+    ).scalar()
+    if version is None:
+        version = _create_version_row()
+
+    if has_request_context():
+        g._masters_version = version
+    return version
+
+
+def _create_version_row():
+    # Written on its own connection so the token exists even if the caller rolls back
+    token = _new_token()
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(insert(CacheVersion).values(name=MASTERS, version=token))
+    except IntegrityError:
+        token = db.session.execute(
+            select(CacheVersion.version).where(CacheVersion.name == MASTERS)
+        ).scalar()
+    return token
+
+
+def bump_version():
+    """Invalidate every worker's lists (call before committing a master-data change)"""
+    token = _new_token()
+    result = db.session.execute(
+        update(CacheVersion).where(CacheVersion.name == MASTERS).values(version=token)
+    )
+    if result.rowcount != 1:
+        db.session.add(CacheVersion(name=MASTERS, version=token))
+    if has_request_context():
+        g.pop('_masters_version', None)
+
+
+def _load():
+    departments = [Snapshot(**_columns(d, Department))
+                   for d in Department.query.order_by(Department.code)]
+    departments_by_id = dict((d.id, d) for d in departments)
+    items = [Snapshot(department=departments_by_id.get(i.department_id), **_columns(i, Item))
+             for i in Item.query.order_by(Item.code)]
+    locations = [Snapshot(**_columns(l, Location))
+                 for l in Location.query.order_by(Location.office, Location.room)]
+    return {'items': tuple(items), 'locations': tuple(locations), 'departments': tuple(departments)}
+
+
+def _lists():
+    version = current_version()
+    cache = _cache
+    if cache['version'] != version:
+        with _lock:
+            if _cache['version'] != version:
+                lists = _load()
+                lists['version'] = version
+                _cache.clear()
+                _cache.update(lists)
+            cache = dict(_cache)
+    return cache
+
+
+def init_app(app):
+    """Re-read the version token at the start of every request"""
+
+    @app.before_request
+    def _reset_masters_version():
+        g.pop('_masters_version', None)
+
+
+def get_items(department_id=None, include_unassigned=False):
+    """Items ordered by code, optionally limited to a department (plus items with no department)"""
+    items = _lists()['items']
+    if department_id is None:
+        return list(items)
+    return [i for i in items
+            if i.department_id == department_id or (include_unassigned and i.department_id is None)]
+
+
+def get_locations():
+    """Locations ordered by office and room"""
+    return list(_lists()['locations'])
+
+
+def get_departments():
+    """Departments ordered by code"""
+    return list(_lists()['departments'])
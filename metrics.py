@@ -0,0 +1,100 @@
+"""
+Prometheus metrics for request latency, DB pool usage and stock throughput.
+
+Metrics are scraped from ``/metrics``. Under gunicorn each worker has its own
+counters; set PROMETHEUS_MULTIPROC_DIR to an empty, writable directory before
+the workers start and prometheus_client will aggregate them from files in it.
+The ``child_exit`` hook in gunicorn.conf.py calls ``mark_worker_dead`` so the
+pool gauges of exited workers are dropped.
+"""
+
+import os
+import time
+from flask import g, request
+from prometheus_client import (Counter, Gauge, Histogram, CollectorRegistry, REGISTRY,
+                               generate_latest, CONTENT_TYPE_LATEST, multiprocess)
+from database import db
+
+REQUEST_LATENCY = Histogram(
+    'stock_http_request_duration_seconds',
+    'Request latency by endpoint',
+    ['endpoint', 'method'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+
+REQUESTS = Counter(
+    'stock_http_requests_total',
+    'Requests by endpoint and status code',
+    ['endpoint', 'method', 'status']
+)
+
+DOCUMENT_EVENTS = Counter(
+    'stock_document_events_total',
+    'Stock requests created, approved and issued, and returns completed',
+    ['event']
+)
+
+DB_POOL = Gauge(
+    'stock_db_pool_connections',
+    'Database connection pool usage per state',
+    ['state'],
+    multiprocess_mode='livesum'
+)
+
+# Lifecycle events counted by DOCUMENT_EVENTS
+CREATED = 'created'
+APPROVED = 'approved'
+ISSUED = 'issued'
+RETURNED = 'returned'
+
+# Endpoints not worth timing
+_SKIP_ENDPOINTS = {'static', 'metrics.metrics'}
+
+
+def record_event(event, count=1):
+    """Count a request/return lifecycle event (call after the commit succeeds)"""
+    DOCUMENT_EVENTS.labels(event=event).inc(count)
+
+
+def _update_pool_gauges():
+    pool = db.engine.pool
+    for state in ('size', 'checkedin', 'checkedout', 'overflow'):
+        reading = getattr(pool, state, None)
+        if reading is not None:
+            DB_POOL.labels(state=state).set(reading())
+
+
+def render():
+    """Return (body, content_type) for the current metrics, aggregated across workers if enabled"""
+    registry = REGISTRY
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_worker_dead(pid):
+    """Remove a dead worker's livesum gauge files from the multiprocess directory"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
+
+
+def init_app(app):
+    """Time every request and keep the pool gauges current"""
+
+    @app.before_request
+    def _start_metrics_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        endpoint = request.endpoint or 'unmatched'
+        if endpoint in _SKIP_ENDPOINTS or '_metrics_start' not in g:
+            return response
+
+        REQUEST_LATENCY.labels(endpoint=endpoint, method=request.method).observe(
+            time.perf_counter() - g._metrics_start
+        )
+        REQUESTS.labels(endpoint=endpoint, method=request.method, status=response.status_code).inc()
+        _update_pool_gauges()
+        return response
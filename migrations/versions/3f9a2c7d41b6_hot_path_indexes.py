@@ -0,0 +1,48 @@
+"""Add composite indexes for the hot request, return, entry and audit filters
+
+The schema itself is still created by db.create_all(), which adds these
+indexes on fresh databases; this revision adds them to databases created
+before they were declared on the models.
+
+Revision ID: 3f9a2c7d41b6
+Revises:
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a2c7d41b6'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_stock_entries_item_location_created', 'stock_entries', ['item_id', 'location_id', 'created_at']),
+    ('ix_stock_entries_created_at', 'stock_entries', ['created_at']),
+    ('ix_stock_issue_requests_status_created', 'stock_issue_requests', ['status', 'created_at']),
+    ('ix_stock_issue_requests_department_status_created', 'stock_issue_requests',
+     ['department_id', 'status', 'created_at']),
+    ('ix_stock_issue_requests_requester_created', 'stock_issue_requests', ['requester_id', 'created_at']),
+    ('ix_stock_issue_requests_issued_at', 'stock_issue_requests', ['issued_at']),
+    ('ix_stock_issue_lines_request', 'stock_issue_lines', ['request_id']),
+    ('ix_stock_issue_lines_item_request', 'stock_issue_lines', ['item_id', 'request_id']),
+    ('ix_stock_returns_issue_line_status', 'stock_returns', ['issue_line_id', 'status']),
+    ('ix_stock_returns_status_created', 'stock_returns', ['status', 'created_at']),
+    ('ix_stock_returns_returned_by_created', 'stock_returns', ['returned_by', 'created_at']),
+    ('ix_audits_entity', 'audits', ['entity_type', 'entity_id', 'timestamp']),
+    ('ix_audits_timestamp', 'audits', ['timestamp']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
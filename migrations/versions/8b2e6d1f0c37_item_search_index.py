@@ -0,0 +1,56 @@
+"""Add the FTS5 item search index and the triggers that keep it in step with items
+
+Fresh SQLite databases get these from db.create_all() (see item_search.py).
+Other databases search with LIKE and need nothing.
+
+Revision ID: 8b2e6d1f0c37
+Revises: 3f9a2c7d41b6
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e6d1f0c37'
+down_revision = '3f9a2c7d41b6'
+branch_labels = None
+depends_on = None
+
+
+STATEMENTS = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+        code, name, make, variant, description,
+        content='items', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS items_fts_insert AFTER INSERT ON items BEGIN
+        INSERT INTO items_fts(rowid, code, name, make, variant, description)
+        VALUES (new.id, new.code, new.name, new.make, new.variant, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS items_fts_delete AFTER DELETE ON items BEGIN
+        INSERT INTO items_fts(items_fts, rowid, code, name, make, variant, description)
+        VALUES ('delete', old.id, old.code, old.name, old.make, old.variant, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS items_fts_update AFTER UPDATE ON items BEGIN
+        INSERT INTO items_fts(items_fts, rowid, code, name, make, variant, description)
+        VALUES ('delete', old.id, old.code, old.name, old.make, old.variant, old.description);
+        INSERT INTO items_fts(rowid, code, name, make, variant, description)
+        VALUES (new.id, new.code, new.name, new.make, new.variant, new.description);
+    END""",
+    "INSERT INTO items_fts(items_fts) VALUES ('rebuild')",
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for statement in STATEMENTS:
+        op.execute(statement)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for trigger in ('items_fts_insert', 'items_fts_delete', 'items_fts_update'):
+        op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    op.execute('DROP TABLE IF EXISTS items_fts')
@@ -0,0 +1,34 @@
+"""Add stock_issue_lines.quantity_returned_total and fill it from completed returns
+
+Revision ID: c4d1a9e7b250
+Revises: 8b2e6d1f0c37
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from return_totals import backfill_statement
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d1a9e7b250'
+down_revision = '8b2e6d1f0c37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases built by db.create_all() from the current models already have the column
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('stock_issue_lines')}
+    if 'quantity_returned_total' not in columns:
+        with op.batch_alter_table('stock_issue_lines') as batch_op:
+            batch_op.add_column(sa.Column('quantity_returned_total', sa.Numeric(10, 2),
+                                          nullable=False, server_default='0'))
+
+    # Same statement as "flask backfill-return-totals", so the status filter cannot drift
+    op.execute(backfill_statement())
+
+
+def downgrade():
+    with op.batch_alter_table('stock_issue_lines') as batch_op:
+        batch_op.drop_column('quantity_returned_total')
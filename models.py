@@ -1,9 +1,12 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta
 from decimal import Decimal
 from enum import Enum
 from werkzeug.security import generate_password_hash, check_password_hash
+from flask import g, has_request_context
 from flask_login import UserMixin
-from sqlalchemy import CheckConstraint
+from sqlalchemy import CheckConstraint, event
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.ext.hybrid import hybrid_property
 from database import db
 from utils import get_ist_now
 
@@ -24,6 +27,18 @@ class ReturnStatus(Enum):
     COMPLETED = 'Completed'
     REJECTED = 'Rejected'
 
+class MovementType(Enum):
+    IN = 'In'
+    OUT = 'Out'
+    RETURN = 'Return'
+    ADJUST = 'Adjust'
+
+class ExportStatus(Enum):
+    QUEUED = 'Queued'
+    RUNNING = 'Running'
+    DONE = 'Done'
+    FAILED = 'Failed'
+
 # Association table for User-Warehouse many-to-many relationship
 user_warehouse_assignments = db.Table('user_warehouse_assignments',
     db.Column('user_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
@@ -66,21 +81,49 @@ class User(UserMixin, db.Model):
                 self.managed_department and 
                 self.managed_department.id == department_id)
 
+    @classmethod
+    def load_principal(cls, user_id):
+        """The logged-in user with their managed department and warehouses, in one query"""
+        return cls.query.options(
+            joinedload(cls.managed_department), joinedload(cls.assigned_warehouses)
+        ).filter(cls.id == user_id).first()
+
     def get_accessible_warehouses(self):
         """Get all warehouses user can access"""
         if self.role == UserRole.SUPERADMIN:
             return Location.query.all()
         return self.assigned_warehouses
 
+    @property
+    def accessible_location_ids(self):
+        """Frozenset of the warehouse IDs the user can access (None for all), memoized per request"""
+        if self.role == UserRole.SUPERADMIN:
+            return None
+        if not has_request_context():
+            return frozenset(w.id for w in self.assigned_warehouses)
+        memo = g.setdefault('_accessible_location_ids', {})
+        if self.id not in memo:
+            memo[self.id] = frozenset(w.id for w in self.assigned_warehouses)
+        return memo[self.id]
+
+    def accessible_warehouse_ids(self):
+        """IDs of the warehouses the user can access, or None for all of them"""
+        return self.accessible_location_ids
+
     def can_access_warehouse(self, location_id):
         """Check if user can access specific warehouse"""
-        if self.role == UserRole.SUPERADMIN:
-            return True
-        return any(w.id == location_id for w in self.assigned_warehouses)
+        location_ids = self.accessible_location_ids
+        return location_ids is None or location_id in location_ids
 
     def __repr__(self):
         return f'<User {self.username}>'
 
+@event.listens_for(User.assigned_warehouses, 'append')
+@event.listens_for(User.assigned_warehouses, 'remove')
+def _forget_accessible_location_ids(user, location, initiator):
+    if has_request_context():
+        g.get('_accessible_location_ids', {}).pop(user.id, None)
+
 class Department(db.Model):
     __tablename__ = 'departments'
 
@@ -225,6 +268,11 @@ class StockEntry(db.Model):
     location = db.relationship('Location')
     creator = db.relationship('User')
 
+    __table_args__ = (
+        db.Index('ix_stock_entries_item_location_created', 'item_id', 'location_id', 'created_at'),
+        db.Index('ix_stock_entries_created_at', 'created_at'),
+    )
+
     def __repr__(self):
         return f'<StockEntry {self.id}>'
 
@@ -256,23 +304,17 @@ class StockIssueRequest(db.Model):
     issuer = db.relationship('User', foreign_keys=[issued_by])
     issue_lines = db.relationship('StockIssueLine', back_populates='request', cascade='all, delete-orphan')
 
+    __table_args__ = (
+        db.Index('ix_stock_issue_requests_status_created', 'status', 'created_at'),
+        db.Index('ix_stock_issue_requests_department_status_created', 'department_id', 'status', 'created_at'),
+        db.Index('ix_stock_issue_requests_requester_created', 'requester_id', 'created_at'),
+        db.Index('ix_stock_issue_requests_issued_at', 'issued_at'),
+    )
+
     def generate_request_no(self):
         """Generate unique request number"""
-        today = datetime.now(timezone.utc)
-        prefix = f"REQ{today.strftime('%Y%m%d')}"
-
-        # Find the last request number for today
-        last_request = db.session.query(StockIssueRequest).filter(
-            StockIssueRequest.request_no.like(f"{prefix}%")
-        ).order_by(StockIssueRequest.request_no.desc()).first()
-
-        if last_request:
-            last_seq = int(last_request.request_no[-3:])
-            new_seq = last_seq + 1
-        else:
-            new_seq = 1
-
-        return f"{prefix}{new_seq:03d}"
+        from numbering import next_number, REQUEST
+        return next_number(REQUEST)
 
     def can_be_approved_by(self, user):
         """Check if user can approve this request"""
@@ -283,6 +325,15 @@ class StockIssueRequest(db.Model):
     def __repr__(self):
         return f'<StockIssueRequest {self.request_no}>'
 
+# Issued stock can be returned for this many whole days after issue
+RETURN_WINDOW_DAYS = 30
+
+
+def return_window_start():
+    """Earliest issued_at (naive UTC) still inside the return window"""
+    # (now - issued_at).days <= 30 holds until 31 full days have passed
+    return datetime.utcnow() - timedelta(days=RETURN_WINDOW_DAYS + 1)
+
 class StockIssueLine(db.Model):
     __tablename__ = 'stock_issue_lines'
 
@@ -291,6 +342,8 @@ class StockIssueLine(db.Model):
     item_id = db.Column(db.Integer, db.ForeignKey('items.id'), nullable=False)
     quantity_requested = db.Column(db.Numeric(10, 2), nullable=False)
     quantity_issued = db.Column(db.Numeric(10, 2), nullable=True)
+    # Sum of completed returns, maintained by inventory.complete_return (see return_totals.py)
+    quantity_returned_total = db.Column(db.Numeric(10, 2), nullable=False, default=0, server_default='0')
     remarks = db.Column(db.String(200))
 
     # Relationships
@@ -298,26 +351,63 @@ class StockIssueLine(db.Model):
     item = db.relationship('Item', back_populates='issue_lines')
     returns = db.relationship('StockReturn', back_populates='issue_line', cascade='all, delete-orphan')
 
-    @property
+    __table_args__ = (
+        db.Index('ix_stock_issue_lines_request', 'request_id'),
+        db.Index('ix_stock_issue_lines_item_request', 'item_id', 'request_id'),
+    )
+
+    @hybrid_property
     def quantity_returned(self):
-        """Calculate total quantity returned for this issue line"""
-        return sum(return_obj.quantity_returned for return_obj in self.returns if return_obj.status == ReturnStatus.COMPLETED)
+        """Total quantity returned for this issue line (completed returns only)"""
+        return self.quantity_returned_total if self.quantity_returned_total is not None else Decimal('0')
 
-    @property
+    @quantity_returned.expression
+    def quantity_returned(cls):
+        return cls.quantity_returned_total
+
+    @hybrid_property
     def quantity_returnable(self):
         """Calculate remaining quantity that can be returned"""
         if not self.quantity_issued:
             return Decimal('0')
         return self.quantity_issued - self.quantity_returned
 
-    @property
+    @quantity_returnable.expression
+    def quantity_returnable(cls):
+        return db.func.coalesce(cls.quantity_issued, 0) - cls.quantity_returned
+
+    @hybrid_property
     def is_returnable(self):
         """Check if this issue line is eligible for return (within 30 days and has returnable quantity)"""
         if not self.request.issued_at or not self.quantity_issued:
             return False
         
         days_since_issue = (datetime.utcnow() - self.request.issued_at).days
-        return days_since_issue <= 30 and self.quantity_returnable > 0
+        return days_since_issue <= RETURN_WINDOW_DAYS and self.quantity_returnable > 0
+
+    @is_returnable.expression
+    def is_returnable(cls):
+        issued_at = db.select(StockIssueRequest.issued_at).where(
+            StockIssueRequest.id == cls.request_id
+        ).correlate_except(StockIssueRequest).scalar_subquery()
+        return db.and_(
+            cls.quantity_issued.isnot(None),
+            issued_at > return_window_start(),
+            cls.quantity_returnable > 0
+        )
+
+    @classmethod
+    def returnable_query(cls, requester_id=None):
+        """Lines of issued requests that can still be returned, filtered by the database"""
+        query = cls.query.join(cls.request).filter(
+            StockIssueRequest.status == RequestStatus.ISSUED,
+            StockIssueRequest.issued_at > return_window_start(),
+            cls.quantity_issued.isnot(None),
+            cls.quantity_returnable > 0
+        )
+        if requester_id is not None:
+            query = query.filter(StockIssueRequest.requester_id == requester_id)
+        return query
 
     def __repr__(self):
         return f'<StockIssueLine {self.id}>'
@@ -343,23 +433,16 @@ class StockReturn(db.Model):
     returner = db.relationship('User', foreign_keys=[returned_by])
     processor = db.relationship('User', foreign_keys=[processed_by])
 
+    __table_args__ = (
+        db.Index('ix_stock_returns_issue_line_status', 'issue_line_id', 'status'),
+        db.Index('ix_stock_returns_status_created', 'status', 'created_at'),
+        db.Index('ix_stock_returns_returned_by_created', 'returned_by', 'created_at'),
+    )
+
     def generate_return_no(self):
         """Generate unique return number"""
-        today = datetime.utcnow()
-        prefix = f"RET{today.strftime('%Y%m%d')}"
-
-        # Find the last return number for today
-        last_return = db.session.query(StockReturn).filter(
-            StockReturn.return_no.like(f"{prefix}%")
-        ).order_by(StockReturn.return_no.desc()).first()
-
-        if last_return:
-            last_seq = int(last_return.return_no[-3:])
-            new_seq = last_seq + 1
-        else:
-            new_seq = 1
-
-        return f"{prefix}{new_seq:03d}"
+        from numbering import next_number, RETURN
+        return next_number(RETURN)
 
     @property
     def is_overdue(self):
@@ -372,6 +455,176 @@ class StockReturn(db.Model):
     def __repr__(self):
         return f'<StockReturn {self.return_no}>'
 
+# Loader options for StockIssueRequest queries, applied with .options(*PROFILE).
+# Many-to-one references are joined into the main query; collections are
+# fetched with one extra SELECT ... IN per level, so the query count does not
+# grow with the number of requests or lines.
+
+# Listing pages: who/where plus the lines and their items
+REQUEST_LIST = (
+    joinedload(StockIssueRequest.requester),
+    joinedload(StockIssueRequest.department),
+    joinedload(StockIssueRequest.location),
+    selectinload(StockIssueRequest.issue_lines).joinedload(StockIssueLine.item).joinedload(Item.department),
+)
+
+# Detail, print and return pages: everything in REQUEST_LIST plus approver, issuer and returns
+REQUEST_FULL = REQUEST_LIST + (
+    joinedload(StockIssueRequest.approver),
+    joinedload(StockIssueRequest.issuer),
+    selectinload(StockIssueRequest.issue_lines).selectinload(StockIssueLine.returns),
+)
+
+class StockMovement(db.Model):
+    """Append-only ledger of every change to a StockBalance (quantity is signed)"""
+    __tablename__ = 'stock_movements'
+
+    id = db.Column(db.Integer, primary_key=True)
+    item_id = db.Column(db.Integer, db.ForeignKey('items.id'), nullable=False)
+    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'), nullable=False)
+    movement_type = db.Column(db.Enum(MovementType), nullable=False)
+    quantity = db.Column(db.Numeric(10, 2), nullable=False)
+    ts = db.Column(db.DateTime, default=lambda: get_ist_now(), nullable=False)
+    reference_type = db.Column(db.String(50))
+    reference_id = db.Column(db.Integer)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    remarks = db.Column(db.String(200))
+
+    # Relationships
+    item = db.relationship('Item')
+    location = db.relationship('Location')
+    user = db.relationship('User')
+
+    __table_args__ = (
+        db.Index('ix_stock_movements_item_location_ts', 'item_id', 'location_id', 'ts'),
+        db.Index('ix_stock_movements_reference', 'reference_type', 'reference_id'),
+    )
+
+    def __repr__(self):
+        return f'<StockMovement {self.movement_type.value} Item:{self.item_id} Location:{self.location_id} Qty:{self.quantity}>'
+
+class StockSnapshot(db.Model):
+    """Periodic balance checkpoint so point-in-time lookups only replay recent movements"""
+    __tablename__ = 'stock_snapshots'
+
+    id = db.Column(db.Integer, primary_key=True)
+    item_id = db.Column(db.Integer, db.ForeignKey('items.id'), nullable=False)
+    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'), nullable=False)
+    movement_id = db.Column(db.Integer, db.ForeignKey('stock_movements.id'), nullable=False)
+    ts = db.Column(db.DateTime, nullable=False)
+    quantity = db.Column(db.Numeric(12, 2), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_stock_snapshots_item_location_ts', 'item_id', 'location_id', 'ts'),
+    )
+
+    def __repr__(self):
+        return f'<StockSnapshot Item:{self.item_id} Location:{self.location_id} Qty:{self.quantity} @ {self.ts}>'
+
+class DocumentSequence(db.Model):
+    """Per-day counter behind request/return numbers (prefix is e.g. REQ20240811)"""
+    __tablename__ = 'document_sequences'
+
+    prefix = db.Column(db.String(16), primary_key=True)
+    last_value = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DocumentSequence {self.prefix}:{self.last_value}>'
+
+class CacheVersion(db.Model):
+    """Version token for a group of cached rows; any change to the group replaces the token"""
+    __tablename__ = 'cache_versions'
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.String(32), nullable=False)
+
+    def __repr__(self):
+        return f'<CacheVersion {self.name}:{self.version}>'
+
+class DailyRequestRollup(db.Model):
+    """Requests per day, department, location and current status, maintained by rollups.refresh"""
+    __tablename__ = 'daily_request_rollups'
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    department_id = db.Column(db.Integer, db.ForeignKey('departments.id'), nullable=False)
+    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'), nullable=False)
+    status = db.Column(db.Enum(RequestStatus), nullable=False)
+    request_count = db.Column(db.Integer, nullable=False, default=0)  # created on ``day``
+    issued_count = db.Column(db.Integer, nullable=False, default=0)  # issued on ``day``
+
+    __table_args__ = (
+        db.Index('ix_daily_request_rollups_day', 'day'),
+        db.Index('ix_daily_request_rollups_department_day', 'department_id', 'day'),
+    )
+
+    def __repr__(self):
+        return f'<DailyRequestRollup {self.day} Dept:{self.department_id} {self.status.value}>'
+
+class DailyItemRollup(db.Model):
+    """Item quantities per day, department, location and item, maintained by rollups.refresh"""
+    __tablename__ = 'daily_item_rollups'
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    department_id = db.Column(db.Integer, db.ForeignKey('departments.id'), nullable=True)
+    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'), nullable=False)
+    item_id = db.Column(db.Integer, db.ForeignKey('items.id'), nullable=False)
+    # Lines of approved or issued requests created on ``day``
+    quantity_requested = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    request_lines = db.Column(db.Integer, nullable=False, default=0)
+    quantity_issued = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    quantity_returned = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    quantity_procured = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    entry_count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_daily_item_rollups_day', 'day'),
+        db.Index('ix_daily_item_rollups_item_day', 'item_id', 'day'),
+    )
+
+    def __repr__(self):
+        return f'<DailyItemRollup {self.day} Item:{self.item_id} Location:{self.location_id}>'
+
+class RollupDirtyDay(db.Model):
+    """A day whose rollups are stale; queued on flush and consumed by rollups.refresh"""
+    __tablename__ = 'rollup_dirty_days'
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+
+    def __repr__(self):
+        return f'<RollupDirtyDay {self.day}>'
+
+class ExportJob(db.Model):
+    """A report export produced in the background; the artifact is a gzipped CSV on disk"""
+    __tablename__ = 'export_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)
+    params = db.Column(db.Text)  # JSON-encoded filters
+    cache_key = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.Enum(ExportStatus), nullable=False, default=ExportStatus.QUEUED)
+    requested_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    file_path = db.Column(db.String(500))
+    filename = db.Column(db.String(200))
+    row_count = db.Column(db.Integer)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=lambda: get_ist_now(), nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime)
+
+    # Relationships
+    requester = db.relationship('User')
+
+    __table_args__ = (
+        db.Index('ix_export_jobs_cache_key_status', 'cache_key', 'status'),
+    )
+
+    def __repr__(self):
+        return f'<ExportJob {self.id} {self.kind} {self.status.value}>'
+
 class Audit(db.Model):
     __tablename__ = 'audits'
 
@@ -386,6 +639,11 @@ class Audit(db.Model):
     # Relationships
     user = db.relationship('User')
 
+    __table_args__ = (
+        db.Index('ix_audits_entity', 'entity_type', 'entity_id', 'timestamp'),
+        db.Index('ix_audits_timestamp', 'timestamp'),
+    )
+
     @staticmethod
     def log(entity_type, entity_id, action, user_id, details=None):
         """Helper method to log audit entries"""
@@ -0,0 +1,114 @@
+"""
+Request and return number allocation.
+
+Numbers are ``<KIND><yyyymmdd><seq>`` (e.g. REQ20240811001). The per-day
+counter lives in the document_sequences table and is advanced with a single
+UPDATE, so concurrent submits serialize on that row instead of racing on the
+unique request_no/return_no constraint. Sequences are zero-padded to three
+digits and simply grow wider past 999.
+
+With DOCUMENT_NUMBER_BLOCK_SIZE > 1 each worker process reserves a block of
+numbers in its own short transaction and hands them out locally. Numbers
+from an abandoned block are skipped, so expect gaps. Block reservation uses a
+second connection and is meant for server databases; on SQLite keep the
+default of 1 so allocation stays inside the caller's transaction.
+"""
+
+import threading
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import select, update, insert, func
+from sqlalchemy.exc import IntegrityError
+from database import db
+from models import DocumentSequence, StockIssueRequest, StockReturn
+
+REQUEST = 'REQ'
+RETURN = 'RET'
+
+# Existing number column per kind, used to seed a day's counter on first use
+_NUMBER_COLUMNS = {
+    REQUEST: StockIssueRequest.request_no,
+    RETURN: StockReturn.return_no,
+}
+
+_blocks = {}
+_blocks_lock = threading.Lock()
+
+
+def day_prefix(kind, day=None):
+    day = day or datetime.utcnow()
+    return f"{kind}{day.strftime('%Y%m%d')}"
+
+
+def format_number(prefix, seq):
+    return f"{prefix}{seq:03d}"
+
+
+def _seed_value(connection, kind, prefix):
+    """Highest sequence already used for the prefix (numbers issued before the counter existed)"""
+    column = _NUMBER_COLUMNS[kind]
+    last = connection.execute(
+        select(column).where(column.like(f"{prefix}%"))
+        .order_by(func.length(column).desc(), column.desc()).limit(1)
+    ).scalar()
+    if not last:
+        return 0
+    try:
+        return int(last[len(prefix):])
+    except ValueError:
+        return 0
+
+
+def _advance(connection, kind, prefix, count):
+    """Advance the counter by ``count`` and return the new last value"""
+    bump = update(DocumentSequence).where(DocumentSequence.prefix == prefix).values(
+        last_value=DocumentSequence.last_value + count
+    )
+    if connection.execute(bump).rowcount != 1:
+        try:
+            with connection.begin_nested():
+                connection.execute(insert(DocumentSequence).values(
+                    prefix=prefix, last_value=_seed_value(connection, kind, prefix) + count
+                ))
+        except IntegrityError:
+            # Another worker started the day's counter first
+            connection.execute(bump)
+
+    return connection.execute(
+        select(DocumentSequence.last_value).where(DocumentSequence.prefix == prefix)
+    ).scalar()
+
+
+def reserve(kind, count=1, day=None):
+    """Reserve ``count`` consecutive numbers in the current transaction; returns the first sequence"""
+    prefix = day_prefix(kind, day)
+    last = _advance(db.session, kind, prefix, count)
+    return prefix, last - count + 1
+
+
+def _reserve_block(kind, prefix, size):
+    # Committed independently so a rollback in the caller cannot hand the block out twice
+    with db.engine.connect() as connection:
+        with connection.begin():
+            last = _advance(connection, kind, prefix, size)
+    return iter(range(last - size + 1, last + 1))
+
+
+def next_number(kind, day=None):
+    """Allocate the next request (REQUEST) or return (RETURN) number"""
+    block_size = current_app.config.get('DOCUMENT_NUMBER_BLOCK_SIZE', 1)
+    if block_size <= 1:
+        prefix, seq = reserve(kind, 1, day)
+        return format_number(prefix, seq)
+
+    prefix = day_prefix(kind, day)
+    with _blocks_lock:
+        key = (kind, prefix)
+        seq = next(_blocks.get(key, iter(())), None)
+        if seq is None:
+            # Drop yesterday's leftovers for this kind before starting a new block
+            for stale in [k for k in _blocks if k[0] == kind]:
+                del _blocks[stale]
+            _blocks[key] = _reserve_block(kind, prefix, block_size)
+            seq = next(_blocks[key])
+    return format_number(prefix, seq)
@@ -0,0 +1,127 @@
+"""
+Shared pagination helpers for list pages that cannot use Flask-SQLAlchemy's
+``Query.paginate`` directly (UNION queries, grouped report rows, etc.).
+
+``paginate_query`` also supports keyset ("seek") pagination: following a
+page's ``next_cursor`` filters on the last row's sort key instead of using
+OFFSET, so deep pages cost the same as the first one.
+"""
+
+from datetime import datetime
+from sqlalchemy import func, and_, or_
+from database import db
+
+CURSOR_SEPARATOR = '~'
+
+
+class Pagination:
+    """Page of results exposing the same attributes templates use from Flask-SQLAlchemy's paginator"""
+
+    def __init__(self, page, per_page, total, items, approximate=False):
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+        self.items = items
+        # True when ``total`` is a lower bound (counting stopped at a limit)
+        self.approximate = approximate
+        # Keyset cursor of the next page, when the pagination is keyset-based
+        self.next_cursor = None
+        self.pages = (total + per_page - 1) // per_page if per_page else 0
+        self.has_prev = page > 1
+        self.has_next = page * per_page < total
+        self.prev_num = page - 1 if self.has_prev else None
+        self.next_num = page + 1 if self.has_next else None
+
+    def __repr__(self):
+        return f'<Pagination page={self.page} per_page={self.per_page} total={self.total}>'
+
+
+def paginate_selectable(selectable, order_by, page, per_page):
+    """Count and slice a Core selectable (e.g. a UNION ALL) entirely in the database.
+
+    ``order_by`` is a callable receiving the selectable's subquery and returning
+    the ordering columns, so callers can sort on the union's output columns.
+    """
+    page = max(page or 1, 1)
+    subquery = selectable.subquery()
+
+    total = db.session.query(func.count()).select_from(subquery).scalar() or 0
+    rows = db.session.query(subquery).order_by(*order_by(subquery)).offset(
+        (page - 1) * per_page
+    ).limit(per_page).all()
+
+    return Pagination(page, per_page, total, rows)
+
+
+def count_rows(query, limit=None):
+    """``SELECT count(*) FROM (query)`` with the query's ordering dropped.
+
+    With ``limit`` counting stops after that many rows, bounding the cost on
+    very large result sets.
+    """
+    query = query.order_by(None)
+    if limit:
+        query = query.limit(limit)
+    return db.session.query(func.count()).select_from(query.subquery()).scalar() or 0
+
+
+def encode_cursor(values):
+    """Serialize a row's sort key for use in a URL"""
+    return CURSOR_SEPARATOR.join(
+        value.isoformat() if isinstance(value, datetime) else str(value) for value in values
+    )
+
+
+def decode_cursor(cursor, parsers):
+    """Parse a cursor made by encode_cursor; returns None if it is malformed"""
+    parts = (cursor or '').split(CURSOR_SEPARATOR)
+    if len(parts) != len(parsers):
+        return None
+    try:
+        return tuple(parse(part) for parse, part in zip(parsers, parts))
+    except (TypeError, ValueError):
+        return None
+
+
+def after_key(columns, values):
+    """Rows strictly after ``values`` in descending ``columns`` order: (a < x) OR (a = x AND b < y) ..."""
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [previous == value for previous, value in zip(columns[:i], values[:i])]
+        clauses.append(and_(*equal, column < values[i]))
+    return or_(*clauses)
+
+
+def paginate_query(query, keys, page, per_page, cursor=None, count_limit=None):
+    """Count and slice an ORM query newest-first on ``keys``.
+
+    ``keys`` is a sequence of (label, column, parse) triples forming a unique
+    descending sort key; ``label`` names the column in the result rows and
+    ``parse`` converts it back from a cursor. When ``cursor`` is valid the page
+    starts after that key, otherwise at ``(page - 1) * per_page``. A
+    ``count_limit`` makes the total approximate once it is exceeded.
+    """
+    page = max(page or 1, 1)
+    columns = [column for _, column, _ in keys]
+
+    total = count_rows(query, limit=count_limit + 1 if count_limit else None)
+    approximate = bool(count_limit) and total > count_limit
+    if approximate:
+        total = count_limit
+
+    after = decode_cursor(cursor, [parse for _, _, parse in keys]) if cursor else None
+    ordered = query.order_by(*(column.desc() for column in columns))
+    if after is not None:
+        ordered = ordered.filter(after_key(columns, after))
+    else:
+        ordered = ordered.offset((page - 1) * per_page)
+
+    # One extra row tells whether a next page exists, whatever the count says
+    rows = ordered.limit(per_page + 1).all()
+    pagination = Pagination(page, per_page, total, rows[:per_page], approximate)
+    pagination.has_next = len(rows) > per_page
+    pagination.next_num = page + 1 if pagination.has_next else None
+    if pagination.has_next:
+        last = rows[per_page - 1]
+        pagination.next_cursor = encode_cursor([getattr(last, label) for label, _, _ in keys])
+    return pagination
@@ -0,0 +1,107 @@
+"""
+Per-request SQL instrumentation.
+
+Hooks the SQLAlchemy engine's cursor events to count the statements each
+request runs and how long they take. Totals are returned to the browser in a
+``Server-Timing`` header (visible in the devtools network panel). Statements
+slower than SLOW_QUERY_THRESHOLD_MS, and requests that run more than
+QUERY_COUNT_LOG_THRESHOLD statements (the usual sign of an N+1 lazy load in a
+template loop), are written to the ``stock.sql`` logger as one JSON object
+per line.
+"""
+
+import json
+import logging
+import time
+from flask import g, request, current_app, has_request_context
+from sqlalchemy import event
+from database import db
+
+logger = logging.getLogger('stock.sql')
+
+
+class QueryStats:
+    """Statements run while handling one request"""
+
+    def __init__(self, keep=3):
+        self.count = 0
+        self.total_ms = 0.0
+        self.slowest = []
+        self.keep = keep
+
+    def add(self, statement, duration_ms):
+        self.count += 1
+        self.total_ms += duration_ms
+        self.slowest.append((duration_ms, statement))
+        self.slowest.sort(key=lambda entry: entry[0], reverse=True)
+        del self.slowest[self.keep:]
+
+
+def current_stats():
+    """QueryStats for the active request, or None outside a request"""
+    if not has_request_context():
+        return None
+    return g.get('_query_stats')
+
+
+def _log(event_name, **fields):
+    fields.update(event=event_name, method=request.method, path=request.path, endpoint=request.endpoint)
+    logger.warning(json.dumps(fields, default=str))
+
+
+def _shorten(statement, limit=500):
+    statement = ' '.join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit] + '...'
+
+
+def init_app(app):
+    """Attach the engine listeners and request hooks (no-op when QUERY_STATS_ENABLED is false)"""
+    app.config.setdefault('QUERY_STATS_ENABLED', True)
+    app.config.setdefault('SLOW_QUERY_THRESHOLD_MS', 200)
+    app.config.setdefault('QUERY_COUNT_LOG_THRESHOLD', 50)
+    if not app.config['QUERY_STATS_ENABLED']:
+        return
+
+    with app.app_context():
+        engines = [db.engine]
+    if app.extensions.get('db_replica') is not None:
+        engines.append(app.extensions['db_replica'])
+
+    # The start time lives on the execution context, which is discarded with a
+    # failed statement, so nothing is left behind on the pooled connection
+    def _start_timer(conn, cursor, statement, parameters, context, executemany):
+        context._query_start = time.perf_counter()
+
+    def _stop_timer(conn, cursor, statement, parameters, context, executemany):
+        duration_ms = (time.perf_counter() - context._query_start) * 1000
+        stats = current_stats()
+        if stats is None:
+            return
+        stats.add(statement, duration_ms)
+        if duration_ms >= current_app.config['SLOW_QUERY_THRESHOLD_MS']:
+            _log('slow_query', duration_ms=round(duration_ms, 2), statement=_shorten(statement))
+
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', _start_timer)
+        event.listen(engine, 'after_cursor_execute', _stop_timer)
+
+    @app.before_request
+    def _start_request_stats():
+        g._query_stats = QueryStats()
+        g._request_start = time.perf_counter()
+
+    @app.after_request
+    def _add_server_timing(response):
+        stats = current_stats()
+        if stats is None:
+            return response
+
+        total_ms = (time.perf_counter() - g._request_start) * 1000
+        response.headers.add('Server-Timing', f'db;dur={stats.total_ms:.2f};desc="{stats.count} queries"')
+        response.headers.add('Server-Timing', f'app;dur={total_ms:.2f}')
+
+        if stats.count > current_app.config['QUERY_COUNT_LOG_THRESHOLD']:
+            _log('query_count', queries=stats.count, db_ms=round(stats.total_ms, 2),
+                 slowest=[{'duration_ms': round(ms, 2), 'statement': _shorten(sql)}
+                          for ms, sql in stats.slowest])
+        return response
@@ -0,0 +1,173 @@
+"""
+Aggregate queries backing the reports dashboard and chart APIs.
+
+Every helper here answers its question with a single GROUP BY / conditional
+aggregation query so the number of round trips does not grow with the number
+of departments, statuses or months being reported on. Request and movement
+figures come from the daily rollups (see ``rollups``), so their cost depends
+on the number of days covered rather than the number of requests. They are
+read as they stand: ``rollups`` refreshes them in the background, so the
+figures trail writes by up to ROLLUP_REFRESH_INTERVAL seconds.
+"""
+
+from datetime import datetime
+from sqlalchemy import func, case, and_, select
+from database import db
+from models import (User, Department, Item, Location, RequestStatus, DailyRequestRollup,
+                    DailyItemRollup)
+from utils import get_ist_now
+
+
+def master_counts():
+    """Count active users, departments, items and locations in one round trip"""
+    row = db.session.query(
+        select(func.count(User.id)).where(User.is_active == True).scalar_subquery().label('total_users'),
+        select(func.count(Department.id)).scalar_subquery().label('total_departments'),
+        select(func.count(Item.id)).scalar_subquery().label('total_items'),
+        select(func.count(Location.id)).scalar_subquery().label('total_locations')
+    ).one()
+
+    return {
+        'total_users': row.total_users or 0,
+        'total_departments': row.total_departments or 0,
+        'total_items': row.total_items or 0,
+        'total_locations': row.total_locations or 0
+    }
+
+
+def request_status_counts(department_id=None):
+    """Return a {RequestStatus: count} mapping (every status present) plus the total"""
+    query = db.session.query(
+        DailyRequestRollup.status,
+        func.sum(DailyRequestRollup.request_count)
+    )
+    if department_id:
+        query = query.filter(DailyRequestRollup.department_id == department_id)
+
+    counts = {status: 0 for status in RequestStatus}
+    for status, count in query.group_by(DailyRequestRollup.status).all():
+        counts[status] = int(count or 0)
+
+    return counts, sum(counts.values())
+
+
+def status_distribution(counts, total):
+    """Shape status counts for the distribution chart"""
+    return [{
+        'status': status.value,
+        'count': counts[status],
+        'percentage': round((counts[status] / total * 100) if total > 0 else 0, 1)
+    } for status in RequestStatus]
+
+
+def month_windows(months=12, now=None):
+    """Return [(month_start, next_month_start)] for the last `months` calendar months, oldest first"""
+    now = now or get_ist_now()
+    year, month = now.year, now.month
+
+    windows = []
+    for _ in range(months):
+        start = datetime(year, month, 1)
+        end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+        windows.append((start, end))
+        year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+
+    windows.reverse()
+    return windows
+
+
+def monthly_request_counts(months=12, label_format='%b %Y', now=None):
+    """Count requests created per calendar month using one conditional-aggregation query"""
+    windows = month_windows(months, now)
+
+    columns = [
+        func.sum(case((and_(DailyRequestRollup.day >= start.date(),
+                            DailyRequestRollup.day < end.date()), DailyRequestRollup.request_count), else_=0))
+        for start, end in windows
+    ]
+    row = db.session.query(*columns).filter(
+        DailyRequestRollup.day >= windows[0][0].date(),
+        DailyRequestRollup.day < windows[-1][1].date()
+    ).one()
+
+    return [{
+        'month': start.strftime(label_format),
+        'requests': int(count or 0)
+    } for (start, _), count in zip(windows, row)]
+
+
+def department_request_stats():
+    """Per-department request totals and status breakdown in a single grouped query"""
+    def requests_with(status):
+        return func.sum(case((DailyRequestRollup.status == status, DailyRequestRollup.request_count), else_=0))
+
+    rows = db.session.query(
+        Department.id,
+        Department.name,
+        func.sum(DailyRequestRollup.request_count).label('total_requests'),
+        requests_with(RequestStatus.PENDING).label('pending'),
+        requests_with(RequestStatus.APPROVED).label('approved'),
+        requests_with(RequestStatus.ISSUED).label('issued'),
+        requests_with(RequestStatus.REJECTED).label('rejected')
+    ).outerjoin(
+        DailyRequestRollup, DailyRequestRollup.department_id == Department.id
+    ).group_by(Department.id, Department.name).all()
+
+    department_stats = []
+    for row in rows:
+        total = int(row.total_requests or 0)
+        issued = int(row.issued or 0)
+        department_stats.append({
+            'id': row.id,
+            'name': row.name,
+            'total_requests': total,
+            'issued_requests': issued,
+            'pending_requests': int(row.pending or 0),
+            'approved_requests': int(row.approved or 0),
+            'rejected_requests': int(row.rejected or 0),
+            'efficiency': round((issued / total * 100) if total > 0 else 0, 1)
+        })
+
+    return department_stats
+
+
+def top_requested_items(limit=10):
+    """Items with the largest approved or issued demand, with the number of request lines"""
+    total_quantity = func.sum(DailyItemRollup.quantity_requested)
+    rows = db.session.query(
+        Item.name,
+        Item.code,
+        total_quantity.label('total_quantity'),
+        func.sum(DailyItemRollup.request_lines).label('request_count')
+    ).join(DailyItemRollup, DailyItemRollup.item_id == Item.id).group_by(
+        Item.id, Item.name, Item.code
+    ).having(func.sum(DailyItemRollup.request_lines) > 0).order_by(total_quantity.desc()).limit(limit).all()
+
+    max_quantity = rows[0].total_quantity if rows else 1
+    return [{
+        'name': row.name,
+        'code': row.code,
+        'total_quantity': float(row.total_quantity),
+        'request_count': int(row.request_count),
+        'percentage': round((float(row.total_quantity) / float(max_quantity)) * 100, 1) if max_quantity else 0
+    } for row in rows]
+
+
+def movement_totals(first_day, last_day):
+    """Stock entries, issues and quantities moved between two days (inclusive)"""
+    items = db.session.query(
+        func.coalesce(func.sum(DailyItemRollup.entry_count), 0),
+        func.coalesce(func.sum(DailyItemRollup.quantity_procured), 0),
+        func.coalesce(func.sum(DailyItemRollup.quantity_issued), 0)
+    ).filter(DailyItemRollup.day >= first_day, DailyItemRollup.day <= last_day).one()
+    issues_count = db.session.query(
+        func.coalesce(func.sum(DailyRequestRollup.issued_count), 0)
+    ).filter(DailyRequestRollup.day >= first_day, DailyRequestRollup.day <= last_day).scalar()
+
+    entries_count, quantity_in, quantity_out = items
+    return {
+        'entries_count': int(entries_count),
+        'issues_count': int(issues_count),
+        'total_quantity_in': quantity_in,
+        'total_quantity_out': quantity_out,
+    }
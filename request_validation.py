@@ -0,0 +1,80 @@
+"""
+Validation of the item lines submitted with a stock request.
+
+Every line is checked and every problem is reported in one pass, so the user
+sees all of them at once. Stock is checked per item rather than per line:
+two lines for the same item must fit in the balance together. All items and
+their balances at the chosen location are read with a single query, however
+many lines the request has.
+"""
+
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation
+from database import db
+from models import Item, StockBalance
+
+
+def parse_lines(item_ids, quantities, item_remarks):
+    """Return (lines, errors); lines are (item_id, quantity, remark) in form order"""
+    lines = []
+    errors = []
+    for i, (item_id, qty) in enumerate(zip(item_ids, quantities)):
+        if not item_id or not qty:
+            continue
+        try:
+            qty_decimal = Decimal(qty)
+            item_id = int(item_id)
+        except (ValueError, TypeError, InvalidOperation):
+            errors.append(f'Invalid quantity for item {i+1}.')
+            continue
+        if not qty_decimal.is_finite() or qty_decimal <= 0:
+            errors.append(f'Invalid quantity for item {i+1}.')
+            continue
+        lines.append((item_id, qty_decimal, item_remarks[i] if i < len(item_remarks) else ''))
+    return lines, errors
+
+
+def requested_totals(lines):
+    """Total quantity and line count per item, in order of first appearance"""
+    totals = OrderedDict()
+    for item_id, quantity, _ in lines:
+        total, count = totals.get(item_id, (Decimal('0'), 0))
+        totals[item_id] = (total + quantity, count + 1)
+    return totals
+
+
+def availability_errors(location_id, lines):
+    """Messages for every item whose combined request exceeds its balance at the location"""
+    totals = requested_totals(lines)
+    if not totals:
+        return []
+
+    rows = db.session.query(Item.id, Item.code, Item.name, StockBalance.quantity).outerjoin(
+        StockBalance, db.and_(StockBalance.item_id == Item.id, StockBalance.location_id == location_id)
+    ).filter(Item.id.in_(list(totals))).all()
+    found = dict((row.id, row) for row in rows)
+
+    errors = []
+    for item_id, (quantity, line_count) in totals.items():
+        row = found.get(item_id)
+        if row is None:
+            errors.append(f'Item #{item_id} does not exist.')
+            continue
+
+        available_qty = row.quantity if row.quantity is not None else Decimal('0')
+        if available_qty <= 0:
+            errors.append(f"{row.name} ({row.code}) is out of stock at the selected location.")
+        elif available_qty < quantity:
+            across = f' across {line_count} lines' if line_count > 1 else ''
+            errors.append(f"{row.name} ({row.code}) has insufficient stock. "
+                          f"Available: {available_qty}, Requested: {quantity}{across}")
+    return errors
+
+
+def validate_lines(form, location_id):
+    """Parse and check the item lines of a request form; returns (lines, errors)"""
+    lines, errors = parse_lines(form.getlist('item_id[]'), form.getlist('quantity[]'),
+                                form.getlist('item_remarks[]'))
+    if not lines and not errors:
+        return lines, ['No valid items found in the request.']
+    return lines, errors + availability_errors(location_id, lines)
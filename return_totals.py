@@ -0,0 +1,75 @@
+"""
+Maintenance for StockIssueLine.quantity_returned_total.
+
+The column caches the sum of a line's completed returns so that return
+status filters and totals read one row instead of aggregating stock_returns.
+``inventory.complete_return`` keeps it current; the commands here find and
+repair lines whose cached total disagrees with their returns (for example
+after a manual data fix or on databases created before the column existed).
+"""
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import update
+from database import db
+from models import StockIssueLine, StockReturn, ReturnStatus
+
+
+def completed_returns_total():
+    """Correlated subquery: the sum of completed returns for the enclosing issue line"""
+    return db.select(db.func.coalesce(db.func.sum(StockReturn.quantity_returned), 0)).where(
+        StockReturn.issue_line_id == StockIssueLine.id,
+        StockReturn.status == ReturnStatus.COMPLETED
+    ).correlate_except(StockReturn).scalar_subquery()
+
+
+def find_drift(limit=None):
+    """(line_id, stored_total, actual_total) for lines whose cached total is wrong"""
+    actual = completed_returns_total()
+    query = db.session.query(StockIssueLine.id, StockIssueLine.quantity_returned_total, actual).filter(
+        StockIssueLine.quantity_returned_total != actual
+    ).order_by(StockIssueLine.id)
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+
+def backfill_statement():
+    """UPDATE recomputing every drifted total; also run by migration c4d1a9e7b250"""
+    actual = completed_returns_total()
+    return update(StockIssueLine.__table__).where(
+        StockIssueLine.quantity_returned_total != actual
+    ).values(quantity_returned_total=actual)
+
+
+def backfill():
+    """Recompute every drifted total in one UPDATE; returns the number of lines fixed (caller commits)"""
+    return db.session.execute(backfill_statement()).rowcount
+
+
+@click.command('check-return-totals')
+@click.option('--limit', default=20, show_default=True, help='Number of drifted lines to list.')
+@with_appcontext
+def check_return_totals_command(limit):
+    """Compare cached returned quantities with the completed returns; exit 1 on drift."""
+    drift = find_drift()
+    if not drift:
+        click.echo('Returned quantities are consistent.')
+        return
+
+    for line_id, stored, actual in drift[:limit]:
+        click.echo(f'line {line_id}: stored {stored}, completed returns {actual}')
+    click.echo(f'{len(drift)} issue line(s) out of step; run "flask backfill-return-totals" to repair.')
+    raise SystemExit(1)
+
+
+@click.command('backfill-return-totals')
+@with_appcontext
+def backfill_return_totals_command():
+    """Recompute quantity_returned_total from completed returns."""
+    count = backfill()
+    db.session.commit()
+    if count:
+        click.echo(f'Updated {count} issue line(s).')
+    else:
+        click.echo('Returned quantities already consistent; nothing to do.')
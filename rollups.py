@@ -0,0 +1,274 @@
+"""
+Daily reporting rollups.
+
+``daily_request_rollups`` counts requests per (day, department, location,
+status) and ``daily_item_rollups`` sums requested, issued, returned and
+procured quantities per (day, department, location, item), so report
+queries scan one row per day and key instead of every request line.
+
+Every flush that adds, changes or deletes a request, issue line, return or
+stock entry queues the days it touches in ``rollup_dirty_days`` (in the same
+transaction, so a rollback drops the marks too). ``refresh`` rebuilds just
+the queued days and clears them. Report views only read the rollups: each
+worker process refreshes them on a background thread every
+ROLLUP_REFRESH_INTERVAL seconds, or, with the interval set to 0,
+``flask refresh-rollups`` is run from cron instead.
+
+A database with data from before the rollups existed is backfilled by
+``ensure_populated``, which ``flask init-db``, the refresh command and the
+background refresher run first.
+"""
+
+import os
+import threading
+from datetime import datetime, timedelta
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, inspect
+from database import db
+from sql_functions import date_of
+from models import (StockIssueRequest, StockIssueLine, StockReturn, StockEntry, Item, RequestStatus,
+                    ReturnStatus, DailyRequestRollup, DailyItemRollup, RollupDirtyDay)
+
+# Requests whose lines count as demand in the item rollups
+DEMAND_STATUSES = (RequestStatus.APPROVED, RequestStatus.ISSUED)
+
+# Days recomputed per batch of GROUP BY queries
+DAYS_PER_BATCH = 200
+
+# The timestamps each tracked model files its figures under
+_DAY_ATTRIBUTES = {
+    StockIssueRequest: ('created_at', 'issued_at'),
+    StockReturn: ('processed_at',),
+    StockEntry: ('created_at',),
+}
+
+
+def _attribute_days(obj, names):
+    """Days of the current and previous values of ``names`` on an instance"""
+    state = inspect(obj)
+    days = set()
+    for name in names:
+        history = state.attrs[name].history
+        for value in history.sum() or [getattr(obj, name)]:
+            if isinstance(value, datetime):
+                days.add(value.date())
+    return days
+
+
+def days_touched(objects):
+    """Days whose rollups change when ``objects`` are inserted, updated or deleted"""
+    days = set()
+    for obj in objects:
+        if isinstance(obj, StockIssueLine):
+            obj = obj.request
+            if obj is None:
+                continue
+        names = _DAY_ATTRIBUTES.get(type(obj))
+        if names:
+            days |= _attribute_days(obj, names)
+    return days
+
+
+@event.listens_for(db.session, 'after_flush')
+def _queue_dirty_days(session, flush_context):
+    # After the INSERTs column defaults are filled in, while new/dirty/deleted and
+    # attribute history still describe what was just flushed
+    objects = list(session.new) + [obj for obj in session.dirty if session.is_modified(obj)] + list(session.deleted)
+    days = days_touched(objects)
+    if days:
+        session.connection().execute(RollupDirtyDay.__table__.insert(), [{'day': day} for day in sorted(days)])
+
+
+def _day_filter(column, days):
+    """Restrict ``column`` to the given days (None means every day)"""
+    if days is None:
+        return [column.isnot(None)]
+    return [
+        column >= datetime.combine(min(days), datetime.min.time()),
+        column < datetime.combine(max(days) + timedelta(days=1), datetime.min.time()),
+        date_of(column).in_(days),
+    ]
+
+
+def _request_rows(days):
+    rows = {}
+    created_day, issued_day = date_of(StockIssueRequest.created_at), date_of(StockIssueRequest.issued_at)
+    key = (StockIssueRequest.department_id, StockIssueRequest.location_id, StockIssueRequest.status)
+    for day_column, timestamp, field in ((created_day, StockIssueRequest.created_at, 'request_count'),
+                                         (issued_day, StockIssueRequest.issued_at, 'issued_count')):
+        grouped = db.session.query(day_column, *key, db.func.count(StockIssueRequest.id)).filter(
+            *_day_filter(timestamp, days)
+        ).group_by(day_column, *key)
+        for day, department_id, location_id, status, count in grouped:
+            row = rows.setdefault((day, department_id, location_id, status), {
+                'day': day, 'department_id': department_id, 'location_id': location_id, 'status': status,
+                'request_count': 0, 'issued_count': 0
+            })
+            row[field] = count
+    return list(rows.values())
+
+
+def _item_sources():
+    """(timestamp, department, location, sums, extra filters) for each figure of the item rollups"""
+    line_key = (StockIssueRequest.department_id, StockIssueRequest.location_id, StockIssueLine.item_id)
+    return [
+        (StockIssueRequest.created_at, line_key,
+         {'quantity_requested': db.func.sum(StockIssueLine.quantity_requested),
+          'request_lines': db.func.count(StockIssueLine.id)},
+         lambda query: query.select_from(StockIssueLine).join(StockIssueLine.request).filter(
+             StockIssueRequest.status.in_(DEMAND_STATUSES))),
+        (StockIssueRequest.issued_at, line_key,
+         {'quantity_issued': db.func.sum(StockIssueLine.quantity_issued)},
+         lambda query: query.select_from(StockIssueLine).join(StockIssueLine.request).filter(
+             StockIssueLine.quantity_issued.isnot(None))),
+        (StockReturn.processed_at, line_key,
+         {'quantity_returned': db.func.sum(StockReturn.quantity_returned)},
+         lambda query: query.select_from(StockReturn).join(StockReturn.issue_line).join(
+             StockIssueLine.request).filter(StockReturn.status == ReturnStatus.COMPLETED)),
+        (StockEntry.created_at, (Item.department_id, StockEntry.location_id, StockEntry.item_id),
+         {'quantity_procured': db.func.sum(StockEntry.quantity_procured),
+          'entry_count': db.func.count(StockEntry.id)},
+         lambda query: query.select_from(StockEntry).join(Item, StockEntry.item_id == Item.id)),
+    ]
+
+
+def _item_rows(days):
+    rows = {}
+    for timestamp, key, sums, shape in _item_sources():
+        day_column = date_of(timestamp)
+        grouped = shape(db.session.query(day_column, *key, *sums.values())).filter(
+            *_day_filter(timestamp, days)
+        ).group_by(day_column, *key)
+        for day, department_id, location_id, item_id, *values in grouped:
+            row = rows.setdefault((day, department_id, location_id, item_id), {
+                'day': day, 'department_id': department_id, 'location_id': location_id, 'item_id': item_id,
+                'quantity_requested': 0, 'request_lines': 0, 'quantity_issued': 0,
+                'quantity_returned': 0, 'quantity_procured': 0, 'entry_count': 0
+            })
+            row.update(zip(sums, values))
+    return list(rows.values())
+
+
+def rebuild(days=None):
+    """Recompute the rollups for ``days`` (every day when None); the caller commits"""
+    batches = [None] if days is None else [
+        days[i:i + DAYS_PER_BATCH] for i in range(0, len(days), DAYS_PER_BATCH)
+    ]
+    for batch in batches:
+        for model, rows in ((DailyRequestRollup, _request_rows(batch)), (DailyItemRollup, _item_rows(batch))):
+            delete = db.session.query(model)
+            if batch is not None:
+                delete = delete.filter(model.day.in_(batch))
+            delete.delete(synchronize_session=False)
+            if rows:
+                db.session.execute(db.insert(model), rows)
+
+
+def refresh():
+    """Rebuild every queued day, clear the queue and commit; returns the days refreshed"""
+    # Row locks make a concurrent refresher wait for this one rather than repeat its work
+    queued = db.session.query(RollupDirtyDay.id, RollupDirtyDay.day).with_for_update().all()
+    if not queued:
+        return []
+
+    days = sorted(set(day for _, day in queued))
+    rebuild(days)
+    ids = [queue_id for queue_id, _ in queued]
+    for i in range(0, len(ids), DAYS_PER_BATCH):
+        db.session.query(RollupDirtyDay).filter(
+            RollupDirtyDay.id.in_(ids[i:i + DAYS_PER_BATCH])
+        ).delete(synchronize_session=False)
+    db.session.commit()
+    return days
+
+
+def ensure_populated():
+    """Rebuild everything if the rollups are empty but there is data to roll up; returns whether it did"""
+    if db.session.query(DailyRequestRollup.query.exists()).scalar() or \
+            db.session.query(DailyItemRollup.query.exists()).scalar():
+        return False
+    if not (db.session.query(StockIssueRequest.query.exists()).scalar() or
+            db.session.query(StockEntry.query.exists()).scalar()):
+        return False
+    db.session.query(RollupDirtyDay).delete(synchronize_session=False)
+    rebuild()
+    db.session.commit()
+    return True
+
+
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+def _run_logged(app, step, message):
+    """Run one refresher step in its own app context; a failure is logged, not raised"""
+    with app.app_context():
+        try:
+            step()
+        except Exception:
+            db.session.rollback()
+            app.logger.exception(message)
+        finally:
+            db.session.remove()
+
+
+def _refresh_periodically(app, interval, stop):
+    _run_logged(app, ensure_populated, 'Rollup backfill failed')
+    while not stop.wait(interval):
+        _run_logged(app, refresh, 'Rollup refresh failed')
+
+
+def start_refresher(app):
+    """Start this process's background refresher if it is not running; returns its stop event"""
+    global _refresher
+    interval = app.config.get('ROLLUP_REFRESH_INTERVAL', 60)
+    if interval <= 0:
+        return None
+    with _refresher_lock:
+        # A forked worker inherits the variable but not the thread
+        if _refresher is None or _refresher[0] != os.getpid():
+            stop = threading.Event()
+            threading.Thread(target=_refresh_periodically, args=(app, interval, stop),
+                             name='rollup-refresh', daemon=True).start()
+            _refresher = (os.getpid(), stop)
+        return _refresher[1]
+
+
+def stop_refresher():
+    global _refresher
+    with _refresher_lock:
+        if _refresher is not None:
+            _refresher[1].set()
+            _refresher = None
+
+
+def init_app(app):
+    """Start the refresher with the first request each worker handles"""
+
+    @app.before_request
+    def _start_refresher():
+        if _refresher is None or _refresher[0] != os.getpid():
+            start_refresher(app)
+
+
+@click.command('refresh-rollups')
+@click.option('--full', is_flag=True, help='Rebuild every day instead of only the queued ones.')
+@with_appcontext
+def refresh_rollups_command(full):
+    """Bring the daily reporting rollups up to date."""
+    if full:
+        db.session.query(RollupDirtyDay).delete(synchronize_session=False)
+        rebuild()
+        db.session.commit()
+        click.echo('Rebuilt all daily rollups.')
+        return
+
+    if ensure_populated():
+        click.echo('Rollups were empty; rebuilt all days.')
+        return
+    days = refresh()
+    if days:
+        click.echo(f'Refreshed {len(days)} day(s): {days[0]} to {days[-1]}.')
+    else:
+        click.echo('Rollups are up to date.')
@@ -437,5 +437,6 @@ if __name__ == '__main__':
 
     app = create_app()
     with app.app_context():
+        db.create_all()
         seed_initial_data()
         print("Seed data created successfully!")
\ No newline at end of file
@@ -0,0 +1,47 @@
+"""
+Date functions that compile to the right SQL on SQLite and PostgreSQL.
+
+SQLite has no date types, so day arithmetic goes through julianday() and
+date(); PostgreSQL subtracts timestamps into intervals and casts to DATE.
+Reports use these instead of dialect-specific ``func`` calls.
+"""
+
+from sqlalchemy import Date, Float
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+
+class days_between(FunctionElement):
+    """Fractional days from the first timestamp to the second: ``days_between(start, end)``"""
+    type = Float()
+    name = 'days_between'
+    inherit_cache = True
+
+
+@compiles(days_between)
+def _days_between_default(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return f'(EXTRACT(EPOCH FROM ({compiler.process(end, **kw)} - {compiler.process(start, **kw)})) / 86400.0)'
+
+
+@compiles(days_between, 'sqlite')
+def _days_between_sqlite(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return f'(julianday({compiler.process(end, **kw)}) - julianday({compiler.process(start, **kw)}))'
+
+
+class date_of(FunctionElement):
+    """The calendar day of a timestamp"""
+    type = Date()
+    name = 'date_of'
+    inherit_cache = True
+
+
+@compiles(date_of)
+def _date_of_default(element, compiler, **kw):
+    return f'CAST({compiler.process(element.clauses, **kw)} AS DATE)'
+
+
+@compiles(date_of, 'sqlite')
+def _date_of_sqlite(element, compiler, **kw):
+    return f'date({compiler.process(element.clauses, **kw)})'
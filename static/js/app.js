@@ -17,11 +17,74 @@ document.addEventListener('DOMContentLoaded', function() {
             width: '100%',
             theme: 'default'
         });
+        $('.item-search-select').each(function() {
+            initializeItemSearch(this);
+        });
     }
 
     console.log('IT Stock Management App initialized');
 });
 
+// Item typeahead: loads matching items from the search API page by page
+function initializeItemSearch(select) {
+    return $(select).select2({
+        placeholder: "Type to search items...",
+        allowClear: true,
+        width: '100%',
+        theme: 'default',
+        minimumInputLength: 0,
+        ajax: {
+            url: '/api/items/search',
+            dataType: 'json',
+            delay: 250,
+            data: function(params) {
+                return { q: params.term || '', page: params.page || 1 };
+            }
+        }
+    });
+}
+
+// Stock balance lookups made in the same tick are sent as one bulk request
+const STOCK_BALANCE_BATCH = 200;
+const stockBalanceQueue = [];
+let stockBalanceTimer = null;
+
+function fetchStockBalance(itemId, locationId) {
+    return new Promise((resolve, reject) => {
+        stockBalanceQueue.push({ key: `${itemId}:${locationId}`, resolve, reject });
+        if (!stockBalanceTimer) {
+            stockBalanceTimer = setTimeout(flushStockBalances, 0);
+        }
+    });
+}
+
+function flushStockBalances() {
+    const waiting = stockBalanceQueue.splice(0);
+    stockBalanceTimer = null;
+
+    const keys = [...new Set(waiting.map(entry => entry.key))];
+    for (let start = 0; start < keys.length; start += STOCK_BALANCE_BATCH) {
+        const chunk = keys.slice(start, start + STOCK_BALANCE_BATCH);
+        const entries = waiting.filter(entry => chunk.includes(entry.key));
+        const params = new URLSearchParams();
+        chunk.forEach(key => params.append('pair', key));
+
+        fetch(`/api/stock_balances?${params}`, { credentials: 'same-origin' })
+            .then(response => response.ok ? response.json() : Promise.reject(new Error(response.statusText)))
+            .then(data => {
+                const balances = new Map(data.balances.map(b => [`${b.item_id}:${b.location_id}`, b.balance]));
+                entries.forEach(entry => {
+                    if (balances.has(entry.key)) {
+                        entry.resolve(balances.get(entry.key));
+                    } else {
+                        entry.reject(new Error('Access denied'));
+                    }
+                });
+            })
+            .catch(error => entries.forEach(entry => entry.reject(error)));
+    }
+}
+
 // Mobile Menu Functionality
 function initializeMobileMenu() {
     const mobileMenuButton = document.getElementById('mobile-menu-button');
@@ -1,10 +1,17 @@
 """
 Test configuration and fixtures for IT Stock Management System
+
+The suite runs once per backend in TEST_DATABASES (default "sqlite,postgresql").
+PostgreSQL uses TEST_POSTGRES_URL when set; otherwise a throwaway cluster is
+started with the local initdb/pg_ctl, and its tests are skipped if there is none.
 """
 
 import pytest
 import tempfile
 import os
+import shutil
+import socket
+import subprocess
 from decimal import Decimal
 from werkzeug.security import generate_password_hash
 
@@ -13,31 +20,101 @@ from models import (User, UserRole, Department, Location, Item, Employee,
                    StockBalance, StockEntry, StockIssueRequest, StockIssueLine,
                    RequestStatus, Audit)
 
+BACKENDS = [name.strip() for name in os.environ.get('TEST_DATABASES', 'sqlite,postgresql').split(',') if name.strip()]
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'sqlite_only: the test relies on SQLite-specific SQL or features')
+
+
+def _postgres_binary(name):
+    found = shutil.which(name)
+    if found:
+        return found
+    pg_config = shutil.which('pg_config')
+    if pg_config:
+        bindir = subprocess.run([pg_config, '--bindir'], capture_output=True, text=True).stdout.strip()
+        candidate = os.path.join(bindir, name)
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
 @pytest.fixture(scope='session')
-def app():
-    """Create and configure a new app instance for each test session."""
-    # Create a temporary file to serve as the database
-    db_fd, db_path = tempfile.mkstemp()
-    
-    # Create app with testing configuration
-    app = create_app()
-    app.config.update({
+def postgres_uri():
+    """URI of a PostgreSQL database for the run, starting a temporary cluster if needed"""
+    pytest.importorskip('psycopg2', reason='psycopg2 is not installed')
+    if os.environ.get('TEST_POSTGRES_URL'):
+        yield os.environ['TEST_POSTGRES_URL']
+        return
+
+    initdb, pg_ctl = _postgres_binary('initdb'), _postgres_binary('pg_ctl')
+    if not initdb or not pg_ctl:
+        pytest.skip('PostgreSQL server binaries not found; set TEST_POSTGRES_URL')
+    if hasattr(os, 'geteuid') and os.geteuid() == 0:
+        pytest.skip('initdb refuses to run as root; set TEST_POSTGRES_URL')
+
+    base = tempfile.mkdtemp()
+    data = os.path.join(base, 'data')
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    subprocess.run([initdb, '-D', data, '-U', 'postgres', '-A', 'trust'], check=True, capture_output=True)
+    subprocess.run([pg_ctl, '-D', data, '-w', '-l', os.path.join(base, 'server.log'),
+                    '-o', f"-p {port} -k {base} -c listen_addresses=''", 'start'], check=True, capture_output=True)
+    try:
+        yield f'postgresql+psycopg2://postgres@/postgres?host={base}&port={port}'
+    finally:
+        subprocess.run([pg_ctl, '-D', data, '-m', 'immediate', 'stop'], capture_output=True)
+        shutil.rmtree(base, ignore_errors=True)
+
+
+@pytest.fixture(scope='session', params=BACKENDS)
+def app(request):
+    """Create and configure a new app instance for each test session and backend."""
+    db_path = None
+    if request.param == 'sqlite':
+        # Create a temporary file to serve as the database
+        db_fd, db_path = tempfile.mkstemp()
+        os.close(db_fd)
+        uri = f'sqlite:///{db_path}'
+    else:
+        uri = request.getfixturevalue('postgres_uri')
+
+    # Create app with testing configuration (applied before extensions bind
+    # their engines so the temporary database is actually used)
+    app = create_app({
         'TESTING': True,
-        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+        'SQLALCHEMY_DATABASE_URI': uri,
         'SQLALCHEMY_TRACK_MODIFICATIONS': False,
         'WTF_CSRF_ENABLED': False,  # Disable CSRF for testing
         'SECRET_KEY': 'test-secret-key',
-        'SESSION_SECRET': 'test-session-secret'
+        'SESSION_SECRET': 'test-session-secret',
+        'ROLLUP_REFRESH_INTERVAL': 0,  # tests refresh explicitly
     })
     
     # Establish an application context
     with app.app_context():
+        # Start from an empty schema
+        _db.drop_all()
         _db.create_all()
         yield app
+        _db.session.remove()
+        _db.engine.dispose()
         
     # Clean up
-    os.close(db_fd)
-    os.unlink(db_path)
+    if db_path:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.unlink(db_path + suffix)
+
+
+@pytest.fixture(autouse=True)
+def _backend_markers(request):
+    """Skip sqlite_only tests on other backends"""
+    if request.node.get_closest_marker('sqlite_only') and 'app' in request.fixturenames:
+        if request.getfixturevalue('app').config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0] != 'sqlite':
+            pytest.skip('SQLite-specific test')
 
 @pytest.fixture(scope='function')
 def db(app):
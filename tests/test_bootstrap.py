@@ -0,0 +1,109 @@
+"""
+Tests for app startup and the database setup commands
+"""
+
+from decimal import Decimal
+from sqlalchemy import inspect, text
+from werkzeug.security import check_password_hash
+from app import create_app, BLUEPRINTS
+from bootstrap import init_db_command, create_admin_command
+from database import db as _db
+from models import (User, UserRole, CacheVersion, Department, Location, Item, StockIssueRequest, StockIssueLine,
+                    StockReturn, RequestStatus, ReturnStatus)
+
+
+class TestStartup:
+    """Test creating the app leaves the database alone"""
+
+    def test_create_app_does_not_touch_database(self, tmp_path):
+        """Test the factory neither creates tables nor opens the database file"""
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'fresh.db'}", 'ROLLUP_REFRESH_INTERVAL': 0})
+
+        assert not (tmp_path / 'fresh.db').exists()
+        assert len(BLUEPRINTS) == len(app.blueprints)
+        assert 'migrate' in app.extensions
+
+    def test_fast_startup_skips_migrate(self, tmp_path):
+        """Test FAST_STARTUP leaves Flask-Migrate out"""
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'fresh.db'}", 'FAST_STARTUP': True,
+                          'ROLLUP_REFRESH_INTERVAL': 0})
+
+        assert 'migrate' not in app.extensions
+        assert 'init-db' in app.cli.commands
+
+
+class TestSetupCommands:
+    """Test init-db and create-admin"""
+
+    def test_init_db_creates_tables(self, app, db, runner):
+        """Test init-db restores a dropped table"""
+        CacheVersion.__table__.drop(db.engine)
+
+        result = runner.invoke(init_db_command)
+
+        assert result.exit_code == 0
+        assert 'cache_versions' in inspect(db.engine).get_table_names()
+
+    def test_init_db_stamps_a_fresh_database(self, tmp_path):
+        """Test an empty database is created from the models and marked as fully migrated"""
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'fresh.db'}", 'FAST_STARTUP': True,
+                          'ROLLUP_REFRESH_INTERVAL': 0})
+
+        result = app.test_cli_runner().invoke(init_db_command)
+
+        assert result.exit_code == 0, result.output
+        with app.app_context():
+            assert 'stock_issue_lines' in inspect(_db.engine).get_table_names()
+            version = _db.session.execute(text('SELECT version_num FROM alembic_version')).scalar()
+            _db.engine.dispose()
+        assert version == 'c4d1a9e7b250'
+
+    def test_init_db_migrates_an_existing_database(self, tmp_path):
+        """Test an older schema gets the missing column, backfilled from completed returns"""
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'old.db'}",
+                          'ROLLUP_REFRESH_INTERVAL': 0})
+        with app.app_context():
+            _db.create_all()
+            user = User(username='u', password_hash='x', full_name='U', email='u@example.com',
+                        role=UserRole.EMPLOYEE)
+            request = StockIssueRequest(request_no='R1', requester=user, department=Department(code='D', name='D'),
+                                        location=Location(office='HQ', room='1', code='HQ-1'), purpose='p',
+                                        status=RequestStatus.ISSUED)
+            line = StockIssueLine(request=request, item=Item(code='I1', name='Item'),
+                                  quantity_requested=Decimal('5'), quantity_issued=Decimal('5'))
+            for number, status in (('RT1', ReturnStatus.COMPLETED), ('RT2', ReturnStatus.PENDING)):
+                _db.session.add(StockReturn(return_no=number, issue_line=line, returner=user,
+                                            quantity_returned=Decimal('1'), return_reason='r', status=status))
+            _db.session.commit()
+            # As the table was before the column existed
+            _db.session.execute(text('ALTER TABLE stock_issue_lines DROP COLUMN quantity_returned_total'))
+            _db.session.commit()
+            _db.session.remove()
+
+        result = app.test_cli_runner().invoke(init_db_command)
+
+        assert result.exit_code == 0, result.output
+        assert 'Database upgraded.' in result.output
+        with app.app_context():
+            total = _db.session.execute(text('SELECT quantity_returned_total FROM stock_issue_lines')).scalar()
+            _db.session.remove()
+            _db.engine.dispose()
+        assert Decimal(str(total)) == Decimal('1')
+
+    def test_create_admin(self, db, runner):
+        """Test create-admin adds a superadmin who can log in"""
+        result = runner.invoke(create_admin_command, ['--username', 'boss', '--password', 'secret-pw',
+                                                      '--email', 'boss@example.com'])
+
+        assert result.exit_code == 0
+        user = User.query.filter_by(username='boss').one()
+        assert user.role == UserRole.SUPERADMIN
+        assert check_password_hash(user.password_hash, 'secret-pw')
+
+    def test_create_admin_refuses_duplicates(self, db, runner, sample_user):
+        """Test an existing username is reported, not overwritten"""
+        result = runner.invoke(create_admin_command, ['--username', sample_user.username, '--password', 'x'])
+
+        assert result.exit_code != 0
+        assert 'already exists' in result.output
+        assert User.query.count() == 1
@@ -0,0 +1,59 @@
+"""
+Tests for the database connection profile
+"""
+
+import importlib
+import pytest
+from sqlalchemy import text
+import config
+import db_config
+
+
+def settings(**overrides):
+    values = dict((name, getattr(config.Config, name)) for name in dir(config.Config) if name.isupper())
+    values.update(overrides)
+    return values
+
+
+class TestDbConfig:
+    """Test engine options and SQLite pragmas"""
+
+    def test_sqlite_options(self):
+        """Test SQLite gets the driver lock timeout and no pool sizing"""
+        options = db_config.engine_options(settings(SQLALCHEMY_DATABASE_URI='sqlite:///x.db',
+                                                    SQLITE_BUSY_TIMEOUT_MS=2500))
+
+        assert options == {'connect_args': {'timeout': 2.5}}
+
+    def test_server_pool_options(self):
+        """Test server databases get a sized, recycled, pre-pinged pool"""
+        options = db_config.engine_options(settings(SQLALCHEMY_DATABASE_URI='postgresql://u@db/stock',
+                                                    DB_POOL_SIZE=12, DB_POOL_RECYCLE=600))
+
+        assert options['pool_size'] == 12
+        assert options['pool_recycle'] == 600
+        assert options['pool_pre_ping'] is True
+
+    @pytest.mark.sqlite_only
+    def test_pragmas_applied(self, db):
+        """Test new connections of the app engine carry the profile"""
+        with db.engine.connect() as conn:
+            pragma = lambda name: conn.execute(text(f'PRAGMA {name}')).scalar()
+
+            assert pragma('journal_mode') == 'wal'
+            assert pragma('synchronous') == 1  # NORMAL
+            assert pragma('busy_timeout') == config.Config.SQLITE_BUSY_TIMEOUT_MS
+            assert pragma('cache_size') == -config.Config.SQLITE_CACHE_SIZE_KB
+            assert pragma('temp_store') == 2  # MEMORY
+
+    def test_settings_from_environment(self, monkeypatch):
+        """Test the URI and pool sizes are read from the environment"""
+        monkeypatch.setenv('DATABASE_URL', 'postgresql://u@db/stock')
+        monkeypatch.setenv('DB_POOL_SIZE', '20')
+        try:
+            reloaded = importlib.reload(config)
+            assert reloaded.Config.SQLALCHEMY_DATABASE_URI == 'postgresql://u@db/stock'
+            assert reloaded.Config.DB_POOL_SIZE == 20
+        finally:
+            monkeypatch.undo()
+            importlib.reload(config)
@@ -0,0 +1,146 @@
+"""
+Tests for read/write routing to the read-only SQLite pool
+"""
+
+import time
+import pytest
+from datetime import datetime
+from decimal import Decimal
+from flask import g
+from sqlalchemy import event, text, update
+from sqlalchemy.exc import OperationalError
+from werkzeug.security import generate_password_hash
+from app import create_app
+from database import db
+from models import User, UserRole, Item, Location, StockEntry, RollupDirtyDay
+import db_routing
+
+
+@pytest.fixture
+def routed_app(tmp_path):
+    """An app on its own SQLite file with the read-only pool enabled"""
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'routed.db'}",
+        'SQLITE_READ_ONLY_POOL': True,
+        'ROLLUP_REFRESH_INTERVAL': 0,
+        'WTF_CSRF_ENABLED': False,
+    })
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username='reporter', password_hash=generate_password_hash('password123'),
+                            full_name='Reporter', email='reporter@example.com', role=UserRole.SUPERADMIN))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+        app.extensions['db_replica'].dispose()
+
+
+@pytest.fixture
+def reporter(routed_app):
+    """A logged-in client whose login write is older than the staleness window"""
+    client = routed_app.test_client()
+    client.post('/auth/login', data={'username': 'reporter', 'password': 'password123'})
+    with client.session_transaction() as session:
+        session.pop(db_routing.LAST_WRITE_KEY, None)
+    return client
+
+
+def statements_on(engine, action):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        action()
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+    return statements
+
+
+class TestDbRouting:
+    """Test which engine each kind of request reads from"""
+
+    def test_replica_uri(self, routed_app):
+        """Test the SQLite primary gets a read-only URI on the same file and is not replicated otherwise"""
+        url = db.engine.url
+        config = dict(routed_app.config)
+
+        assert db_routing.replica_uri(config, url) == f'sqlite:///file:{url.database}?mode=ro&uri=true'
+        assert db_routing.replica_uri(dict(config, SQLITE_READ_ONLY_POOL=False), url) is None
+        assert db_routing.replica_uri(dict(config, DATABASE_REPLICA_URL='postgresql://r@replica/stock'),
+                                      url) == 'postgresql://r@replica/stock'
+
+    def test_replica_is_read_only(self, routed_app):
+        """Test the replica pool refuses writes"""
+        with routed_app.extensions['db_replica'].connect() as conn:
+            assert conn.execute(text('SELECT COUNT(*) FROM users')).scalar() >= 1
+            with pytest.raises(OperationalError):
+                conn.execute(text("UPDATE users SET full_name = 'x'"))
+
+    def test_report_reads_from_replica(self, routed_app, reporter):
+        """Test a report page runs its queries on the replica and none on the primary"""
+        replica = routed_app.extensions['db_replica']
+        reporter.get('/reports/full-balance')  # seeds the master-data cache version on the primary
+        response = []
+        on_replica = []
+        on_primary = statements_on(db.engine, lambda: on_replica.extend(
+            statements_on(replica, lambda: response.append(reporter.get('/reports/full-balance')))))
+
+        assert response[0].status_code == 200
+        assert on_replica
+        assert on_primary == []
+
+    def test_other_pages_use_primary(self, routed_app, reporter):
+        """Test pages outside REPLICA_ROUTES never touch the replica"""
+        replica = routed_app.extensions['db_replica']
+        response = []
+
+        assert statements_on(replica, lambda: response.append(reporter.get('/dashboard'))) == []
+        assert response[0].status_code == 200
+
+    def test_own_write_reads_primary(self, routed_app, reporter):
+        """Test a user who just wrote reads reports from the primary until the window passes"""
+        replica = routed_app.extensions['db_replica']
+        with reporter.session_transaction() as session:
+            session[db_routing.LAST_WRITE_KEY] = time.time()
+
+        assert statements_on(replica, lambda: reporter.get('/reports/full-balance')) == []
+
+        with reporter.session_transaction() as session:
+            session[db_routing.LAST_WRITE_KEY] = time.time() - routed_app.config['DB_REPLICA_STALENESS_SECONDS']
+        assert statements_on(replica, lambda: reporter.get('/reports/full-balance'))
+
+    def test_write_pins_request_to_primary(self, routed_app):
+        """Test the first DML of a routed request moves the rest of it to the primary"""
+        replica = routed_app.extensions['db_replica']
+        with routed_app.test_request_context('/reports/full-balance'):
+            routed_app.preprocess_request()
+            assert g._db_read_replica
+
+            assert statements_on(replica, lambda: User.query.count())
+            db.session.execute(update(User).values(full_name='Renamed'))
+            assert statements_on(replica, lambda: User.query.count()) == []
+            assert g._db_wrote
+            db.session.rollback()
+
+    def test_dashboard_reads_rollups_without_writing(self, routed_app, reporter):
+        """Test the reports dashboard leaves queued rollup days for the refresher"""
+        user = User.query.filter_by(username='reporter').one()
+        item = Item(code='RT-1', name='Routed item')
+        location = Location(office='HQ', room='R1', code='RT-LOC')
+        db.session.add_all([item, location])
+        db.session.flush()
+        db.session.add(StockEntry(item_id=item.id, location_id=location.id, quantity_procured=Decimal('3'),
+                                  created_by=user.id, created_at=datetime(2024, 5, 1, 9, 0)))
+        db.session.commit()
+
+        response = reporter.get('/reports/reports')
+
+        assert response.status_code == 200
+        assert RollupDirtyDay.query.count() == 1
+        with reporter.session_transaction() as session:
+            assert db_routing.LAST_WRITE_KEY not in session
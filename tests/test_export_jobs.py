@@ -0,0 +1,146 @@
+"""
+Unit tests for background export jobs
+"""
+
+import csv
+import gzip
+import io
+import time
+import pytest
+from datetime import timedelta
+from decimal import Decimal
+from models import ExportJob, ExportStatus, StockBalance, User, UserRole
+from utils import get_ist_now
+
+
+@pytest.fixture
+def export_config(app, monkeypatch, tmp_path):
+    """Run jobs inline and write artifacts to a temporary directory"""
+    monkeypatch.setitem(app.config, 'EXPORT_WORKERS', 0)
+    monkeypatch.setitem(app.config, 'EXPORT_DIR', str(tmp_path))
+    return tmp_path
+
+
+class TestExportJobs:
+    """Test job submission, artifact caching and download"""
+
+    def test_export_produces_gzipped_csv(self, logged_in_admin, db, export_config, sample_item,
+                                         sample_location):
+        """Test a stock export job writes a compressed CSV and can be downloaded"""
+        db.session.add(StockBalance(item_id=sample_item.id, location_id=sample_location.id,
+                                    quantity=Decimal('4')))
+        db.session.commit()
+
+        response = logged_in_admin.post('/exports/', data={'type': 'stock'})
+        job = ExportJob.query.one()
+        assert response.status_code == 302
+        assert response.location.endswith(f'/exports/{job.id}')
+
+        status = logged_in_admin.get(f'/exports/{job.id}/status').get_json()
+        assert status['status'] == 'Done'
+        assert status['row_count'] == 1
+
+        download = logged_in_admin.get(status['download_url'])
+        rows = list(csv.reader(io.StringIO(gzip.decompress(download.data).decode())))
+        assert rows[0][0] == 'Item Code'
+        assert rows[1][0] == sample_item.code
+
+    def test_identical_export_reuses_artifact(self, logged_in_admin, db, export_config):
+        """Test a repeat request within the TTL returns the finished job"""
+        logged_in_admin.post('/exports/', data={'type': 'departments'})
+        logged_in_admin.post('/exports/', data={'type': 'departments'})
+        logged_in_admin.post('/exports/', data={'type': 'full_balance', 'show_zero_stock': 'yes'})
+
+        assert ExportJob.query.filter_by(kind='departments').count() == 1
+        assert ExportJob.query.count() == 2
+
+    def test_expired_artifacts_are_purged(self, app, logged_in_admin, db, export_config, monkeypatch):
+        """Test artifacts past the TTL are deleted and the export runs again"""
+        monkeypatch.setitem(app.config, 'EXPORT_CACHE_TTL', 0)
+        logged_in_admin.post('/exports/', data={'type': 'departments'})
+        first = ExportJob.query.one()
+        (export_config / 'stale.csv.gz').write_bytes(b'')
+        first.file_path = str(export_config / 'stale.csv.gz')
+        db.session.commit()
+
+        logged_in_admin.post('/exports/', data={'type': 'departments'})
+
+        job = ExportJob.query.one()
+        assert job.status == ExportStatus.DONE
+        assert job.file_path != str(export_config / 'stale.csv.gz')
+        assert not (export_config / 'stale.csv.gz').exists()
+
+    def test_failed_job_reports_error(self, logged_in_admin, db, export_config, monkeypatch):
+        """Test an exception while exporting marks the job failed"""
+        import export_jobs
+
+        def broken(params, user):
+            raise RuntimeError('boom')
+            yield
+
+        monkeypatch.setitem(export_jobs.EXPORTS, 'stock', ('stock_balances', ['x'], broken))
+        logged_in_admin.post('/exports/', data={'type': 'stock'})
+
+        job = ExportJob.query.one()
+        assert job.status == ExportStatus.FAILED
+        assert job.error == 'boom'
+        assert list(export_config.iterdir()) == []
+
+    def test_stale_running_job_is_resubmitted(self, app, logged_in_admin, db, export_config):
+        """Test an identical export whose worker died long ago is failed and run again"""
+        import export_jobs
+
+        admin = User.query.filter_by(username='admin').one()
+        started = get_ist_now() - timedelta(seconds=app.config['EXPORT_STALE_AFTER'] + 60)
+        stale = ExportJob(kind='departments', params='{}', cache_key=export_jobs.cache_key('departments', {}, admin),
+                          requested_by=admin.id, status=ExportStatus.RUNNING, created_at=started,
+                          started_at=started)
+        db.session.add(stale)
+        db.session.commit()
+
+        logged_in_admin.post('/exports/', data={'type': 'departments'})
+
+        # The stale row was failed, then purged as expired; a fresh job produced the export
+        job = ExportJob.query.one()
+        assert job.status == ExportStatus.DONE
+        assert job.started_at > started.replace(tzinfo=None)
+
+    def test_recent_running_job_is_joined(self, logged_in_admin, db, export_config):
+        """Test an in-flight job inside the cutoff is reused"""
+        import export_jobs
+
+        admin = User.query.filter_by(username='admin').one()
+        db.session.add(ExportJob(kind='departments', params='{}', requested_by=admin.id,
+                                 cache_key=export_jobs.cache_key('departments', {}, admin),
+                                 status=ExportStatus.RUNNING, started_at=get_ist_now()))
+        db.session.commit()
+
+        logged_in_admin.post('/exports/', data={'type': 'departments'})
+
+        assert ExportJob.query.one().status == ExportStatus.RUNNING
+
+    def test_runs_on_worker_thread(self, app, logged_in_admin, db, export_config, monkeypatch):
+        """Test jobs queued to the pool finish and become downloadable"""
+        monkeypatch.setitem(app.config, 'EXPORT_WORKERS', 1)
+        logged_in_admin.post('/exports/', data={'type': 'requests'})
+        job_id = ExportJob.query.one().id
+
+        for _ in range(50):
+            status = logged_in_admin.get(f'/exports/{job_id}/status').get_json()
+            if status['status'] in ('Done', 'Failed'):
+                break
+            time.sleep(0.1)
+        assert status['status'] == 'Done'
+        assert status['row_count'] == 0
+
+    def test_other_users_cannot_see_job(self, client, db, export_config, sample_user_with_role,
+                                        logged_in_admin):
+        """Test employees are kept out of export jobs"""
+        logged_in_admin.post('/exports/', data={'type': 'stock'})
+        job = ExportJob.query.one()
+        logged_in_admin.get('/auth/logout')
+
+        sample_user_with_role(UserRole.EMPLOYEE, username='exporter')
+        client.post('/auth/login', data={'username': 'exporter', 'password': 'password123'})
+
+        assert client.get(f'/exports/{job.id}/status').status_code in (302, 403)
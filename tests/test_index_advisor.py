@@ -0,0 +1,42 @@
+"""
+Unit tests for the query plan advisor
+"""
+
+import pytest
+from index_advisor import advise, full_scans, index_advice_command
+from models import StockIssueRequest
+
+
+pytestmark = pytest.mark.sqlite_only
+
+
+class TestIndexAdvisor:
+    """Test plan parsing and that the declared indexes cover the hot queries"""
+
+    def test_full_scan_detection(self):
+        """Test only un-indexed table scans are flagged"""
+        plan = [
+            'SCAN stock_returns',
+            'SCAN stock_entries USING INDEX ix_stock_entries_created_at',
+            'SEARCH audits USING INDEX ix_audits_entity (entity_type=? AND entity_id=?)',
+            'SCAN CONSTANT ROW',
+        ]
+        assert full_scans(plan) == ['stock_returns']
+
+    def test_canonical_queries_use_indexes(self, db):
+        """Test none of the canonical queries needs a full table scan"""
+        scanned = dict((name, scans) for name, plan, scans in advise() if scans)
+        assert scanned == {}
+
+    def test_unindexed_filter_is_flagged(self, db):
+        """Test a filter on an unindexed column is reported"""
+        query = StockIssueRequest.query.filter_by(purpose='x')
+        [(name, plan, scans)] = advise([('by purpose', query)])
+        assert scans == ['stock_issue_requests']
+
+    def test_command_strict(self, app, db):
+        """Test the CLI reports each query and passes in strict mode"""
+        result = app.test_cli_runner().invoke(index_advice_command, ['--strict'])
+        assert result.exit_code == 0
+        assert 'FULL SCAN' not in result.output
+        assert 'ok         pending returns' in result.output
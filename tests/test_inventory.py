@@ -0,0 +1,155 @@
+"""
+Unit tests for the stock balance mutation service
+"""
+
+import pytest
+from decimal import Decimal
+from inventory import deduct, credit, deduct_many, quantities, claim
+from models import (StockBalance, StockMovement, StockIssueRequest, StockIssueLine,
+                    RequestStatus, MovementType, UserRole)
+
+
+class TestInventory:
+    """Test atomic balance updates and the issue path built on them"""
+
+    def test_deduct_within_balance(self, db, sample_stock_balance):
+        """Test a covered deduction lowers the balance and writes an OUT movement"""
+        assert deduct(sample_stock_balance.item_id, sample_stock_balance.location_id, Decimal('4'))
+        db.session.commit()
+
+        assert StockBalance.query.one().quantity == Decimal('6.00')
+        assert StockMovement.query.one().quantity == Decimal('-4')
+
+    def test_deduct_beyond_balance_changes_nothing(self, db, sample_stock_balance):
+        """Test an uncovered deduction is refused without touching the balance or ledger"""
+        assert not deduct(sample_stock_balance.item_id, sample_stock_balance.location_id, Decimal('11'))
+        db.session.commit()
+
+        assert StockBalance.query.one().quantity == Decimal('10.00')
+        assert StockMovement.query.count() == 0
+
+    def test_credit_creates_then_increments(self, db, sample_item, sample_location):
+        """Test credit inserts the first balance row and updates it afterwards"""
+        credit(sample_item.id, sample_location.id, Decimal('3'))
+        credit(sample_item.id, sample_location.id, Decimal('2'), movement_type=MovementType.RETURN)
+        db.session.commit()
+
+        assert StockBalance.query.one().quantity == Decimal('5.00')
+        types = [m.movement_type for m in StockMovement.query.order_by(StockMovement.id)]
+        assert types == [MovementType.IN, MovementType.RETURN]
+
+    def test_quantities_reads_many_pairs(self, db, sample_stock_balance, item_factory):
+        """Test bulk reads return every requested pair, zero where no balance exists"""
+        [other] = item_factory(1)
+        location_id = sample_stock_balance.location_id
+
+        balances = quantities([(sample_stock_balance.item_id, location_id), (other.id, location_id)])
+
+        assert balances == {(sample_stock_balance.item_id, location_id): Decimal('10.00'),
+                            (other.id, location_id): Decimal('0')}
+        assert quantities([]) == {}
+
+    def test_deduct_many_reports_every_shortage(self, db, sample_stock_balance, item_factory):
+        """Test all failing lines are returned with the available quantity"""
+        other = item_factory(1)[0]
+        shortages = deduct_many(sample_stock_balance.location_id, [
+            (sample_stock_balance.item_id, Decimal('15'), 1),
+            (other.id, Decimal('1'), 2),
+        ])
+
+        assert [(s.reference, s.available) for s in shortages] == [(1, Decimal('10.00')), (2, Decimal('0'))]
+
+    def test_issue_rolls_back_when_any_line_is_short(self, logged_in_admin, db, sample_user,
+                                                    sample_department, sample_location,
+                                                    sample_stock_balance, item_factory):
+        """Test a partially covered issue leaves every balance untouched"""
+        other = item_factory(1)[0]
+        db.session.add(StockBalance(item_id=other.id, location_id=sample_location.id, quantity=Decimal('1')))
+        request_obj = StockIssueRequest(
+            request_no='REQ-INV-1',
+            requester_id=sample_user.id,
+            department_id=sample_department.id,
+            location_id=sample_location.id,
+            purpose='Test',
+            status=RequestStatus.APPROVED
+        )
+        db.session.add(request_obj)
+        db.session.flush()
+        lines = [
+            StockIssueLine(request_id=request_obj.id, item_id=sample_stock_balance.item_id,
+                           quantity_requested=Decimal('5')),
+            StockIssueLine(request_id=request_obj.id, item_id=other.id, quantity_requested=Decimal('3')),
+        ]
+        db.session.add_all(lines)
+        db.session.commit()
+
+        response = logged_in_admin.post(f'/requests/{request_obj.id}/issue', data={
+            'line_id[]': [line.id for line in lines],
+            'quantity_issued[]': ['5', '3']
+        }, follow_redirects=True)
+
+        db.session.expire_all()
+        assert b'Insufficient stock for' in response.data
+        assert StockIssueRequest.query.get(request_obj.id).status == RequestStatus.APPROVED
+        balances = dict((b.item_id, b.quantity) for b in StockBalance.query.all())
+        assert balances == {sample_stock_balance.item_id: Decimal('10.00'), other.id: Decimal('1.00')}
+        assert StockMovement.query.count() == 0
+
+
+    def test_claim_requires_state(self, db, sample_user, sample_department, sample_location):
+        """Test a claim returns the row only while it is still in the required state"""
+        request_obj = StockIssueRequest(
+            request_no='REQCL001', requester_id=sample_user.id, department_id=sample_department.id,
+            location_id=sample_location.id, purpose='Claim', status=RequestStatus.APPROVED
+        )
+        db.session.add(request_obj)
+        db.session.commit()
+
+        assert claim(StockIssueRequest.query.filter_by(id=request_obj.id, status=RequestStatus.APPROVED)) is request_obj
+        request_obj.status = RequestStatus.ISSUED
+        db.session.commit()
+        assert claim(StockIssueRequest.query.filter_by(id=request_obj.id, status=RequestStatus.APPROVED)) is None
+
+
+class TestBulkBalanceApi:
+    """Test the bulk stock balance endpoint"""
+
+    def test_pairs_and_location_forms(self, logged_in_admin, sample_stock_balance, item_factory):
+        """Test both request forms return all balances in one response"""
+        [other] = item_factory(1)
+        item_id, location_id = sample_stock_balance.item_id, sample_stock_balance.location_id
+
+        by_pair = logged_in_admin.get(
+            f'/api/stock_balances?pair={item_id}:{location_id}&pair={other.id}:{location_id}'
+        ).get_json()
+        by_location = logged_in_admin.get(
+            f'/api/stock_balances?location_id={location_id}&item_id={item_id}&item_id={other.id}'
+        ).get_json()
+
+        expected = sorted([
+            {'item_id': item_id, 'location_id': location_id, 'balance': 10.0},
+            {'item_id': other.id, 'location_id': location_id, 'balance': 0.0},
+        ], key=lambda b: b['item_id'])
+        assert by_pair == by_location == {'balances': expected, 'denied': []}
+
+    def test_inaccessible_warehouses_are_denied(self, client, db, sample_user_with_role,
+                                                sample_stock_balance, location_factory):
+        """Test pairs outside the user's warehouses are reported, not looked up"""
+        user = sample_user_with_role(UserRole.EMPLOYEE)
+        user.assigned_warehouses.append(sample_stock_balance.location)
+        [other_location] = location_factory(1)
+        db.session.commit()
+        client.post('/auth/login', data={'username': user.username, 'password': 'password123'})
+
+        item_id = sample_stock_balance.item_id
+        data = client.get(
+            f'/api/stock_balances?pair={item_id}:{sample_stock_balance.location_id}&pair={item_id}:{other_location.id}'
+        ).get_json()
+
+        assert [b['location_id'] for b in data['balances']] == [sample_stock_balance.location_id]
+        assert data['denied'] == [{'item_id': item_id, 'location_id': other_location.id}]
+
+    def test_malformed_pairs_rejected(self, logged_in_admin, db):
+        """Test pairs that are not item_id:location_id return 400"""
+        assert logged_in_admin.get('/api/stock_balances?pair=1-2').status_code == 400
+        assert logged_in_admin.get('/api/stock_balances?pair=1:2:3').status_code == 400
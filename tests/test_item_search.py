@@ -0,0 +1,106 @@
+"""
+Unit tests for the item typeahead search API
+"""
+
+import pytest
+from models import Item, Department
+import item_search
+
+
+def search(client, **params):
+    response = client.get('/api/items/search', query_string=params)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def codes(payload):
+    return [result['code'] for result in payload['results']]
+
+
+pytestmark = pytest.mark.sqlite_only
+
+
+class TestItemSearch:
+    """Test FTS matching, ranking, paging and department filtering"""
+
+    def test_requires_login(self, client, db):
+        """Test anonymous users are redirected to login"""
+        response = client.get('/api/items/search?q=test')
+        assert response.status_code == 302
+
+    def test_index_created_with_schema(self, app, db):
+        """Test create_all builds the FTS table"""
+        assert item_search.has_index()
+
+    def test_substring_match(self, logged_in_admin, db):
+        """Test a fragment matches inside names and descriptions"""
+        db.session.add_all([
+            Item(code='TL-001', name='Screwdriver Set'),
+            Item(code='MEM-004', name='RAM', description='DDR4 4GB module'),
+            Item(code='CBL-010', name='Patch Cable'),
+        ])
+        db.session.commit()
+
+        assert codes(search(logged_in_admin, q='crew')) == ['TL-001']
+        assert codes(search(logged_in_admin, q='ddr4 module')) == ['MEM-004']
+        assert codes(search(logged_in_admin, q='nothing-like-this')) == []
+
+    def test_index_follows_updates_and_deletes(self, logged_in_admin, db):
+        """Test the triggers keep the index in step with items"""
+        item = Item(code='UPD-001', name='Old Name')
+        db.session.add(item)
+        db.session.commit()
+
+        item.name = 'Brand New Name'
+        db.session.commit()
+        assert codes(search(logged_in_admin, q='old name')) == []
+        assert codes(search(logged_in_admin, q='brand')) == ['UPD-001']
+
+        db.session.delete(item)
+        db.session.commit()
+        assert codes(search(logged_in_admin, q='brand')) == []
+
+    def test_code_matches_rank_first(self, logged_in_admin, db):
+        """Test exact and prefix code matches come before other hits"""
+        db.session.add_all([
+            Item(code='ZZ-100', name='Mouse for KBD-1'),
+            Item(code='KBD-10', name='Keyboard Large'),
+            Item(code='KBD-1', name='Keyboard'),
+        ])
+        db.session.commit()
+
+        assert codes(search(logged_in_admin, q='KBD-1')) == ['KBD-1', 'KBD-10', 'ZZ-100']
+
+    def test_short_terms_fall_back_to_like(self, logged_in_admin, item_factory):
+        """Test one- and two-character terms still match"""
+        item_factory(3)
+        assert codes(search(logged_in_admin, q='M 2')) == ['ITEM-002']
+
+    def test_paging(self, logged_in_admin, item_factory):
+        """Test pages are ordered by code and report whether more follow"""
+        item_factory(5)
+
+        first = search(logged_in_admin, q='', per_page=2)
+        last = search(logged_in_admin, q='', per_page=2, page=3)
+
+        assert codes(first) == ['ITEM-000', 'ITEM-001']
+        assert first['pagination']['more'] is True
+        assert codes(last) == ['ITEM-004']
+        assert last['pagination']['more'] is False
+        assert first['results'][0]['text'] == 'ITEM-000 - Test Item 0'
+
+    def test_hod_sees_department_and_unassigned(self, logged_in_hod, db, sample_department):
+        """Test HODs only find their department's items and unassigned ones"""
+        other = Department(code='OTH', name='Other')
+        db.session.add(other)
+        db.session.flush()
+        db.session.add_all([
+            Item(code='OWN-1', name='Cable Own', department_id=sample_department.id),
+            Item(code='OTH-1', name='Cable Other', department_id=other.id),
+            Item(code='GEN-1', name='Cable General'),
+        ])
+        db.session.commit()
+
+        payload = search(logged_in_hod, q='cable')
+        departments = dict((r['code'], r['department']) for r in payload['results'])
+        assert departments == {'OWN-1': sample_department.name, 'GEN-1': None}
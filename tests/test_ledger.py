@@ -0,0 +1,189 @@
+"""
+Unit tests for the stock movement ledger
+"""
+
+import pytest
+from decimal import Decimal
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+import ledger
+from ledger import record_movement, balance_as_of, backfill_movements
+from models import (User, UserRole, StockBalance, StockEntry, StockMovement, StockSnapshot,
+                    MovementType, StockReturn, ReturnStatus)
+
+
+class TestLedger:
+    """Test ledger writes and point-in-time balances"""
+
+    def test_out_movements_are_negative(self, db, sample_item, sample_location):
+        """Test movement sign follows its type"""
+        record_movement(sample_item.id, sample_location.id, MovementType.IN, Decimal('10'))
+        movement = record_movement(sample_item.id, sample_location.id, MovementType.OUT, Decimal('4'))
+        db.session.commit()
+
+        assert movement.quantity == Decimal('-4')
+        assert balance_as_of(sample_item.id, sample_location.id) == Decimal('6')
+
+    def test_balance_as_of_timestamp(self, db, sample_item, sample_location):
+        """Test balances only include movements up to the requested time"""
+        t0 = datetime(2024, 1, 1, 10, 0)
+        record_movement(sample_item.id, sample_location.id, MovementType.IN, Decimal('20'), ts=t0)
+        record_movement(sample_item.id, sample_location.id, MovementType.OUT, Decimal('5'),
+                        ts=t0 + timedelta(days=1))
+        record_movement(sample_item.id, sample_location.id, MovementType.RETURN, Decimal('2'),
+                        ts=t0 + timedelta(days=2))
+        db.session.commit()
+
+        assert balance_as_of(sample_item.id, sample_location.id, t0 - timedelta(seconds=1)) == 0
+        assert balance_as_of(sample_item.id, sample_location.id, t0) == Decimal('20')
+        assert balance_as_of(sample_item.id, sample_location.id, t0 + timedelta(hours=36)) == Decimal('15')
+        assert balance_as_of(sample_item.id, sample_location.id, t0 + timedelta(days=3)) == Decimal('17')
+
+    def test_snapshots_are_written_and_used(self, db, sample_item, sample_location, monkeypatch):
+        """Test checkpoints are written every SNAPSHOT_INTERVAL movements and give the same answers"""
+        monkeypatch.setattr(ledger, 'SNAPSHOT_INTERVAL', 3)
+        t0 = datetime(2024, 1, 1)
+        for i in range(7):
+            record_movement(sample_item.id, sample_location.id, MovementType.IN, Decimal('1'),
+                            ts=t0 + timedelta(hours=i))
+        db.session.commit()
+
+        snapshots = StockSnapshot.query.order_by(StockSnapshot.ts).all()
+        assert [s.quantity for s in snapshots] == [Decimal('3'), Decimal('6')]
+        assert balance_as_of(sample_item.id, sample_location.id, t0 + timedelta(hours=4)) == Decimal('5')
+        assert balance_as_of(sample_item.id, sample_location.id, t0 + timedelta(hours=10)) == Decimal('7')
+
+    def test_backfill_reconciles_to_current_balance(self, db, sample_user, sample_item, sample_location):
+        """Test backfill replays entries and adjusts to the stored balance"""
+        db.session.add(StockEntry(
+            item_id=sample_item.id,
+            location_id=sample_location.id,
+            quantity_procured=Decimal('8.00'),
+            created_by=sample_user.id,
+            created_at=datetime(2024, 1, 1)
+        ))
+        db.session.add(StockBalance(
+            item_id=sample_item.id,
+            location_id=sample_location.id,
+            quantity=Decimal('10.00')
+        ))
+        db.session.commit()
+
+        assert backfill_movements() == 2
+        db.session.commit()
+
+        types = [m.movement_type for m in StockMovement.query.order_by(StockMovement.id)]
+        assert types == [MovementType.IN, MovementType.ADJUST]
+        assert balance_as_of(sample_item.id, sample_location.id) == Decimal('10.00')
+        assert backfill_movements() == 0
+
+    def test_stock_entry_writes_movement(self, client, db, sample_item, sample_location):
+        """Test creating a stock entry records an IN movement in the same transaction"""
+        admin = User(
+            username='ledger_admin',
+            password_hash=generate_password_hash('admin123'),
+            full_name='Ledger Admin',
+            email='ledger_admin@example.com',
+            role=UserRole.SUPERADMIN
+        )
+        db.session.add(admin)
+        db.session.commit()
+        client.post('/auth/login', data={'username': 'ledger_admin', 'password': 'admin123'})
+
+        client.post('/stock/entry/create', data={
+            'item_id': sample_item.id,
+            'location_id': sample_location.id,
+            'quantity': '12'
+        })
+
+        movement = StockMovement.query.one()
+        entry = StockEntry.query.one()
+        assert movement.movement_type == MovementType.IN
+        assert movement.quantity == Decimal('12')
+        assert movement.reference_type == 'StockEntry'
+        assert movement.reference_id == entry.id
+
+    def test_balance_after_tied_timestamps(self, db, sample_item, sample_location, monkeypatch):
+        """Test the balance after a movement ignores later movements sharing its timestamp"""
+        monkeypatch.setattr(ledger, 'SNAPSHOT_INTERVAL', 2)
+        ts = datetime(2024, 2, 1, 9, 0)
+        first = record_movement(sample_item.id, sample_location.id, MovementType.IN, Decimal('10'), ts=ts)
+        second = record_movement(sample_item.id, sample_location.id, MovementType.OUT, Decimal('3'), ts=ts)
+        third = record_movement(sample_item.id, sample_location.id, MovementType.IN, Decimal('1'), ts=ts)
+        db.session.commit()
+
+        assert StockSnapshot.query.count() == 1
+        assert [ledger.balance_after(m) for m in (first, second, third)] == [Decimal('10'), Decimal('7'),
+                                                                             Decimal('8')]
+
+
+class TestStockHistoryPage:
+    """Test the history page reads the ledger"""
+
+    def test_history_lists_ledger_with_running_balance(self, logged_in_admin, db, sample_item, sample_location,
+                                                       monkeypatch):
+        """Test returns appear, balances run down the page and older rows are paged by cursor"""
+        import views.stock_entry
+        monkeypatch.setattr(views.stock_entry, 'HISTORY_PER_PAGE', 2)
+        t0 = datetime(2024, 3, 1, 9, 0)
+        record_movement(sample_item.id, sample_location.id, MovementType.IN, Decimal('10'), ts=t0,
+                        reference_type='StockEntry', reference_id=1)
+        record_movement(sample_item.id, sample_location.id, MovementType.OUT, Decimal('4'),
+                        ts=t0 + timedelta(days=1), reference_type='StockIssueLine', reference_id=7)
+        record_movement(sample_item.id, sample_location.id, MovementType.RETURN, Decimal('1'),
+                        ts=t0 + timedelta(days=2), reference_type='StockReturn', reference_id=3)
+        db.session.commit()
+        url = f'/stock/history/{sample_item.id}/{sample_location.id}'
+
+        newest = logged_in_admin.get(url).get_data(as_text=True)
+        assert 'Return #3' in newest and 'Issue Line #7' in newest
+        assert 'Balance 7' in newest and 'Balance 6' in newest
+        assert 'Stock Entry #1' not in newest
+
+        older_link = newest.split('after=')[1].split('"')[0]
+        older = logged_in_admin.get(f'{url}?page=2&after={older_link}').get_data(as_text=True)
+        assert 'Stock Entry #1' in older and 'Balance 10' in older
+
+        filtered = logged_in_admin.get(f'{url}?date_from=2024-03-02&date_to=2024-03-02').get_data(as_text=True)
+        assert 'Issue Line #7' in filtered
+        assert 'Return #3' not in filtered
+
+    def test_history_names_requests_and_returns(self, logged_in_admin, db, sample_item, sample_location, sample_user,
+                                                sample_stock_request_line):
+        """Test issue and return movements are labelled with their request and return numbers"""
+        stock_return = StockReturn(return_no='RET-HIST-1', issue_line=sample_stock_request_line,
+                                   returned_by=sample_user.id, quantity_returned=Decimal('1'),
+                                   return_reason='Test', status=ReturnStatus.COMPLETED)
+        db.session.add(stock_return)
+        db.session.flush()
+        record_movement(sample_item.id, sample_location.id, MovementType.OUT, Decimal('2'),
+                        reference_type='StockIssueLine', reference_id=sample_stock_request_line.id)
+        record_movement(sample_item.id, sample_location.id, MovementType.RETURN, Decimal('1'),
+                        reference_type='StockReturn', reference_id=stock_return.id)
+        db.session.commit()
+
+        page = logged_in_admin.get(f'/stock/history/{sample_item.id}/{sample_location.id}').get_data(as_text=True)
+        assert 'Issue TEST-REQ-001' in page
+        assert 'Return RET-HIST-1' in page
+
+    def test_export_covers_every_page(self, logged_in_admin, db, sample_item, sample_location, monkeypatch):
+        """Test the CSV export streams the whole filtered history, not the page on screen"""
+        import views.stock_entry
+        monkeypatch.setattr(views.stock_entry, 'HISTORY_PER_PAGE', 2)
+        t0 = datetime(2024, 3, 1, 9, 0)
+        for day in range(5):
+            record_movement(sample_item.id, sample_location.id, MovementType.IN, Decimal('1'),
+                            ts=t0 + timedelta(days=day), reference_type='StockEntry', reference_id=day + 1)
+        db.session.commit()
+        url = f'/stock/history/{sample_item.id}/{sample_location.id}/export'
+
+        response = logged_in_admin.get(url)
+        assert response.mimetype == 'text/csv'
+        lines = response.get_data(as_text=True).strip().splitlines()
+        assert lines[0].startswith('Date,Type,Reference,Quantity,Balance')
+        assert len(lines) == 6
+        assert 'Stock Entry #5' in lines[1] and ',5.0,' in lines[1]
+        assert 'Stock Entry #1' in lines[5] and ',1.0,' in lines[5]
+
+        filtered = logged_in_admin.get(f'{url}?date_from=2024-03-02&date_to=2024-03-03').get_data(as_text=True)
+        assert len(filtered.strip().splitlines()) == 3
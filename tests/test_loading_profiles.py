@@ -0,0 +1,84 @@
+"""
+Query-count bounds for pages that use the REQUEST_LIST and REQUEST_FULL loader profiles
+"""
+
+import pytest
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import event
+from models import (StockIssueRequest, StockIssueLine, StockReturn, Item, User,
+                    RequestStatus, ReturnStatus)
+
+
+@pytest.fixture
+def make_requests(db, sample_department, sample_location):
+    """Create ``count`` requests by the logged-in admin, each with two lines and a return"""
+    created = []
+
+    def _make(count, status):
+        admin = User.query.filter_by(username='admin').one()
+        start = len(created)
+        for i in range(start, start + count):
+            request_obj = StockIssueRequest(
+                request_no=f'REQT{i:04d}', requester_id=admin.id, department_id=sample_department.id,
+                location_id=sample_location.id, purpose='Load test', status=status,
+                approved_by=admin.id, approved_at=datetime.utcnow(),
+                issued_by=admin.id, issued_at=datetime.utcnow() if status == RequestStatus.ISSUED else None
+            )
+            db.session.add(request_obj)
+            for n in range(2):
+                item = Item(code=f'LD{i:04d}{n}', name=f'Load Item {i}/{n}', department_id=sample_department.id)
+                line = StockIssueLine(request=request_obj, item=item, quantity_requested=Decimal('5'),
+                                      quantity_issued=Decimal('5'))
+                db.session.add(StockReturn(return_no=f'RETT{i:04d}{n}', issue_line=line, returned_by=admin.id,
+                                           quantity_returned=Decimal('1'), return_reason='Test',
+                                           status=ReturnStatus.COMPLETED))
+            created.append(request_obj)
+        db.session.commit()
+        return created
+
+    return _make
+
+
+def queries_for(client, db, url):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    assert response.status_code == 200
+    return len(statements)
+
+
+class TestLoadingProfiles:
+    """Test listing and detail pages run a fixed number of queries"""
+
+    @pytest.mark.parametrize('url, status', [
+        ('/approvals/pending', RequestStatus.PENDING),
+        ('/approvals/history', RequestStatus.APPROVED),
+        ('/requests/my-requests', RequestStatus.PENDING),
+        ('/returns/create', RequestStatus.ISSUED),
+    ])
+    def test_listing_query_count_is_bounded(self, logged_in_admin, db, make_requests, url, status):
+        """Test tripling the number of listed requests does not add queries"""
+        make_requests(2, status)
+        few = queries_for(logged_in_admin, db, url)
+
+        make_requests(4, status)
+        many = queries_for(logged_in_admin, db, url)
+
+        assert many == few
+        assert few <= 12
+
+    @pytest.mark.parametrize('view', ['/requests/{id}', '/requests/{id}/print'])
+    def test_detail_query_count_is_bounded(self, logged_in_admin, db, make_requests, view):
+        """Test detail and print pages do not load lines, items or returns one by one"""
+        [request_obj] = make_requests(1, RequestStatus.ISSUED)
+        url = view.format(id=request_obj.id)
+
+        assert queries_for(logged_in_admin, db, url) <= 10
@@ -0,0 +1,118 @@
+"""
+Unit tests for the master-data cache
+"""
+
+import pytest
+from contextlib import contextmanager
+from sqlalchemy import event
+import master_data
+from models import Item, CacheVersion
+
+
+@pytest.fixture
+def count_queries(db):
+    """Collect the statements executed while the fixture is active"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    yield statements
+    event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+@contextmanager
+def request_scope(app):
+    """A request context that has run the before-request hooks"""
+    with app.test_request_context():
+        app.preprocess_request()
+        yield
+
+
+class TestMasterData:
+    """Test cached item, location and department lists"""
+
+    def test_lists_match_database(self, app, db, sample_item, sample_location, sample_department):
+        """Test the cached lists hold snapshots of the master rows"""
+        sample_item.department_id = sample_department.id
+        db.session.commit()
+
+        with request_scope(app):
+            [item] = master_data.get_items()
+            [location] = master_data.get_locations()
+            [department] = master_data.get_departments()
+
+        assert (item.id, item.code, item.name) == (sample_item.id, sample_item.code, sample_item.name)
+        assert item.department.code == department.code
+        assert location.office == sample_location.office
+        with pytest.raises(AttributeError):
+            item.name = 'Changed'
+
+    def test_cache_hit_only_checks_version(self, app, db, sample_item, sample_location, count_queries):
+        """Test a warm cache costs one version lookup per request"""
+        with request_scope(app):
+            master_data.get_items()
+
+        del count_queries[:]
+        with request_scope(app):
+            master_data.get_items()
+            master_data.get_locations()
+            master_data.get_departments()
+
+        assert len(count_queries) == 1
+        assert 'cache_versions' in count_queries[0]
+
+    def test_department_filter(self, app, db, sample_item, sample_department):
+        """Test items can be limited to a department with or without unassigned items"""
+        sample_item.department_id = sample_department.id
+        db.session.add(Item(code='GEN001', name='General Item'))
+        master_data.bump_version()
+        db.session.commit()
+
+        with request_scope(app):
+            assert [i.code for i in master_data.get_items(sample_department.id)] == [sample_item.code]
+            assert {i.code for i in master_data.get_items(sample_department.id, include_unassigned=True)} == \
+                {sample_item.code, 'GEN001'}
+
+    def test_bump_invalidates(self, app, db, sample_item):
+        """Test a committed bump makes the next request reload the lists"""
+        with request_scope(app):
+            before = master_data.current_version()
+            assert len(master_data.get_items()) == 1
+
+        db.session.add(Item(code='NEW001', name='New Item'))
+        master_data.bump_version()
+        db.session.commit()
+
+        with request_scope(app):
+            assert master_data.current_version() != before
+            assert 'NEW001' in [i.code for i in master_data.get_items()]
+
+    def test_rolled_back_bump_keeps_version(self, app, db, sample_item):
+        """Test an uncommitted change does not invalidate the cache"""
+        with request_scope(app):
+            before = master_data.current_version()
+
+        master_data.bump_version()
+        db.session.rollback()
+
+        with request_scope(app):
+            assert master_data.current_version() == before
+
+    def test_create_item_bumps_version(self, app, db, logged_in_admin):
+        """Test creating an item through the masters page refreshes the lists"""
+        with request_scope(app):
+            before = master_data.current_version()
+
+        response = logged_in_admin.post('/masters/items/create', data={
+            'code': 'CACHE001',
+            'name': 'Cached Item',
+            'department_id': 0,
+            'low_stock_threshold': 0
+        })
+        assert response.status_code == 302
+
+        assert db.session.get(CacheVersion, master_data.MASTERS).version != before
+        with request_scope(app):
+            assert 'CACHE001' in [i.code for i in master_data.get_items()]
@@ -0,0 +1,84 @@
+"""
+Unit tests for the Prometheus metrics endpoint
+"""
+
+import pytest
+from decimal import Decimal
+from prometheus_client import REGISTRY
+from models import StockBalance
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class TestMetrics:
+    """Test latency histograms, pool gauges and business counters"""
+
+    def test_endpoint_latency_recorded(self, client, db):
+        """Test requests are timed per endpoint and exposed on /metrics"""
+        before = sample('stock_http_request_duration_seconds_count', endpoint='auth.login', method='GET')
+        client.get('/auth/login')
+
+        assert sample('stock_http_request_duration_seconds_count',
+                      endpoint='auth.login', method='GET') == before + 1
+
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        assert response.content_type.startswith('text/plain')
+        body = response.get_data(as_text=True)
+        assert 'stock_http_request_duration_seconds_bucket{endpoint="auth.login"' in body
+        assert 'stock_db_pool_connections{state="checkedout"}' in body
+        assert 'endpoint="metrics.metrics"' not in body
+
+    def test_metrics_token(self, app, client, monkeypatch):
+        """Test a configured token is required to scrape"""
+        monkeypatch.setitem(app.config, 'METRICS_TOKEN', 'secret')
+
+        assert client.get('/metrics').status_code == 401
+        assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
+
+    def test_request_lifecycle_counters(self, logged_in_admin, db, sample_department, sample_location,
+                                        sample_item):
+        """Test creating (auto-approved) and issuing a request bump the business counters"""
+        db.session.add(StockBalance(item_id=sample_item.id, location_id=sample_location.id,
+                                    quantity=Decimal('10')))
+        db.session.commit()
+        before = dict((event, sample('stock_document_events_total', event=event))
+                      for event in ('created', 'approved', 'issued'))
+
+        logged_in_admin.post('/requests/create', data={
+            'location_id': sample_location.id,
+            'purpose': 'Metrics',
+            'item_id[]': [sample_item.id],
+            'quantity[]': ['2'],
+            'item_remarks[]': ['']
+        })
+
+        assert sample('stock_document_events_total', event='created') == before['created'] + 1
+        assert sample('stock_document_events_total', event='approved') == before['approved'] + 1
+        assert sample('stock_document_events_total', event='issued') == before['issued']
+
+    def test_multiprocess_aggregation(self, monkeypatch, tmp_path):
+        """Test scrapes read the shared directory when multiprocess mode is enabled"""
+        import metrics
+        monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(tmp_path))
+
+        body, content_type = metrics.render()
+        assert content_type.startswith('text/plain')
+        assert b'stock_http_requests_total' not in body
+
+    def test_child_exit_drops_dead_worker_gauges(self, monkeypatch, tmp_path):
+        """Test the gunicorn child_exit hook removes an exited worker's live gauge file"""
+        import os
+        import runpy
+        from types import SimpleNamespace
+        import metrics
+        monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(tmp_path))
+        gauge_file = tmp_path / 'gauge_livesum_4242.db'
+        gauge_file.write_bytes(b'')
+
+        hooks = runpy.run_path(os.path.join(os.path.dirname(metrics.__file__), 'gunicorn.conf.py'))
+        hooks['child_exit'](None, SimpleNamespace(pid=4242))
+
+        assert not gauge_file.exists()
@@ -4,10 +4,10 @@ Unit tests for database models
 
 import pytest
 from decimal import Decimal
-from datetime import datetime
+from datetime import datetime, timedelta
 from models import (User, UserRole, Department, Location, Item, Employee,
                    StockBalance, StockEntry, StockIssueRequest, StockIssueLine,
-                   RequestStatus, Audit)
+                   StockReturn, RequestStatus, ReturnStatus, Audit)
 from werkzeug.security import generate_password_hash, check_password_hash
 
 class TestUser:
@@ -412,6 +412,59 @@ class TestStockIssueLine:
         assert line.request == request
         assert line.item == sample_item
     
+    def _issued_line(self, db, item, user, department, location, issued_days_ago, issued='5.00',
+                     returned=()):
+        request = StockIssueRequest(
+            request_no=f'REQ{issued_days_ago:03d}',
+            requester_id=user.id,
+            department_id=department.id,
+            location_id=location.id,
+            purpose='Test purpose',
+            status=RequestStatus.ISSUED,
+            issued_at=datetime.utcnow() - timedelta(days=issued_days_ago, hours=1)
+        )
+        line = StockIssueLine(request=request, item=item, quantity_requested=Decimal(issued),
+                              quantity_issued=Decimal(issued),
+                              quantity_returned_total=sum(Decimal(q) for q, status in returned
+                                                          if status == ReturnStatus.COMPLETED))
+        for n, (quantity, status) in enumerate(returned):
+            db.session.add(StockReturn(return_no=f'RET{issued_days_ago:03d}{n}', issue_line=line,
+                                       returned_by=user.id, quantity_returned=Decimal(quantity),
+                                       return_reason='Test', status=status))
+        db.session.add(line)
+        db.session.commit()
+        return line
+
+    def test_returnable_sql_matches_python(self, db, sample_item, sample_user, sample_department, sample_location):
+        """Test the SQL expressions agree with the instance properties"""
+        args = (db, sample_item, sample_user, sample_department, sample_location)
+        lines = [
+            self._issued_line(*args, 1, returned=[('2.00', ReturnStatus.COMPLETED), ('1.00', ReturnStatus.PENDING)]),
+            self._issued_line(*args, 2, returned=[('5.00', ReturnStatus.COMPLETED)]),
+            self._issued_line(*args, 30),
+            self._issued_line(*args, 31),
+        ]
+
+        rows = db.session.query(
+            StockIssueLine.id, StockIssueLine.quantity_returned,
+            StockIssueLine.quantity_returnable, StockIssueLine.is_returnable
+        ).order_by(StockIssueLine.id).all()
+
+        assert [(Decimal(r[1]), Decimal(r[2]), bool(r[3])) for r in rows] == \
+            [(l.quantity_returned, l.quantity_returnable, l.is_returnable) for l in lines]
+        assert [bool(r[3]) for r in rows] == [True, False, True, False]
+
+    def test_returnable_query(self, db, sample_item, sample_user, sample_department, sample_location):
+        """Test only returnable lines of issued requests are selected, optionally per requester"""
+        args = (db, sample_item, sample_user, sample_department, sample_location)
+        open_line = self._issued_line(*args, 3)
+        self._issued_line(*args, 4, returned=[('5.00', ReturnStatus.COMPLETED)])
+        self._issued_line(*args, 45)
+
+        assert StockIssueLine.returnable_query().all() == [open_line]
+        assert StockIssueLine.returnable_query(requester_id=sample_user.id).count() == 1
+        assert StockIssueLine.returnable_query(requester_id=sample_user.id + 100).count() == 0
+
     def test_issue_line_repr(self, db):
         """Test issue line string representation"""
         line = StockIssueLine(id=1)
@@ -0,0 +1,60 @@
+"""
+Unit tests for request/return number allocation
+"""
+
+import pytest
+from datetime import datetime
+import numbering
+from numbering import next_number, reserve, REQUEST, RETURN
+from models import DocumentSequence, StockIssueRequest
+
+
+class TestNumbering:
+    """Test the per-day sequence allocator"""
+
+    DAY = datetime(2024, 8, 11)
+
+    def test_sequential_numbers(self, db):
+        """Test numbers are consecutive per kind and day"""
+        assert next_number(REQUEST, self.DAY) == 'REQ20240811001'
+        assert next_number(REQUEST, self.DAY) == 'REQ20240811002'
+        assert next_number(RETURN, self.DAY) == 'RET20240811001'
+        assert next_number(REQUEST, datetime(2024, 8, 12)) == 'REQ20240812001'
+
+    def test_more_than_999_per_day(self, db):
+        """Test the sequence widens instead of wrapping after 999"""
+        db.session.add(DocumentSequence(prefix='REQ20240811', last_value=999))
+        db.session.commit()
+
+        assert next_number(REQUEST, self.DAY) == 'REQ202408111000'
+
+    def test_counter_seeded_from_existing_numbers(self, db, sample_user, sample_department, sample_location):
+        """Test a day's counter continues after numbers issued before the table existed"""
+        for request_no in ('REQ20240811009', 'REQ202408111012'):
+            db.session.add(StockIssueRequest(
+                request_no=request_no,
+                requester_id=sample_user.id,
+                department_id=sample_department.id,
+                location_id=sample_location.id,
+                purpose='Legacy'
+            ))
+        db.session.commit()
+
+        assert next_number(REQUEST, self.DAY) == 'REQ202408111013'
+
+    def test_reserve_returns_first_of_block(self, db):
+        """Test reserving a range advances the counter by its size"""
+        assert reserve(REQUEST, 10, self.DAY) == ('REQ20240811', 1)
+        assert next_number(REQUEST, self.DAY) == 'REQ20240811011'
+
+    def test_block_allocation(self, app, db, monkeypatch):
+        """Test worker blocks hand out numbers locally and reserve the next block when exhausted"""
+        monkeypatch.setitem(app.config, 'DOCUMENT_NUMBER_BLOCK_SIZE', 2)
+        monkeypatch.setattr(numbering, '_blocks', {})
+
+        numbers = [next_number(RETURN, self.DAY) for _ in range(3)]
+        db.session.rollback()
+
+        assert numbers == ['RET20240811001', 'RET20240811002', 'RET20240811003']
+        # Blocks are committed on their own, so the caller's rollback does not release them
+        assert DocumentSequence.query.get('RET20240811').last_value == 4
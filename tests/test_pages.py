@@ -0,0 +1,51 @@
+"""
+Page-level tests: every read-only page renders for the roles that use it
+"""
+
+import pytest
+from models import User
+
+ADMIN_PAGES = [
+    '/dashboard',
+    '/reports/reports',
+    '/reports/reports/api/chart-data?type=monthly_requests',
+    '/reports/full-balance',
+    '/admin/transaction-history',
+    '/admin/transaction-summary',
+    '/audit/issue-return-tracker',
+    '/stock/balances',
+    '/low-stock/alerts',
+    '/low-stock/summary',
+    '/location-inventory/location-inventory',
+    '/requests/create',
+    '/returns/create',
+    '/masters/items',
+    '/admin/users',
+]
+
+HOD_PAGES = [
+    '/dashboard',
+    '/approvals/pending',
+    '/audit/issue-return-tracker',
+    '/low-stock/alerts',
+    '/location-inventory/location-inventory',
+    '/requests/create',
+]
+
+
+class TestPages:
+    """Test pages render with stock on hand"""
+
+    @pytest.mark.parametrize('page', ADMIN_PAGES)
+    def test_admin_pages(self, logged_in_admin, sample_stock_balance, page):
+        """Test the page renders for a superadmin"""
+        assert logged_in_admin.get(page).status_code == 200
+
+    @pytest.mark.parametrize('page', HOD_PAGES)
+    def test_hod_pages(self, logged_in_hod, db, sample_stock_balance, page):
+        """Test the page renders for an HOD limited to their assigned warehouse"""
+        hod = User.query.filter_by(username='hod').one()
+        hod.assigned_warehouses.append(sample_stock_balance.location)
+        db.session.commit()
+
+        assert logged_in_hod.get(page).status_code == 200
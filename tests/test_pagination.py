@@ -0,0 +1,115 @@
+"""
+Tests for the shared query paginator and the issue/return tracker pages built on it
+"""
+
+import re
+import pytest
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import event
+from pagination import count_rows, paginate_query, encode_cursor, decode_cursor
+from models import StockIssueRequest, StockIssueLine, RequestStatus
+from views.audit import TRACKER_KEYS
+
+
+@pytest.fixture
+def issued_lines(db, sample_item, sample_user, sample_department, sample_location):
+    """Seven issued lines over four requests; requests share issue times so the line id breaks ties"""
+    base = datetime(2026, 1, 10, 9, 30)
+    for n, (days, line_count) in enumerate([(0, 2), (0, 2), (1, 1), (3, 2)]):
+        request_obj = StockIssueRequest(
+            request_no=f'REQPG{n:03d}', requester_id=sample_user.id, department_id=sample_department.id,
+            location_id=sample_location.id, purpose='Paging', status=RequestStatus.ISSUED,
+            issued_at=base - timedelta(days=days)
+        )
+        for _ in range(line_count):
+            db.session.add(StockIssueLine(request=request_obj, item=sample_item, quantity_requested=Decimal('1'),
+                                          quantity_issued=Decimal('1')))
+    db.session.commit()
+
+
+def tracker_query(db):
+    return db.session.query(
+        StockIssueRequest.issued_at, StockIssueLine.id.label('line_id')
+    ).join(StockIssueLine, StockIssueLine.request_id == StockIssueRequest.id)
+
+
+class TestPaginateQuery:
+    """Test counting, offset pages and keyset pages agree"""
+
+    def test_count_rows(self, db, issued_lines):
+        """Test the count subquery, with and without a limit"""
+        assert count_rows(tracker_query(db)) == 7
+        assert count_rows(tracker_query(db), limit=3) == 3
+
+    def test_keyset_walk_matches_offset_pages(self, db, issued_lines):
+        """Test following next_cursor visits the same rows as numbered pages"""
+        by_offset = []
+        for page in (1, 2, 3):
+            by_offset.extend(paginate_query(tracker_query(db), TRACKER_KEYS, page, 3).items)
+
+        by_cursor = []
+        cursor, page = None, 1
+        while True:
+            pagination = paginate_query(tracker_query(db), TRACKER_KEYS, page, 3, cursor=cursor)
+            by_cursor.extend(pagination.items)
+            if not pagination.has_next:
+                break
+            cursor, page = pagination.next_cursor, pagination.next_num
+
+        assert [row.line_id for row in by_cursor] == [row.line_id for row in by_offset]
+        assert len(by_cursor) == 7
+        assert page == 3
+
+    @pytest.mark.sqlite_only
+    def test_keyset_page_skips_offset(self, db, issued_lines):
+        """Test a cursor page filters on the key instead of using OFFSET"""
+        first = paginate_query(tracker_query(db), TRACKER_KEYS, 1, 3)
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        try:
+            paginate_query(tracker_query(db), TRACKER_KEYS, 2, 3, cursor=first.next_cursor)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+
+        (count_sql, _), (page_sql, page_params) = statements
+        assert 'count(*)' in count_sql
+        assert 'issued_at < ?' in page_sql
+        assert page_params[-1] == 0  # SQLite always renders OFFSET; it must stay at zero
+
+    def test_approximate_count(self, db, issued_lines):
+        """Test a count limit caps the total and flags it as approximate"""
+        pagination = paginate_query(tracker_query(db), TRACKER_KEYS, 1, 2, count_limit=4)
+
+        assert pagination.total == 4
+        assert pagination.approximate
+        assert not paginate_query(tracker_query(db), TRACKER_KEYS, 1, 2, count_limit=10).approximate
+
+    def test_cursor_round_trip(self):
+        """Test cursors decode back to their key and malformed ones are ignored"""
+        key = (datetime(2026, 1, 10, 9, 30, 15, 250), 42)
+        parsers = [parse for _, _, parse in TRACKER_KEYS]
+
+        assert decode_cursor(encode_cursor(key), parsers) == key
+        assert decode_cursor('garbage', parsers) is None
+        assert decode_cursor('not-a-date~1', parsers) is None
+
+
+class TestTrackerPages:
+    """Test the tracker page paginates with cursors"""
+
+    def test_next_link_carries_cursor(self, logged_in_admin, db, issued_lines, monkeypatch):
+        """Test the next link resumes after the last row of the page"""
+        monkeypatch.setattr('views.audit.TRACKER_PER_PAGE', 4)
+
+        first = logged_in_admin.get('/audit/issue-return-tracker')
+        assert b'(7 records)' in first.data
+        next_url = re.search(r'href="([^"]*after=[^"]*)"', first.data.decode()).group(1).replace('&amp;', '&')
+
+        second = logged_in_admin.get(next_url)
+        assert second.status_code == 200
+        assert second.data.count(b'REQPG') == 3
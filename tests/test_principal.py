@@ -0,0 +1,84 @@
+"""
+Tests for loading the logged-in user and their warehouse access
+"""
+
+import pytest
+from sqlalchemy import event
+from models import User, UserRole, Department
+
+
+def statements_during(db, action):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        result = action()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+    return result, statements
+
+
+@pytest.fixture
+def hod(db, sample_user_with_role, location_factory):
+    """An HOD managing a department with two of three warehouses assigned"""
+    user = sample_user_with_role(UserRole.HOD, username='principal_hod')
+    locations = location_factory(3)
+    db.session.add(Department(code='PRN', name='Principal Dept', hod_id=user.id))
+    user.assigned_warehouses.extend(locations[:2])
+    db.session.commit()
+    return user.id, [location.id for location in locations]
+
+
+class TestPrincipal:
+    """Test the user loader and accessible_location_ids"""
+
+    def test_loads_in_one_query(self, db, hod):
+        """Test the department and warehouses come with the user"""
+        user_id, location_ids = hod
+        db.session.expunge_all()
+
+        user, statements = statements_during(db, lambda: User.load_principal(user_id))
+        _, later = statements_during(db, lambda: (user.managed_department.code, user.accessible_location_ids,
+                                                  user.can_access_warehouse(location_ids[0])))
+
+        assert len(statements) == 1
+        assert later == []
+        assert user.managed_department.code == 'PRN'
+
+    def test_accessible_location_ids(self, db, hod, sample_user_with_role):
+        """Test the ids are a frozenset, and superadmins are unrestricted"""
+        user_id, location_ids = hod
+        user = db.session.get(User, user_id)
+        admin = sample_user_with_role(UserRole.SUPERADMIN)
+
+        assert user.accessible_location_ids == frozenset(location_ids[:2])
+        assert user.can_access_warehouse(location_ids[1])
+        assert not user.can_access_warehouse(location_ids[2])
+        assert admin.accessible_location_ids is None
+        assert admin.can_access_warehouse(location_ids[2])
+
+    def test_memoized_per_request(self, app, db, hod):
+        """Test the ids are computed once per request and recomputed after an assignment change"""
+        user_id, location_ids = hod
+        user = db.session.get(User, user_id)
+
+        with app.test_request_context('/'):
+            first = user.accessible_location_ids
+            assert user.accessible_location_ids is first
+
+            user.assigned_warehouses.append(db.session.get(type(user.assigned_warehouses[0]), location_ids[2]))
+            assert user.accessible_location_ids == frozenset(location_ids)
+
+    def test_request_loads_user_once(self, app, client, db, hod):
+        """Test a warehouse-filtered page reads the user row a single time"""
+        client.post('/auth/login', data={'username': 'principal_hod', 'password': 'password123'})
+
+        with app.app_context():  # a fresh g and session, as each request gets in production
+            response, statements = statements_during(db, lambda: client.get('/low-stock/alerts'))
+
+        assert response.status_code == 200
+        assert len([s for s in statements if 'FROM users' in s]) == 1
+        assert not any('user_warehouse_assignments' in s for s in statements if 'FROM users' not in s)
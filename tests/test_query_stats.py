@@ -0,0 +1,71 @@
+"""
+Unit tests for per-request SQL instrumentation
+"""
+
+import json
+import logging
+import pytest
+from query_stats import QueryStats, current_stats
+
+
+class TestQueryStats:
+    """Test query counting, Server-Timing and the slow-query log"""
+
+    def test_keeps_slowest_statements(self):
+        """Test only the slowest statements are kept, slowest first"""
+        stats = QueryStats(keep=2)
+        for ms, sql in [(1.0, 'a'), (5.0, 'b'), (3.0, 'c')]:
+            stats.add(sql, ms)
+
+        assert stats.count == 3
+        assert stats.total_ms == 9.0
+        assert stats.slowest == [(5.0, 'b'), (3.0, 'c')]
+
+    def test_server_timing_header(self, client, db):
+        """Test responses report the number of queries and DB time"""
+        response = client.get('/auth/login')
+        timings = response.headers.getlist('Server-Timing')
+
+        assert any(t.startswith('db;dur=') and 'queries' in t for t in timings)
+        assert any(t.startswith('app;dur=') for t in timings)
+
+    def test_failed_statement_does_not_skew_timing(self, app, db):
+        """Test a statement that errors leaves no start time behind for the next one"""
+        from sqlalchemy import text
+        from sqlalchemy.exc import OperationalError
+        with app.test_request_context('/'):
+            app.preprocess_request()
+            with pytest.raises(OperationalError):
+                db.session.execute(text('SELECT * FROM no_such_table'))
+            db.session.rollback()
+            db.session.execute(text('SELECT 1'))
+
+            stats = current_stats()
+            connection = db.session.connection()
+            assert 'query_start' not in connection.info
+            assert stats.count == 1
+            assert stats.total_ms < 1000
+
+    def test_slow_query_logged(self, app, logged_in_admin, caplog, monkeypatch):
+        """Test statements over the threshold are logged as JSON"""
+        monkeypatch.setitem(app.config, 'SLOW_QUERY_THRESHOLD_MS', 0)
+        with caplog.at_level(logging.WARNING, logger='stock.sql'):
+            logged_in_admin.get('/masters/items')
+
+        slow = [json.loads(r.getMessage()) for r in caplog.records if r.name == 'stock.sql']
+        assert slow
+        assert all(e['event'] == 'slow_query' for e in slow)
+        assert slow[0]['path'] == '/masters/items'
+        assert 'SELECT' in slow[0]['statement']
+
+    def test_query_heavy_request_logged(self, app, logged_in_admin, caplog, monkeypatch):
+        """Test requests over the query-count threshold log their slowest statements"""
+        monkeypatch.setitem(app.config, 'QUERY_COUNT_LOG_THRESHOLD', 0)
+        with caplog.at_level(logging.WARNING, logger='stock.sql'):
+            logged_in_admin.get('/masters/items')
+
+        [summary] = [json.loads(r.getMessage()) for r in caplog.records if r.name == 'stock.sql']
+        assert summary['event'] == 'query_count'
+        assert summary['endpoint'] == 'masters.items'
+        assert summary['queries'] >= 1
+        assert 1 <= len(summary['slowest']) <= 3
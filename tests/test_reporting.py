@@ -0,0 +1,119 @@
+"""
+Unit tests for the reporting aggregation helpers
+"""
+
+import pytest
+from datetime import datetime
+from sqlalchemy import event
+from models import Department, StockIssueRequest, RequestStatus
+import rollups
+from reporting import (master_counts, request_status_counts, status_distribution,
+                       month_windows, monthly_request_counts, department_request_stats)
+
+
+@pytest.fixture
+def count_queries(db):
+    """Count SQL statements executed while the returned list is being appended to."""
+    statements = []
+
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', _before_execute)
+    yield statements
+    event.remove(db.engine, 'before_cursor_execute', _before_execute)
+
+
+def _make_request(db, request_no, user, department, location, status, created_at=None):
+    request = StockIssueRequest(
+        request_no=request_no,
+        requester_id=user.id,
+        department_id=department.id,
+        location_id=location.id,
+        purpose='Reporting test',
+        status=status,
+        created_at=created_at or datetime(2024, 5, 15, 10, 0)
+    )
+    db.session.add(request)
+    return request
+
+
+class TestReporting:
+    """Test reporting aggregation helpers"""
+
+    def test_request_status_counts(self, db, sample_user, sample_department, sample_location):
+        """Test status counts include every status and sum to the total"""
+        _make_request(db, 'RPT-001', sample_user, sample_department, sample_location, RequestStatus.PENDING)
+        _make_request(db, 'RPT-002', sample_user, sample_department, sample_location, RequestStatus.PENDING)
+        _make_request(db, 'RPT-003', sample_user, sample_department, sample_location, RequestStatus.ISSUED)
+        db.session.commit()
+        rollups.refresh()
+
+        counts, total = request_status_counts()
+
+        assert total == 3
+        assert counts[RequestStatus.PENDING] == 2
+        assert counts[RequestStatus.ISSUED] == 1
+        assert counts[RequestStatus.DRAFT] == 0
+        assert [d['status'] for d in status_distribution(counts, total)] == [s.value for s in RequestStatus]
+
+    def test_master_counts(self, db, sample_user, sample_department, sample_location, sample_item):
+        """Test master counts are returned from a single query"""
+        counts = master_counts()
+
+        assert counts['total_users'] == 1
+        assert counts['total_departments'] == 1
+        assert counts['total_items'] == 1
+        assert counts['total_locations'] == 1
+
+    def test_month_windows_cross_year(self):
+        """Test month windows are contiguous calendar months ending with the current one"""
+        windows = month_windows(3, now=datetime(2024, 2, 10))
+
+        assert windows == [
+            (datetime(2023, 12, 1), datetime(2024, 1, 1)),
+            (datetime(2024, 1, 1), datetime(2024, 2, 1)),
+            (datetime(2024, 2, 1), datetime(2024, 3, 1)),
+        ]
+
+    def test_monthly_request_counts(self, db, sample_user, sample_department, sample_location):
+        """Test requests are bucketed into their calendar month"""
+        _make_request(db, 'RPT-001', sample_user, sample_department, sample_location,
+                      RequestStatus.PENDING, created_at=datetime(2024, 4, 30, 23, 59))
+        _make_request(db, 'RPT-002', sample_user, sample_department, sample_location,
+                      RequestStatus.PENDING, created_at=datetime(2024, 5, 1, 0, 0))
+        _make_request(db, 'RPT-003', sample_user, sample_department, sample_location,
+                      RequestStatus.PENDING, created_at=datetime(2024, 5, 20))
+        db.session.commit()
+        rollups.refresh()
+
+        monthly = monthly_request_counts(2, now=datetime(2024, 5, 25))
+
+        assert monthly == [
+            {'month': 'Apr 2024', 'requests': 1},
+            {'month': 'May 2024', 'requests': 2},
+        ]
+
+    def test_department_stats_query_count_is_constant(self, db, sample_user, sample_location, count_queries):
+        """Test department stats cost one query regardless of department count"""
+        departments = []
+        for i in range(10):
+            department = Department(code=f'RPT{i}', name=f'Reporting Dept {i}')
+            db.session.add(department)
+            departments.append(department)
+        db.session.flush()
+
+        _make_request(db, 'RPT-001', sample_user, departments[0], sample_location, RequestStatus.ISSUED)
+        _make_request(db, 'RPT-002', sample_user, departments[0], sample_location, RequestStatus.PENDING)
+        db.session.commit()
+        rollups.refresh()
+
+        count_queries.clear()
+        stats = {d['name']: d for d in department_request_stats()}
+
+        assert len(count_queries) == 1
+        assert len(stats) == 10
+        assert stats['Reporting Dept 0']['total_requests'] == 2
+        assert stats['Reporting Dept 0']['issued_requests'] == 1
+        assert stats['Reporting Dept 0']['efficiency'] == 50.0
+        assert stats['Reporting Dept 1']['total_requests'] == 0
@@ -0,0 +1,91 @@
+"""
+Unit tests for stock request line validation
+"""
+
+import pytest
+from decimal import Decimal
+from sqlalchemy import event
+from werkzeug.datastructures import MultiDict
+from request_validation import parse_lines, availability_errors, validate_lines
+from models import StockBalance, StockIssueRequest, UserRole
+
+
+def request_form(*lines):
+    form = MultiDict()
+    for item_id, quantity in lines:
+        form.add('item_id[]', str(item_id))
+        form.add('quantity[]', str(quantity))
+        form.add('item_remarks[]', '')
+    return form
+
+
+class TestRequestValidation:
+    """Test line parsing, duplicate aggregation and batched stock checks"""
+
+    def test_parse_reports_every_bad_line(self):
+        """Test each invalid quantity is reported and valid lines are kept"""
+        lines, errors = parse_lines(['1', '2', '3', ''], ['2', '-1', 'abc', '5'], ['a', 'b', 'c', 'd'])
+
+        assert lines == [(1, Decimal('2'), 'a')]
+        assert errors == ['Invalid quantity for item 2.', 'Invalid quantity for item 3.']
+
+    def test_duplicate_lines_checked_together(self, db, sample_stock_balance):
+        """Test two lines of one item must fit in the balance together"""
+        item_id, location_id = sample_stock_balance.item_id, sample_stock_balance.location_id
+
+        within = availability_errors(location_id, [(item_id, Decimal('4'), ''), (item_id, Decimal('6'), '')])
+        beyond = availability_errors(location_id, [(item_id, Decimal('6'), ''), (item_id, Decimal('6'), '')])
+
+        assert within == []
+        assert len(beyond) == 1
+        assert 'Requested: 12 across 2 lines' in beyond[0]
+
+    def test_all_errors_returned(self, db, sample_stock_balance, item_factory):
+        """Test quantity, out-of-stock, shortage and unknown-item errors come back together"""
+        [empty] = item_factory(1)
+        form = request_form((sample_stock_balance.item_id, 11), (empty.id, 1), (9999, 1), (empty.id, 'x'))
+
+        lines, errors = validate_lines(form, sample_stock_balance.location_id)
+
+        assert len(lines) == 3
+        assert errors[0] == 'Invalid quantity for item 4.'
+        assert 'insufficient stock' in errors[1]
+        assert 'out of stock' in errors[2]
+        assert errors[3] == 'Item #9999 does not exist.'
+
+    def test_single_query_for_any_line_count(self, db, sample_location, item_factory):
+        """Test stock checks cost one query regardless of the number of lines"""
+        items = item_factory(30)
+        for item in items:
+            db.session.add(StockBalance(item_id=item.id, location_id=sample_location.id, quantity=5))
+        db.session.commit()
+        location_id = sample_location.id
+        lines = [(item.id, Decimal('1'), '') for item in items]
+
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            errors = availability_errors(location_id, lines)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+
+        assert errors == []
+        assert len(statements) == 1
+
+    def test_submit_rejects_duplicates_over_balance(self, logged_in_admin, db, sample_stock_balance):
+        """Test submit_request refuses a request whose duplicate lines overdraw the balance"""
+        item_id = sample_stock_balance.item_id
+        response = logged_in_admin.post('/requests/create', data={
+            'location_id': sample_stock_balance.location_id,
+            'purpose': 'Testing',
+            'item_id[]': [item_id, item_id],
+            'quantity[]': ['6', '6'],
+            'item_remarks[]': ['', '']
+        }, follow_redirects=True)
+
+        assert b'across 2 lines' in response.data
+        assert StockIssueRequest.query.count() == 0
@@ -0,0 +1,160 @@
+"""
+Tests for the cached returned quantity on issue lines
+"""
+
+import pytest
+from sqlalchemy import event
+from datetime import datetime, timedelta
+from decimal import Decimal
+from database import db as _db
+from inventory import complete_return
+from return_totals import find_drift, backfill, check_return_totals_command, backfill_return_totals_command
+from models import (StockIssueRequest, StockIssueLine, StockReturn, StockBalance,
+                    RequestStatus, ReturnStatus)
+
+
+@pytest.fixture
+def issued_line(db, sample_item, sample_user, sample_department, sample_location):
+    """An issued line of 5 units, issued two days ago"""
+    request_obj = StockIssueRequest(
+        request_no='REQRT001', requester_id=sample_user.id, department_id=sample_department.id,
+        location_id=sample_location.id, purpose='Return test', status=RequestStatus.ISSUED,
+        issued_at=datetime.utcnow() - timedelta(days=2)
+    )
+    line = StockIssueLine(request=request_obj, item=sample_item, quantity_requested=Decimal('5'),
+                          quantity_issued=Decimal('5'))
+    db.session.add(line)
+    db.session.commit()
+    return line
+
+
+def pending_return(line, quantity, n=0):
+    stock_return = StockReturn(return_no=f'RETRT{n:03d}', issue_line=line, returned_by=line.request.requester_id,
+                               quantity_returned=Decimal(quantity), return_reason='Test',
+                               status=ReturnStatus.PENDING)
+    _db.session.add(stock_return)
+    _db.session.flush()
+    return stock_return
+
+
+class TestCompleteReturn:
+    """Test completing returns keeps the line total and stock in step"""
+
+    def test_complete_return_updates_total_and_stock(self, db, issued_line, sample_user):
+        """Test a completed return raises the line total and credits the location"""
+        stock_return = pending_return(issued_line, '2')
+
+        assert complete_return(stock_return, sample_user.id, remarks='ok')
+        db.session.commit()
+
+        assert stock_return.status == ReturnStatus.COMPLETED
+        assert stock_return.remarks == 'ok'
+        assert issued_line.quantity_returned_total == Decimal('2')
+        assert issued_line.quantity_returnable == Decimal('3')
+        balance = StockBalance.query.filter_by(item_id=issued_line.item_id,
+                                               location_id=issued_line.request.location_id).one()
+        assert balance.quantity == Decimal('2')
+
+    def test_over_return_refused(self, db, issued_line, sample_user):
+        """Test a return that would exceed the issued quantity changes nothing"""
+        first = pending_return(issued_line, '4', 0)
+        second = pending_return(issued_line, '2', 1)
+
+        assert complete_return(first, sample_user.id)
+        assert not complete_return(second, sample_user.id)
+        db.session.commit()
+
+        assert second.status == ReturnStatus.PENDING
+        assert issued_line.quantity_returned_total == Decimal('4')
+
+    def test_admin_approval_goes_through_total(self, logged_in_admin, db, issued_line):
+        """Test approving a pending return from the processing view updates the total"""
+        stock_return = pending_return(issued_line, '3')
+        db.session.commit()
+        line_id = issued_line.id
+
+        logged_in_admin.post(f'/returns/{stock_return.id}/process', data={'action': 'approve'})
+
+        assert db.session.get(StockIssueLine, line_id).quantity_returned_total == Decimal('3')
+
+
+class TestReturnTotalMaintenance:
+    """Test drift detection and the backfill commands"""
+
+    def _drift(self, db, line):
+        """Mark a return completed without touching the line total"""
+        stock_return = pending_return(line, '2')
+        stock_return.status = ReturnStatus.COMPLETED
+        db.session.commit()
+
+    def test_find_drift_and_backfill(self, db, issued_line):
+        """Test a drifted line is reported, repaired, and then consistent"""
+        self._drift(db, issued_line)
+
+        assert [(row[0], Decimal(row[2])) for row in find_drift()] == [(issued_line.id, Decimal('2'))]
+        assert backfill() == 1
+        db.session.commit()
+
+        assert find_drift() == []
+        db.session.refresh(issued_line)
+        assert issued_line.quantity_returned_total == Decimal('2')
+
+    def test_cli_commands(self, db, runner, issued_line):
+        """Test check exits non-zero on drift and backfill clears it"""
+        self._drift(db, issued_line)
+
+        result = runner.invoke(check_return_totals_command)
+        assert result.exit_code == 1
+        assert '1 issue line(s) out of step' in result.output
+
+        result = runner.invoke(backfill_return_totals_command)
+        assert 'Updated 1 issue line(s).' in result.output
+
+        result = runner.invoke(check_return_totals_command)
+        assert result.exit_code == 0
+
+
+class TestReturnTracker:
+    """Test the audit tracker filters on the cached total"""
+
+    @pytest.mark.parametrize('status, expected', [
+        ('fully_returned', False),
+        ('partially_returned', True),
+        ('not_returned', False),
+    ])
+    def test_status_filters(self, logged_in_admin, db, issued_line, sample_user, status, expected):
+        """Test a partially returned line appears only under the partial filter"""
+        assert complete_return(pending_return(issued_line, '2'), sample_user.id)
+        db.session.commit()
+
+        response = logged_in_admin.get(f'/audit/issue-return-tracker?status={status}')
+
+        assert response.status_code == 200
+        assert (b'REQRT001' in response.data) == expected
+
+
+class TestReturnItemsPage:
+    """Test choosing what to return reads the cached total, not the returns"""
+
+    @pytest.mark.parametrize('url, data', [
+        ('/returns/search-issue', {'search_term': 'REQRT001'}),
+        ('/returns/select-issue', None),
+    ])
+    def test_returns_not_loaded(self, logged_in_admin, db, issued_line, sample_user, url, data):
+        """Test the returnable quantities render without querying stock_returns"""
+        assert complete_return(pending_return(issued_line, '2'), sample_user.id)
+        db.session.commit()
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            response = logged_in_admin.post(url, data=data or {'request_id': issued_line.request_id})
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+        assert response.status_code == 200
+        assert b'REQRT001' in response.data
+        assert not [s for s in statements if 'FROM stock_returns' in s]
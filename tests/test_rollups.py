@@ -0,0 +1,227 @@
+"""
+Tests for the daily reporting rollups
+"""
+
+import threading
+import time
+import pytest
+from datetime import date, datetime
+from decimal import Decimal
+from sqlalchemy import event
+import rollups
+from reporting import request_status_counts, movement_totals, top_requested_items
+from models import (StockIssueRequest, StockIssueLine, StockReturn, StockEntry, RequestStatus, ReturnStatus,
+                    DailyRequestRollup, DailyItemRollup, RollupDirtyDay)
+
+
+@pytest.fixture
+def activity(db, sample_item, sample_user, sample_department, sample_location):
+    """An entry on May 1, a request created May 2 and issued May 3, and a return completed May 4"""
+    db.session.add(StockEntry(item_id=sample_item.id, location_id=sample_location.id, quantity_procured=Decimal('20'),
+                              created_by=sample_user.id, created_at=datetime(2024, 5, 1, 9, 0)))
+    request_obj = StockIssueRequest(
+        request_no='REQRU001', requester_id=sample_user.id, department_id=sample_department.id,
+        location_id=sample_location.id, purpose='Rollup', status=RequestStatus.ISSUED,
+        created_at=datetime(2024, 5, 2, 11, 0), issued_at=datetime(2024, 5, 3, 15, 0)
+    )
+    line = StockIssueLine(request=request_obj, item_id=sample_item.id, quantity_requested=Decimal('6'),
+                          quantity_issued=Decimal('5'))
+    db.session.add(StockReturn(return_no='RETRU001', issue_line=line, returned_by=sample_user.id,
+                               quantity_returned=Decimal('2'), return_reason='Test', status=ReturnStatus.COMPLETED,
+                               processed_at=datetime(2024, 5, 4, 8, 0)))
+    db.session.commit()
+    rollups.refresh()
+    return request_obj
+
+
+class TestRollups:
+    """Test rollups track writes and match the raw rows"""
+
+    def test_figures_filed_by_day(self, db, activity):
+        """Test each quantity lands on the day of its own timestamp"""
+        rows = {row.day: row for row in DailyItemRollup.query.all()}
+
+        assert rows[date(2024, 5, 1)].quantity_procured == Decimal('20')
+        assert rows[date(2024, 5, 1)].entry_count == 1
+        assert rows[date(2024, 5, 2)].quantity_requested == Decimal('6')
+        assert rows[date(2024, 5, 3)].quantity_issued == Decimal('5')
+        assert rows[date(2024, 5, 4)].quantity_returned == Decimal('2')
+        assert RollupDirtyDay.query.count() == 0
+
+    def test_movement_totals(self, db, activity):
+        """Test range totals include both end days"""
+        totals = movement_totals(date(2024, 5, 1), date(2024, 5, 3))
+
+        assert totals['entries_count'] == 1
+        assert totals['issues_count'] == 1
+        assert totals['total_quantity_in'] == Decimal('20')
+        assert totals['total_quantity_out'] == Decimal('5')
+        assert movement_totals(date(2024, 5, 4), date(2024, 6, 30))['issues_count'] == 0
+
+    def test_status_change_requeues_day(self, db, sample_user, sample_department, sample_location):
+        """Test changing a request's status moves its count after a refresh"""
+        request_obj = StockIssueRequest(
+            request_no='REQRU002', requester_id=sample_user.id, department_id=sample_department.id,
+            location_id=sample_location.id, purpose='Rollup', status=RequestStatus.PENDING,
+            created_at=datetime(2024, 6, 1, 10, 0)
+        )
+        db.session.add(request_obj)
+        db.session.commit()
+        rollups.refresh()
+
+        request_obj.status = RequestStatus.REJECTED
+        db.session.commit()
+        assert [row.day for row in RollupDirtyDay.query.all()] == [date(2024, 6, 1)]
+
+        assert rollups.refresh() == [date(2024, 6, 1)]
+        counts, total = request_status_counts()
+        assert total == 1
+        assert counts[RequestStatus.PENDING] == 0
+        assert counts[RequestStatus.REJECTED] == 1
+
+    def test_delete_clears_figures(self, db, activity):
+        """Test deleting a request removes it from the rollups"""
+        for stock_return in StockReturn.query.all():
+            db.session.delete(stock_return)
+        for line in activity.issue_lines:
+            db.session.delete(line)
+        db.session.delete(activity)
+        db.session.commit()
+        rollups.refresh()
+
+        assert request_status_counts()[1] == 0
+        assert top_requested_items() == []
+        assert DailyRequestRollup.query.count() == 0
+
+    def test_rollback_drops_marks(self, db, activity):
+        """Test a rolled back change leaves nothing queued"""
+        activity.status = RequestStatus.REJECTED
+        db.session.flush()
+        db.session.rollback()
+
+        assert RollupDirtyDay.query.count() == 0
+
+    def test_idle_refresh_is_one_query(self, db, activity):
+        """Test refreshing with an empty queue costs a single statement"""
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            assert rollups.refresh() == []
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+
+        assert len(statements) == 1
+
+    def test_full_rebuild_command(self, db, runner, activity):
+        """Test --full reproduces the incrementally maintained rows"""
+        before = sorted((r.day, r.item_id, r.quantity_requested, r.quantity_issued, r.quantity_returned,
+                         r.quantity_procured) for r in DailyItemRollup.query.all())
+        DailyItemRollup.query.delete()
+        db.session.commit()
+
+        result = runner.invoke(rollups.refresh_rollups_command, ['--full'])
+
+        assert 'Rebuilt all daily rollups.' in result.output
+        after = sorted((r.day, r.item_id, r.quantity_requested, r.quantity_issued, r.quantity_returned,
+                        r.quantity_procured) for r in DailyItemRollup.query.all())
+        assert after == before
+
+
+class TestRollupRefreshing:
+    """Test the rollups are kept current outside the request path"""
+
+    def test_empty_rollups_are_backfilled(self, db, activity):
+        """Test ensure_populated rebuilds rollups that were never filled, and only then"""
+        DailyRequestRollup.query.delete()
+        DailyItemRollup.query.delete()
+        db.session.commit()
+
+        assert rollups.ensure_populated()
+        assert request_status_counts()[1] == 1
+        assert not rollups.ensure_populated()
+
+    def test_init_db_backfills(self, db, runner, activity):
+        """Test init-db fills the rollups on a database upgraded with existing data"""
+        from bootstrap import init_db_command
+        DailyRequestRollup.query.delete()
+        DailyItemRollup.query.delete()
+        db.session.commit()
+
+        result = runner.invoke(init_db_command)
+
+        assert 'Backfilled the daily reporting rollups' in result.output
+        assert DailyRequestRollup.query.count() > 0
+
+    def test_background_refresher_drains_queue(self, app, db, activity, monkeypatch):
+        """Test the worker thread refreshes queued days on its interval"""
+        activity.status = RequestStatus.REJECTED
+        db.session.commit()
+        monkeypatch.setitem(app.config, 'ROLLUP_REFRESH_INTERVAL', 0.05)
+
+        rollups.start_refresher(app)
+        try:
+            for _ in range(50):
+                db.session.expire_all()
+                if RollupDirtyDay.query.count() == 0:
+                    break
+                time.sleep(0.05)
+        finally:
+            rollups.stop_refresher()
+
+        assert RollupDirtyDay.query.count() == 0
+        assert request_status_counts()[0][RequestStatus.REJECTED] == 1
+
+    def test_failed_backfill_does_not_stop_refresher(self, app, db, monkeypatch):
+        """Test an error in the first ensure_populated is logged and the refresh loop still runs"""
+        stop = threading.Event()
+        refreshed = []
+
+        def fail():
+            raise RuntimeError('database unavailable')
+
+        def refresh():
+            refreshed.append(True)
+            stop.set()
+
+        monkeypatch.setattr(rollups, 'ensure_populated', fail)
+        monkeypatch.setattr(rollups, 'refresh', refresh)
+
+        rollups._refresh_periodically(app, 0.01, stop)
+
+        assert refreshed
+
+    def test_report_views_do_not_refresh(self, logged_in_admin, db, activity):
+        """Test report pages read the rollups as they stand"""
+        activity.status = RequestStatus.REJECTED
+        db.session.commit()
+
+        logged_in_admin.get('/reports/reports')
+        logged_in_admin.get('/reports/reports/api/chart-data?type=status_distribution')
+
+        assert RollupDirtyDay.query.count() > 0
+
+
+class TestRollupViews:
+    """Test report endpoints read refreshed rollups"""
+
+    def test_transaction_summary(self, logged_in_admin, db, activity):
+        """Test the summary API covers the requested range"""
+        response = logged_in_admin.get('/admin/transaction-summary?date_from=2024-05-01&date_to=2024-05-31')
+        data = response.get_json()
+
+        assert data['entries_count'] == 1
+        assert data['issues_count'] == 1
+        assert data['net_movement'] == 15.0
+
+    def test_dashboard_and_charts(self, logged_in_admin, db, activity):
+        """Test the dashboard lists the top item and charts count the request"""
+        response = logged_in_admin.get('/reports/reports')
+        assert response.status_code == 200
+        assert b'TEST-ITEM' in response.data
+
+        statuses = logged_in_admin.get('/reports/reports/api/chart-data?type=status_distribution').get_json()
+        assert {row['status']: row['count'] for row in statuses}['Issued'] == 1
@@ -0,0 +1,32 @@
+"""
+Tests for the portable date functions
+"""
+
+from datetime import date, datetime
+from sqlalchemy import func
+from models import StockIssueRequest, RequestStatus
+from sql_functions import days_between, date_of
+
+
+class TestSqlFunctions:
+    """Test day arithmetic gives the same answers on every backend"""
+
+    def test_days_between_and_date_of(self, db, sample_user, sample_department, sample_location):
+        """Test fractional day differences average and timestamps truncate to their day"""
+        for number, (created, issued) in enumerate([
+            (datetime(2024, 3, 1, 8, 0), datetime(2024, 3, 2, 20, 0)),
+            (datetime(2024, 3, 5, 9, 0), datetime(2024, 3, 5, 21, 0)),
+        ]):
+            db.session.add(StockIssueRequest(
+                request_no=f'REQSF00{number}', requester_id=sample_user.id, department_id=sample_department.id,
+                location_id=sample_location.id, purpose='Dates', status=RequestStatus.ISSUED,
+                created_at=created, issued_at=issued
+            ))
+        db.session.commit()
+
+        average = db.session.query(func.avg(days_between(StockIssueRequest.created_at,
+                                                         StockIssueRequest.issued_at))).scalar()
+        days = db.session.query(date_of(StockIssueRequest.issued_at)).order_by(StockIssueRequest.id).all()
+
+        assert round(float(average), 3) == 1.0
+        assert [day for day, in days] == [date(2024, 3, 2), date(2024, 3, 5)]
@@ -0,0 +1,105 @@
+"""
+Unit tests for the unified transaction history and shared paginator
+"""
+
+import pytest
+from decimal import Decimal
+from datetime import datetime, timedelta
+from models import StockEntry, StockIssueRequest, StockIssueLine, RequestStatus
+from pagination import Pagination
+from transactions import paginate_transactions, parse_date_range
+
+
+@pytest.fixture
+def transaction_data(db, sample_user, sample_department, sample_location, sample_item):
+    """Create interleaved stock entries and issued lines."""
+    base = datetime(2024, 6, 1, 9, 0)
+    for i in range(3):
+        db.session.add(StockEntry(
+            item_id=sample_item.id,
+            location_id=sample_location.id,
+            quantity_procured=Decimal('10.00'),
+            created_by=sample_user.id,
+            created_at=base + timedelta(days=i * 2)
+        ))
+
+    for i in range(2):
+        request = StockIssueRequest(
+            request_no=f'TXN-REQ-{i}',
+            requester_id=sample_user.id,
+            department_id=sample_department.id,
+            location_id=sample_location.id,
+            purpose='Transaction test',
+            status=RequestStatus.ISSUED,
+            issued_by=sample_user.id,
+            issued_at=base + timedelta(days=i * 2 + 1)
+        )
+        db.session.add(request)
+        db.session.flush()
+        db.session.add(StockIssueLine(
+            request_id=request.id,
+            item_id=sample_item.id,
+            quantity_requested=Decimal('2.00'),
+            quantity_issued=Decimal('2.00')
+        ))
+
+    db.session.commit()
+    return base
+
+
+class TestPagination:
+    """Test the shared Pagination object"""
+
+    def test_pagination_attributes(self):
+        """Test derived navigation attributes"""
+        pagination = Pagination(page=2, per_page=10, total=25, items=[])
+
+        assert pagination.pages == 3
+        assert pagination.has_prev is True
+        assert pagination.has_next is True
+        assert pagination.prev_num == 1
+        assert pagination.next_num == 3
+
+    def test_pagination_last_page(self):
+        """Test last page has no next page"""
+        pagination = Pagination(page=3, per_page=10, total=25, items=[])
+
+        assert pagination.has_next is False
+        assert pagination.next_num is None
+
+
+class TestTransactions:
+    """Test unified transaction history"""
+
+    def test_union_is_ordered_newest_first(self, transaction_data):
+        """Test entries and issues are interleaved by date"""
+        page = paginate_transactions(page=1, per_page=50)
+
+        assert page.total == 5
+        assert [t['type'] for t in page.items] == ['entry', 'issue', 'entry', 'issue', 'entry']
+        assert page.items[1]['reference'] == 'TXN-REQ-1'
+
+    def test_pages_are_sliced_in_database(self, transaction_data):
+        """Test per-page slicing and totals"""
+        page = paginate_transactions(page=2, per_page=2)
+
+        assert page.total == 5
+        assert page.pages == 3
+        assert len(page.items) == 2
+        assert page.items[0]['type'] == 'entry'
+
+    def test_type_and_date_filters(self, transaction_data):
+        """Test transaction type and date filters apply to the union"""
+        issues = paginate_transactions(transaction_type='issues')
+        assert issues.total == 2
+        assert all(t['type'] == 'issue' for t in issues.items)
+
+        window = paginate_transactions(date_from='2024-06-02', date_to='2024-06-03')
+        assert [t['type'] for t in window.items] == ['entry', 'issue']
+
+    def test_parse_date_range_ignores_invalid(self):
+        """Test invalid dates are ignored"""
+        start, end = parse_date_range('not-a-date', '2024-01-31')
+
+        assert start is None
+        assert end == datetime(2024, 2, 1)
@@ -0,0 +1,172 @@
+"""
+Unified stock transaction history (stock entries IN, issued lines OUT).
+
+Both sides are combined with a UNION ALL so that ordering, counting and
+LIMIT/OFFSET all happen in the database and only one page of rows is ever
+materialised in Python.
+"""
+
+from datetime import datetime, timedelta
+from sqlalchemy import literal, null, cast, union_all
+from database import db
+from models import StockEntry, StockIssueRequest, StockIssueLine, Item, Location, User, Department
+from pagination import paginate_selectable
+
+TRANSACTIONS_PER_PAGE = 50
+
+
+def parse_date_range(date_from, date_to):
+    """Parse YYYY-MM-DD filter strings into an inclusive-start, exclusive-end range (invalid values ignored)"""
+    start = end = None
+    if date_from:
+        try:
+            start = datetime.strptime(date_from, '%Y-%m-%d')
+        except ValueError:
+            pass
+    if date_to:
+        try:
+            end = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1)
+        except ValueError:
+            pass
+    return start, end
+
+
+def _entries_query(department_id, start, end, location_id, item_id):
+    query = db.session.query(
+        literal('entry').label('type'),
+        StockEntry.id.label('transaction_id'),
+        StockEntry.created_at.label('transaction_date'),
+        StockEntry.quantity_procured.label('quantity'),
+        StockEntry.description.label('description'),
+        StockEntry.remarks.label('remarks'),
+        Item.code.label('item_code'),
+        Item.name.label('item_name'),
+        Location.office.label('location_office'),
+        Location.room.label('location_room'),
+        User.full_name.label('user_name'),
+        Department.name.label('department_name'),
+        cast(null(), db.String).label('request_no')
+    ).select_from(StockEntry).join(
+        Item, StockEntry.item_id == Item.id
+    ).join(
+        Location, StockEntry.location_id == Location.id
+    ).join(
+        User, StockEntry.created_by == User.id
+    ).outerjoin(
+        Department, Item.department_id == Department.id
+    )
+
+    if department_id:
+        query = query.filter(Item.department_id == department_id)
+    if start:
+        query = query.filter(StockEntry.created_at >= start)
+    if end:
+        query = query.filter(StockEntry.created_at < end)
+    if location_id:
+        query = query.filter(StockEntry.location_id == location_id)
+    if item_id:
+        query = query.filter(StockEntry.item_id == item_id)
+
+    return query
+
+
+def _issues_query(department_id, start, end, location_id, item_id, user_column):
+    query = db.session.query(
+        literal('issue').label('type'),
+        StockIssueRequest.id.label('transaction_id'),
+        StockIssueRequest.issued_at.label('transaction_date'),
+        StockIssueLine.quantity_issued.label('quantity'),
+        StockIssueRequest.purpose.label('description'),
+        StockIssueLine.remarks.label('remarks'),
+        Item.code.label('item_code'),
+        Item.name.label('item_name'),
+        Location.office.label('location_office'),
+        Location.room.label('location_room'),
+        User.full_name.label('user_name'),
+        Department.name.label('department_name'),
+        StockIssueRequest.request_no.label('request_no')
+    ).select_from(StockIssueRequest).join(
+        StockIssueLine, StockIssueRequest.id == StockIssueLine.request_id
+    ).join(
+        Item, StockIssueLine.item_id == Item.id
+    ).join(
+        Location, StockIssueRequest.location_id == Location.id
+    ).join(
+        User, user_column == User.id
+    ).join(
+        Department, StockIssueRequest.department_id == Department.id
+    ).filter(
+        StockIssueRequest.issued_at.isnot(None),
+        StockIssueLine.quantity_issued.isnot(None),
+        StockIssueLine.quantity_issued > 0
+    )
+
+    if department_id:
+        query = query.filter(StockIssueRequest.department_id == department_id)
+    if start:
+        query = query.filter(StockIssueRequest.issued_at >= start)
+    if end:
+        query = query.filter(StockIssueRequest.issued_at < end)
+    if location_id:
+        query = query.filter(StockIssueRequest.location_id == location_id)
+    if item_id:
+        query = query.filter(StockIssueLine.item_id == item_id)
+
+    return query
+
+
+def transactions_union(transaction_type='all', department_id=None, date_from=None, date_to=None,
+                       location_id=None, item_id=None, issue_user_column=None):
+    """Build the UNION ALL of stock entries and issued lines matching the filters.
+
+    ``issue_user_column`` selects which user is reported for issues (defaults
+    to the issuer; the HOD view reports the requester instead).
+    """
+    start, end = parse_date_range(date_from, date_to)
+    if issue_user_column is None:
+        issue_user_column = StockIssueRequest.issued_by
+
+    parts = []
+    if transaction_type in ('all', 'entries'):
+        parts.append(_entries_query(department_id, start, end, location_id, item_id).statement)
+    if transaction_type in ('all', 'issues'):
+        parts.append(_issues_query(department_id, start, end, location_id, item_id, issue_user_column).statement)
+    if not parts:
+        # Unknown type: keep the column shape but match nothing
+        parts.append(_entries_query(department_id, start, end, location_id, item_id).filter(False).statement)
+
+    return union_all(*parts) if len(parts) > 1 else parts[0]
+
+
+def _to_dict(row):
+    if row.type == 'entry':
+        reference = f"Stock Entry #{row.transaction_id}"
+    else:
+        reference = row.request_no or f"Issue #{row.transaction_id}"
+
+    return {
+        'type': row.type,
+        'id': row.transaction_id,
+        'date': row.transaction_date,
+        'quantity': float(row.quantity) if row.quantity else 0,
+        'description': row.description or '',
+        'remarks': row.remarks or '',
+        'item_code': row.item_code or '',
+        'item_name': row.item_name or '',
+        'location': f"{row.location_office or ''} - {row.location_room or ''}",
+        'user': row.user_name or '',
+        'department': row.department_name or '',
+        'reference': reference
+    }
+
+
+def paginate_transactions(page=1, per_page=TRANSACTIONS_PER_PAGE, **filters):
+    """Return one page of the unified transaction history, newest first"""
+    pagination = paginate_selectable(
+        transactions_union(**filters),
+        lambda t: (t.c.transaction_date.desc(), t.c.type, t.c.transaction_id.desc()),
+        page,
+        per_page
+    )
+    pagination.items = [_to_dict(row) for row in pagination.items]
+    return pagination
@@ -2,9 +2,10 @@ from datetime import datetime
 from utils import get_ist_now
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
-from models import StockIssueRequest, RequestStatus, UserRole, Audit
+from models import StockIssueRequest, RequestStatus, UserRole, Audit, REQUEST_LIST
 from auth import role_required
 from database import db
+import metrics
 
 approvals_bp = Blueprint('approvals', __name__)
 
@@ -14,7 +15,7 @@ approvals_bp = Blueprint('approvals', __name__)
 def pending():
     if current_user.role == UserRole.SUPERADMIN:
         # Superadmin can see all pending requests
-        requests = StockIssueRequest.query.filter_by(
+        requests = StockIssueRequest.query.options(*REQUEST_LIST).filter_by(
             status=RequestStatus.PENDING
         ).order_by(StockIssueRequest.created_at.desc()).all()
     else:
@@ -23,7 +24,7 @@ def pending():
             flash('You are not assigned as HOD of any department.', 'error')
             return redirect(url_for('main.dashboard'))
 
-        requests = StockIssueRequest.query.filter_by(
+        requests = StockIssueRequest.query.options(*REQUEST_LIST).filter_by(
             department_id=current_user.managed_department.id,
             status=RequestStatus.PENDING
         ).order_by(StockIssueRequest.created_at.desc()).all()
@@ -68,6 +69,7 @@ def approve_request(request_id):
         )
 
         db.session.commit()
+        metrics.record_event(metrics.APPROVED)
         flash(f'Request {request_obj.request_no} approved successfully.', 'success')
 
     except Exception as e:
@@ -131,7 +133,7 @@ def approval_history():
 
     if current_user.role == UserRole.SUPERADMIN:
         # Superadmin can see all processed requests
-        requests = StockIssueRequest.query.filter(
+        requests = StockIssueRequest.query.options(*REQUEST_LIST).filter(
             StockIssueRequest.status.in_([RequestStatus.APPROVED, RequestStatus.REJECTED, RequestStatus.ISSUED])
         ).order_by(StockIssueRequest.updated_at.desc()).paginate(
             page=page, per_page=20, error_out=False
@@ -142,7 +144,7 @@ def approval_history():
             flash('You are not assigned as HOD of any department.', 'error')
             return redirect(url_for('main.dashboard'))
 
-        requests = StockIssueRequest.query.filter(
+        requests = StockIssueRequest.query.options(*REQUEST_LIST).filter(
             StockIssueRequest.department_id == current_user.managed_department.id,
             StockIssueRequest.status.in_([RequestStatus.APPROVED, RequestStatus.REJECTED, RequestStatus.ISSUED])
         ).order_by(StockIssueRequest.updated_at.desc()).paginate(
@@ -1,15 +1,71 @@
 
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, render_template, request, jsonify, current_app
 from flask_login import login_required, current_user
 from models import (StockIssueRequest, StockIssueLine, StockReturn, Item, Location, 
                    User, Department, UserRole, ReturnStatus, RequestStatus, Audit)
 from auth import role_required
 from database import db
 from datetime import datetime, timedelta
-from sqlalchemy import desc, func, and_, or_
+from sqlalchemy import desc, func, and_, or_, case, false
+from pagination import paginate_query
+import master_data
 
 audit_bp = Blueprint('audit', __name__)
 
+TRACKER_PER_PAGE = 25
+
+# Sort key of the tracker (newest issue first); unique, so it can drive keyset pages
+TRACKER_KEYS = (
+    ('issued_at', StockIssueRequest.issued_at, datetime.fromisoformat),
+    ('line_id', StockIssueLine.id, int),
+)
+
+OVERDUE_DAYS = 30
+
+
+def parse_day(value, days=0):
+    """Datetime for a YYYY-MM-DD filter value shifted by ``days``; None if missing or malformed"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d') + timedelta(days=days)
+    except ValueError:
+        return None
+
+
+def tracked_line_filters(user, date_from=None, date_to=None, department_id=None):
+    """Criteria selecting the issued lines a user may audit, shared by the tracker and its summary"""
+    criteria = [
+        StockIssueRequest.status == RequestStatus.ISSUED,
+        StockIssueRequest.issued_at.isnot(None),
+        StockIssueLine.quantity_issued.isnot(None),
+        StockIssueLine.quantity_issued > 0
+    ]
+
+    if user.role == UserRole.HOD:
+        # HOD with no managed department sees nothing
+        criteria.append(StockIssueRequest.department_id == user.managed_department.id
+                        if user.managed_department else false())
+    elif department_id and user.role == UserRole.SUPERADMIN:
+        criteria.append(StockIssueRequest.department_id == department_id)
+
+    issued_from = parse_day(date_from)
+    if issued_from:
+        criteria.append(StockIssueRequest.issued_at >= issued_from)
+    issued_before = parse_day(date_to, days=1)
+    if issued_before:
+        criteria.append(StockIssueRequest.issued_at < issued_before)
+    return criteria
+
+
+def overdue_filter():
+    """Lines issued more than OVERDUE_DAYS ago and not fully returned"""
+    return and_(
+        StockIssueRequest.issued_at < datetime.utcnow() - timedelta(days=OVERDUE_DAYS),
+        StockIssueLine.quantity_returned_total < StockIssueLine.quantity_issued
+    )
+
+
 @audit_bp.route('/issue-return-tracker')
 @login_required
 @role_required('superadmin', 'hod')
@@ -18,6 +74,7 @@ def issue_return_tracker():
     
     # Get filter parameters
     page = request.args.get('page', 1, type=int)
+    after = request.args.get('after')
     date_from = request.args.get('date_from')
     date_to = request.args.get('date_to')
     status_filter = request.args.get('status')
@@ -28,6 +85,12 @@ def issue_return_tracker():
     # Base query for audit records
     audit_records = []
     
+    # Completed returns of the line in each row (for the count and latest date)
+    completed_returns = db.select(StockReturn.id).where(
+        StockReturn.issue_line_id == StockIssueLine.id,
+        StockReturn.status == ReturnStatus.COMPLETED
+    ).correlate_except(StockReturn)
+
     # Get issued items with their return details
     issues_query = db.session.query(
         StockIssueRequest.id.label('request_id'),
@@ -44,9 +107,9 @@ def issue_return_tracker():
         User.username.label('requester_username'),
         Department.name.label('department_name'),
         Department.code.label('department_code'),
-        func.coalesce(func.sum(StockReturn.quantity_returned), 0).label('total_returned'),
-        func.count(StockReturn.id).label('return_count'),
-        func.max(StockReturn.created_at).label('last_return_date')
+        StockIssueLine.quantity_returned_total.label('total_returned'),
+        completed_returns.with_only_columns(func.count(StockReturn.id)).scalar_subquery().label('return_count'),
+        completed_returns.with_only_columns(func.max(StockReturn.created_at)).scalar_subquery().label('last_return_date')
     ).select_from(StockIssueRequest).join(
         StockIssueLine, StockIssueRequest.id == StockIssueLine.request_id
     ).join(
@@ -57,107 +120,36 @@ def issue_return_tracker():
         User, StockIssueRequest.requester_id == User.id
     ).join(
         Department, StockIssueRequest.department_id == Department.id
-    ).outerjoin(
-        StockReturn, and_(
-            StockIssueLine.id == StockReturn.issue_line_id,
-            StockReturn.status == ReturnStatus.COMPLETED
-        )
     ).filter(
-        StockIssueRequest.status == RequestStatus.ISSUED,
-        StockIssueLine.quantity_issued.isnot(None),
-        StockIssueLine.quantity_issued > 0
+        *tracked_line_filters(current_user, date_from, date_to, department_id)
     )
     
-    # Apply department filter based on user role
-    if current_user.role == UserRole.HOD:
-        if current_user.managed_department:
-            issues_query = issues_query.filter(
-                StockIssueRequest.department_id == current_user.managed_department.id
-            )
-        else:
-            # HOD with no managed department sees nothing
-            issues_query = issues_query.filter(False)
-    
     # Apply filters
-    if date_from:
-        try:
-            date_from_obj = datetime.strptime(date_from, '%Y-%m-%d')
-            issues_query = issues_query.filter(StockIssueRequest.issued_at >= date_from_obj)
-        except ValueError:
-            pass
-    
-    if date_to:
-        try:
-            date_to_obj = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1)
-            issues_query = issues_query.filter(StockIssueRequest.issued_at < date_to_obj)
-        except ValueError:
-            pass
-    
-    if department_id and current_user.role == UserRole.SUPERADMIN:
-        issues_query = issues_query.filter(StockIssueRequest.department_id == department_id)
-    
     if item_id:
         issues_query = issues_query.filter(StockIssueLine.item_id == item_id)
     
     if user_id:
         issues_query = issues_query.filter(StockIssueRequest.requester_id == user_id)
     
-    # Group by relevant fields
-    issues_query = issues_query.group_by(
-        StockIssueRequest.id,
-        StockIssueRequest.request_no,
-        StockIssueRequest.issued_at,
-        StockIssueRequest.status,
-        StockIssueLine.id,
-        StockIssueLine.quantity_issued,
-        Item.code,
-        Item.name,
-        Location.office,
-        Location.room,
-        User.full_name,
-        User.username,
-        Department.name,
-        Department.code
-    ).order_by(desc(StockIssueRequest.issued_at))
-    
     # Apply status filter
+    returned = StockIssueLine.quantity_returned_total
     if status_filter:
         if status_filter == 'fully_returned':
-            issues_query = issues_query.having(
-                func.coalesce(func.sum(StockReturn.quantity_returned), 0) >= StockIssueLine.quantity_issued
-            )
+            issues_query = issues_query.filter(returned >= StockIssueLine.quantity_issued)
         elif status_filter == 'partially_returned':
-            issues_query = issues_query.having(
-                and_(
-                    func.coalesce(func.sum(StockReturn.quantity_returned), 0) > 0,
-                    func.coalesce(func.sum(StockReturn.quantity_returned), 0) < StockIssueLine.quantity_issued
-                )
-            )
+            issues_query = issues_query.filter(returned > 0, returned < StockIssueLine.quantity_issued)
         elif status_filter == 'not_returned':
-            issues_query = issues_query.having(
-                func.coalesce(func.sum(StockReturn.quantity_returned), 0) == 0
-            )
+            issues_query = issues_query.filter(returned == 0)
         elif status_filter == 'overdue':
-            # Items issued more than 30 days ago and not fully returned
-            overdue_date = datetime.utcnow() - timedelta(days=30)
-            issues_query = issues_query.filter(
-                StockIssueRequest.issued_at < overdue_date
-            ).having(
-                func.coalesce(func.sum(StockReturn.quantity_returned), 0) < StockIssueLine.quantity_issued
-            )
-    
-    # Execute query with pagination
-    per_page = 25
-    total_query = issues_query.statement.compile(compile_kwargs={"literal_binds": True})
-    total = len(list(issues_query.all()))
+            issues_query = issues_query.filter(overdue_filter())
     
-    # Apply pagination
-    start = (page - 1) * per_page
-    paginated_issues = issues_query.offset(start).limit(per_page).all()
+    # Count in the database; "Next" links continue from the last row's key rather than an offset
+    pagination = paginate_query(issues_query, TRACKER_KEYS, page, TRACKER_PER_PAGE, cursor=after,
+                                count_limit=current_app.config.get('AUDIT_TRACKER_COUNT_LIMIT'))
     
     # Process results to add calculated fields
     audit_data = []
-    for issue in paginated_issues:
+    for issue in pagination.items:
         # Calculate return status
         quantity_remaining = float(issue.quantity_issued) - float(issue.total_returned)
         
@@ -173,7 +165,7 @@ def issue_return_tracker():
         
         # Check if overdue (more than 30 days and not fully returned)
         days_since_issue = (datetime.utcnow() - issue.issued_at).days if issue.issued_at else 0
-        is_overdue = days_since_issue > 30 and quantity_remaining > 0
+        is_overdue = days_since_issue > OVERDUE_DAYS and quantity_remaining > 0
         
         audit_data.append({
             'request_id': issue.request_id,
@@ -198,18 +190,13 @@ def issue_return_tracker():
             'is_overdue': is_overdue
         })
     
-    # Calculate pagination info
-    has_prev = page > 1
-    has_next = start + per_page < total
-    prev_num = page - 1 if has_prev else None
-    next_num = page + 1 if has_next else None
-    pages = (total + per_page - 1) // per_page
+    pagination.items = audit_data
     
     # Get filter options
     if current_user.role == UserRole.SUPERADMIN:
-        departments = Department.query.all()
+        departments = master_data.get_departments()
         users = User.query.filter_by(is_active=True).all()
-        items = Item.query.all()
+        items = master_data.get_items()
     else:
         # HOD sees only their department data
         departments = [current_user.managed_department] if current_user.managed_department else []
@@ -217,26 +204,7 @@ def issue_return_tracker():
             department_id=current_user.managed_department.id if current_user.managed_department else None,
             is_active=True
         ).all()
-        items = Item.query.filter_by(
-            department_id=current_user.managed_department.id if current_user.managed_department else None
-        ).all()
-    
-    # Create pagination object
-    class PaginationInfo:
-        def __init__(self, page, per_page, total, pages, has_prev, has_next, prev_num, next_num, items):
-            self.page = page
-            self.per_page = per_page
-            self.total = total
-            self.pages = pages
-            self.has_prev = has_prev
-            self.has_next = has_next
-            self.prev_num = prev_num
-            self.next_num = next_num
-            self.items = items
-    
-    pagination = PaginationInfo(
-        page, per_page, total, pages, has_prev, has_next, prev_num, next_num, audit_data
-    )
+        items = master_data.get_items(current_user.managed_department.id) if current_user.managed_department else []
     
     # Calculate summary statistics
     summary_stats = calculate_audit_summary(current_user, date_from, date_to, department_id)
@@ -257,96 +225,32 @@ def issue_return_tracker():
                          })
 
 def calculate_audit_summary(user, date_from=None, date_to=None, department_id=None):
-    """Calculate summary statistics for the audit dashboard"""
-    
-    # Base query for issued items
-    base_query = db.session.query(StockIssueLine).join(
-        StockIssueRequest
-    ).filter(
-        StockIssueRequest.status == RequestStatus.ISSUED,
-        StockIssueLine.quantity_issued.isnot(None),
-        StockIssueLine.quantity_issued > 0
-    )
-    
-    # Apply user role filter
-    if user.role == UserRole.HOD and user.managed_department:
-        base_query = base_query.filter(
-            StockIssueRequest.department_id == user.managed_department.id
-        )
-    
-    # Apply date filters
-    if date_from:
-        try:
-            date_from_obj = datetime.strptime(date_from, '%Y-%m-%d')
-            base_query = base_query.filter(StockIssueRequest.issued_at >= date_from_obj)
-        except ValueError:
-            pass
-    
-    if date_to:
-        try:
-            date_to_obj = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1)
-            base_query = base_query.filter(StockIssueRequest.issued_at < date_to_obj)
-        except ValueError:
-            pass
+    """Calculate summary statistics for the audit dashboard in one aggregate query"""
     
-    if department_id and user.role == UserRole.SUPERADMIN:
-        base_query = base_query.filter(StockIssueRequest.department_id == department_id)
-    
-    # Calculate statistics
-    total_items_issued = base_query.count()
-    total_quantity_issued = base_query.with_entities(
-        func.sum(StockIssueLine.quantity_issued)
-    ).scalar() or 0
-    
-    # Items with returns
-    items_with_returns = base_query.join(
-        StockReturn, StockIssueLine.id == StockReturn.issue_line_id
-    ).filter(
-        StockReturn.status == ReturnStatus.COMPLETED
-    ).with_entities(StockIssueLine.id).distinct().count()
-    
-    # Total returned quantity
-    total_returned = db.session.query(
-        func.sum(StockReturn.quantity_returned)
-    ).join(
-        StockIssueLine, StockReturn.issue_line_id == StockIssueLine.id
+    # Issued lines visible to the user under the tracker's filters
+    tracked = db.select(
+        StockIssueLine.quantity_issued.label('issued'),
+        StockIssueLine.quantity_returned_total.label('returned'),
+        overdue_filter().label('overdue')
     ).join(
         StockIssueRequest, StockIssueLine.request_id == StockIssueRequest.id
-    ).filter(
-        StockReturn.status == ReturnStatus.COMPLETED,
-        StockIssueRequest.status == RequestStatus.ISSUED
-    )
-    
-    # Apply same filters to return query
-    if user.role == UserRole.HOD and user.managed_department:
-        total_returned = total_returned.filter(
-            StockIssueRequest.department_id == user.managed_department.id
-        )
-    
-    if date_from:
-        try:
-            date_from_obj = datetime.strptime(date_from, '%Y-%m-%d')
-            total_returned = total_returned.filter(StockIssueRequest.issued_at >= date_from_obj)
-        except ValueError:
-            pass
-    
-    if date_to:
-        try:
-            date_to_obj = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1)
-            total_returned = total_returned.filter(StockIssueRequest.issued_at < date_to_obj)
-        except ValueError:
-            pass
-    
-    if department_id and user.role == UserRole.SUPERADMIN:
-        total_returned = total_returned.filter(StockIssueRequest.department_id == department_id)
-    
-    total_returned = total_returned.scalar() or 0
-    
-    # Overdue items (issued more than 30 days ago and not fully returned)
-    overdue_date = datetime.utcnow() - timedelta(days=30)
-    overdue_items = base_query.filter(
-        StockIssueRequest.issued_at < overdue_date
-    ).count()
+    ).where(
+        *tracked_line_filters(user, date_from, date_to, department_id)
+    ).cte('tracked_lines')
+    
+    totals = db.session.execute(db.select(
+        func.count().label('items'),
+        func.coalesce(func.sum(tracked.c.issued), 0).label('issued'),
+        func.count(case((tracked.c.returned > 0, 1))).label('items_with_returns'),
+        func.coalesce(func.sum(tracked.c.returned), 0).label('returned'),
+        func.count(case((tracked.c.overdue, 1))).label('overdue')
+    ).select_from(tracked)).one()
+    
+    total_items_issued = totals.items
+    total_quantity_issued = totals.issued
+    items_with_returns = totals.items_with_returns
+    total_returned = totals.returned
+    overdue_items = totals.overdue
     
     # Calculate percentages
     return_rate = round((items_with_returns / total_items_issued * 100) if total_items_issued > 0 else 0, 1)
@@ -0,0 +1,67 @@
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort, send_file
+from flask_login import login_required, current_user
+from models import ExportJob, ExportStatus
+from auth import role_required
+from database import db
+from exports import full_balance_filters
+from export_jobs import submit_export, can_access, EXPORTS
+
+export_jobs_bp = Blueprint('export_jobs', __name__)
+
+def _get_job(job_id):
+    job = db.session.get(ExportJob, job_id)
+    if not job:
+        abort(404)
+    if not can_access(job, current_user):
+        abort(403)
+    return job
+
+@export_jobs_bp.route('/', methods=['POST'])
+@login_required
+@role_required('superadmin', 'hod')
+def create_export():
+    """Queue a background export and show its progress page"""
+    kind = request.form.get('type', '')
+    if kind not in EXPORTS:
+        flash('Invalid export type', 'error')
+        return redirect(url_for('reports.dashboard'))
+
+    params = full_balance_filters(request.form) if kind == 'full_balance' else {}
+    job = submit_export(kind, params, current_user)
+    return redirect(url_for('export_jobs.job_status', job_id=job.id))
+
+@export_jobs_bp.route('/<int:job_id>')
+@login_required
+@role_required('superadmin', 'hod')
+def job_status(job_id):
+    job = _get_job(job_id)
+    return render_template('reports/export_job.html', job=job)
+
+@export_jobs_bp.route('/<int:job_id>/status')
+@login_required
+@role_required('superadmin', 'hod')
+def job_status_json(job_id):
+    job = _get_job(job_id)
+    return jsonify({
+        'id': job.id,
+        'status': job.status.value,
+        'row_count': job.row_count,
+        'error': job.error,
+        'download_url': url_for('export_jobs.download', job_id=job.id) if job.status == ExportStatus.DONE else None
+    })
+
+@export_jobs_bp.route('/<int:job_id>/download')
+@login_required
+@role_required('superadmin', 'hod')
+def download(job_id):
+    job = _get_job(job_id)
+    if job.status != ExportStatus.DONE:
+        flash('This export is not ready yet.', 'error')
+        return redirect(url_for('export_jobs.job_status', job_id=job.id))
+
+    try:
+        return send_file(job.file_path, mimetype='application/gzip', as_attachment=True,
+                         download_name=job.filename)
+    except FileNotFoundError:
+        flash('This export has expired. Please run it again.', 'error')
+        return redirect(url_for('reports.dashboard'))
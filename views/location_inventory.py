@@ -3,6 +3,7 @@ from flask_login import login_required, current_user
 from models import Location, StockBalance, Item
 from database import db
 from sqlalchemy import func
+import master_data
 
 location_inventory_bp = Blueprint('location_inventory', __name__)
 
@@ -29,9 +30,8 @@ def location_inventory():
 
     # Apply user access restrictions
     if current_user.role.value not in ['superadmin']:
-        accessible_warehouses = current_user.get_accessible_warehouses()
-        if accessible_warehouses:
-            warehouse_ids = [w.id for w in accessible_warehouses]
+        warehouse_ids = current_user.accessible_location_ids
+        if warehouse_ids:
             query = query.filter(Location.id.in_(warehouse_ids))
         else:
             # No warehouse access - show no data
@@ -96,11 +96,11 @@ def location_inventory():
     # Get filter options based on user permissions
     if current_user.role.value == 'superadmin':
         # Removed filter for is_active on Location as it does not exist
-        locations = Location.query.all()
+        locations = master_data.get_locations()
     else:
         locations = current_user.get_accessible_warehouses()
 
-    items = Item.query.all()
+    items = master_data.get_items()
 
 
     return render_template('location_inventory/inventory.html',
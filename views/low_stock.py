@@ -5,6 +5,7 @@ from models import Item, StockBalance, Location, Audit
 from auth import role_required
 from database import db
 from sqlalchemy import and_
+import master_data
 
 low_stock_bp = Blueprint('low_stock', __name__)
 
@@ -30,16 +31,15 @@ def alerts():
         query = query.filter(StockBalance.location_id == location_id)
     
     # Filter by user's accessible warehouses
-    if current_user.role != 'superadmin':
-        accessible_location_ids = [loc.id for loc in current_user.get_accessible_warehouses()]
-        if accessible_location_ids:
-            query = query.filter(StockBalance.location_id.in_(accessible_location_ids))
+    accessible_location_ids = current_user.accessible_location_ids
+    if accessible_location_ids:
+        query = query.filter(StockBalance.location_id.in_(accessible_location_ids))
     
     low_stock_items = query.order_by(StockBalance.quantity.asc()).all()
     
     # Get locations for filter
     if current_user.role == 'superadmin':
-        locations = Location.query.all()
+        locations = master_data.get_locations()
     else:
         locations = current_user.get_accessible_warehouses()
     
@@ -63,10 +63,9 @@ def summary():
     )
     
     # Filter by user's accessible warehouses
-    if current_user.role != 'superadmin':
-        accessible_location_ids = [loc.id for loc in current_user.get_accessible_warehouses()]
-        if accessible_location_ids:
-            query = query.filter(Location.id.in_(accessible_location_ids))
+    accessible_location_ids = current_user.accessible_location_ids
+    if accessible_location_ids:
+        query = query.filter(Location.id.in_(accessible_location_ids))
     
     summary_data = query.group_by(Location.id).all()
     
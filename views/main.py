@@ -6,6 +6,9 @@ from database import db
 from sqlalchemy import func, desc, asc
 from datetime import datetime, timedelta
 from utils import get_ist_now, format_ist_datetime
+from sql_functions import date_of
+import item_search
+from inventory import quantities
 
 main_bp = Blueprint('main', __name__)
 
@@ -31,12 +34,12 @@ def dashboard():
         # Admin users see all requests
         stats = {
             'todays_requests': StockIssueRequest.query.filter(
-                func.date(StockIssueRequest.created_at) == today
+                date_of(StockIssueRequest.created_at) == today
             ).count(),
             'approved_requests': StockIssueRequest.query.filter_by(status=RequestStatus.APPROVED).count(),
             'pending_approvals': StockIssueRequest.query.filter_by(status=RequestStatus.PENDING).count(),
             'todays_issued': StockIssueRequest.query.filter(
-                func.date(StockIssueRequest.issued_at) == today,
+                date_of(StockIssueRequest.issued_at) == today,
                 StockIssueRequest.status == RequestStatus.ISSUED
             ).count(),
             'low_stock_items': db.session.query(Item).join(StockBalance).filter(
@@ -348,6 +351,56 @@ def get_stock_balance(item_id, location_id):
     balance = stock_balance.quantity if stock_balance else 0
     return jsonify({'balance': float(balance)})
 
+# Upper bound on the lookups one bulk balance call may ask for
+MAX_BALANCE_LOOKUPS = 200
+
+@main_bp.route('/api/stock_balances')
+@login_required
+def get_stock_balances():
+    """Balances for many item/location pairs in one call
+
+    Pass ``pair=<item_id>:<location_id>`` repeatedly, or one ``location_id``
+    with repeated ``item_id``. Pairs in warehouses the user cannot access are
+    listed under ``denied`` instead of being looked up.
+    """
+    try:
+        pairs = [tuple(int(part) for part in pair.split(':')) for pair in request.args.getlist('pair')]
+        location_id = request.args.get('location_id', type=int)
+        if location_id:
+            pairs += [(int(item_id), location_id) for item_id in request.args.getlist('item_id')]
+    except ValueError:
+        return jsonify({'error': 'Pairs must be given as item_id:location_id'}), 400
+    if any(len(pair) != 2 for pair in pairs):
+        return jsonify({'error': 'Pairs must be given as item_id:location_id'}), 400
+    if len(pairs) > MAX_BALANCE_LOOKUPS:
+        return jsonify({'error': f'At most {MAX_BALANCE_LOOKUPS} balances per call'}), 400
+
+    accessible = current_user.accessible_warehouse_ids()
+    allowed = [pair for pair in pairs if accessible is None or pair[1] in accessible]
+    denied = sorted(set(pairs) - set(allowed))
+
+    balances = quantities(allowed)
+    return jsonify({
+        'balances': [{'item_id': item_id, 'location_id': loc_id, 'balance': float(quantity)}
+                     for (item_id, loc_id), quantity in sorted(balances.items())],
+        'denied': [{'item_id': item_id, 'location_id': loc_id} for item_id, loc_id in denied]
+    })
+
+@main_bp.route('/api/items/search')
+@login_required
+def api_item_search():
+    """Paged typeahead search over the items the user may pick"""
+    rows, has_more = item_search.search_items(
+        request.args.get('q', ''),
+        current_user,
+        page=request.args.get('page', 1, type=int),
+        per_page=request.args.get('per_page', item_search.DEFAULT_PAGE_SIZE, type=int)
+    )
+    return jsonify({
+        'results': [item_search.as_json(row) for row in rows],
+        'pagination': {'more': has_more}
+    })
+
 @main_bp.route('/api/items_by_location/<int:location_id>')
 @login_required
 def api_items_by_location(location_id):
@@ -4,6 +4,7 @@ from models import User, Department, Location, Item, Employee, UserRole, StockBa
 from auth import role_required
 from database import db
 from forms import ItemForm # Assuming ItemForm is defined in forms.py
+from master_data import bump_version
 
 # Mock Audit class for demonstration if not imported
 class Audit:
@@ -75,6 +76,7 @@ def create_department():
             details=f'Created department {code} - {name}'
         )
 
+        bump_version()
         db.session.commit()
         flash('Department created successfully. You can assign an HOD later if needed.', 'success')
 
@@ -134,6 +136,7 @@ def update_department(dept_id):
         hod_user.department_id = department.id
 
     try:
+        bump_version()
         db.session.commit()
         flash('Department updated successfully.', 'success')
     except Exception as e:
@@ -189,6 +192,7 @@ def assign_hod_to_department(dept_id):
             details=f'Updated HOD assignment for department {department.code}'
         )
 
+        bump_version()
         db.session.commit()
     except Exception as e:
         db.session.rollback()
@@ -245,6 +249,7 @@ def create_location():
             details=f'Created location {code} and auto-assigned to {len(superadmins_and_managers)} superadmin'
         )
 
+        bump_version()
         db.session.commit()
         flash('Location created successfully and auto-assigned to superadmins.', 'success')
     except Exception as e:
@@ -289,6 +294,7 @@ def update_location(location_id):
             details=f'Updated location {code}'
         )
 
+        bump_version()
         db.session.commit()
         flash('Location updated successfully.', 'success')
     except Exception as e:
@@ -314,6 +320,7 @@ def delete_location(location_id):
         )
 
         db.session.delete(location)
+        bump_version()
         db.session.commit()
         flash('Location deleted successfully.', 'success')
     except Exception as e:
@@ -511,6 +518,7 @@ def create_item():
         )
 
         db.session.add(item)
+        bump_version()
         db.session.commit()
 
         flash('Item created successfully.', 'success')
@@ -547,6 +555,7 @@ def edit_item(item_id):
         item.department_id = form.department_id.data if form.department_id.data != 0 else None
         item.low_stock_threshold = form.low_stock_threshold.data if form.low_stock_threshold.data is not None else 0
 
+        bump_version()
         db.session.commit()
 
         flash('Item updated successfully.', 'success')
@@ -618,6 +627,7 @@ def delete_item(item_id):
             )
 
             db.session.delete(item)
+            bump_version()
             db.session.commit()
             flash('Item deleted successfully.', 'success')
 
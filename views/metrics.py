@@ -0,0 +1,14 @@
+from flask import Blueprint, Response, request, current_app, abort
+import metrics as app_metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint (bearer token required when METRICS_TOKEN is set)"""
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        abort(401)
+
+    body, content_type = app_metrics.render()
+    return Response(body, content_type=content_type)
@@ -1,15 +1,24 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
-from models import Item, Location, StockEntry, StockBalance, Audit, StockIssueLine, StockIssueRequest
+from models import Item, Location, StockEntry, StockBalance, Audit, StockMovement
 from forms import StockEntryForm
 from database import db
 from auth import role_required
 from decimal import Decimal
-from datetime import datetime
+from datetime import datetime, timedelta
+from sqlalchemy.orm import joinedload
 from utils import get_ist_now
+from inventory import credit
+from ledger import movement_history, balance_after, reference_labels
+from pagination import paginate_query
+from exports import csv_response, STOCK_HISTORY_HEADER, stock_history_rows
+import master_data
 
 stock_entry_bp = Blueprint('stock_entry', __name__)
 
+HISTORY_PER_PAGE = 50
+HISTORY_KEYS = (('ts', StockMovement.ts, datetime.fromisoformat), ('id', StockMovement.id, int))
+
 @stock_entry_bp.route('/entry')
 @login_required
 def entry_form():
@@ -18,24 +27,17 @@ def entry_form():
         flash('You do not have permission to create stock entries.', 'error')
         return redirect(url_for('main.dashboard'))
 
-    # Filter items based on user's department for HODs
-    if current_user.role.value == 'hod' and current_user.managed_department:
-        items = Item.query.filter(
-            db.or_(Item.department_id == current_user.managed_department.id, Item.department_id.is_(None))
-        ).order_by(Item.code).all()
-    else:
-        items = Item.query.order_by(Item.code).all()
-
-    locations = Location.query.all()
+    # Items are loaded on demand from /api/items/search, which applies the department filter
+    locations = master_data.get_locations()
 
     # Get pre-selected values from URL parameters
-    selected_item_id = request.args.get('item_id')
+    selected_item_id = request.args.get('item_id', type=int)
+    selected_item = Item.query.get(selected_item_id) if selected_item_id else None
     selected_location_id = request.args.get('location_id')
 
     return render_template('stock/entry.html',
-                         items=items,
+                         selected_item=selected_item,
                          locations=locations,
-                         selected_item_id=selected_item_id,
                          selected_location_id=selected_location_id)
 
 @stock_entry_bp.route('/entry/create', methods=['POST'])
@@ -77,22 +79,16 @@ def create_entry():
 
     try:
         db.session.add(stock_entry)
+        db.session.flush()  # Get the entry ID for the ledger and audit log
 
-        # Update or create stock balance
-        stock_balance = StockBalance.query.filter_by(
+        credit(
             item_id=int(item_id),
-            location_id=int(location_id)
-        ).first()
-
-        if stock_balance:
-            stock_balance.quantity += quantity
-        else:
-            stock_balance = StockBalance(
-                item_id=int(item_id),
-                location_id=int(location_id),
-                quantity=quantity
-            )
-            db.session.add(stock_balance)
+            location_id=int(location_id),
+            quantity=quantity,
+            user_id=current_user.id,
+            reference_type='StockEntry',
+            reference_id=stock_entry.id
+        )
 
         # Log audit
         Audit.log(
@@ -148,26 +144,22 @@ def balances():
     # Show all balances including zero quantities
     balances = query.all()
 
-    locations = Location.query.all()
+    locations = master_data.get_locations()
 
     # Filter items based on user's department for dropdown
     if current_user.role.value == 'hod':
         if current_user.managed_department:
-            items = Item.query.filter(
-                db.or_(Item.department_id == current_user.managed_department.id, Item.department_id.is_(None))
-            ).all()
+            items = master_data.get_items(current_user.managed_department.id, include_unassigned=True)
         else:
             items = []
     elif current_user.role.value == 'employee':
         if current_user.department_id:
-            items = Item.query.filter(
-                db.or_(Item.department_id == current_user.department_id, Item.department_id.is_(None))
-            ).all()
+            items = master_data.get_items(current_user.department_id, include_unassigned=True)
         else:
             items = []
     else:
         # Superadmin and Manager can see all items
-        items = Item.query.all()
+        items = master_data.get_items()
 
     return render_template('stock/balances.html',
                          balances=balances,
@@ -191,10 +183,61 @@ def entries():
 @stock_entry_bp.route('/history/<int:item_id>/<int:location_id>')
 @login_required
 def stock_history(item_id, location_id):
+    item, location, denied = _history_access(item_id, location_id)
+    if denied:
+        return denied
+
+    date_from, date_to = _history_range()
+
+    # Read the ledger newest first, a page at a time
+    movements = movement_history(item_id, location_id, date_from, date_to)
+    history = paginate_query(movements.order_by(None).options(joinedload(StockMovement.user)), HISTORY_KEYS,
+                             request.args.get('page', 1, type=int), HISTORY_PER_PAGE,
+                             cursor=request.args.get('after'))
+
+    # Running balance after each movement, from one snapshot-based lookup for the newest row
+    rows = []
+    if history.items:
+        labels = reference_labels(history.items)
+        running = balance_after(history.items[0])
+        for movement in history.items:
+            rows.append((movement, labels[(movement.reference_type, movement.reference_id)], running))
+            running -= movement.quantity
+
+    # Get current stock balance
+    current_balance = StockBalance.query.filter_by(
+        item_id=item_id,
+        location_id=location_id
+    ).first()
+
+    return render_template('stock/history.html',
+                         item=item,
+                         location=location,
+                         history=history,
+                         rows=rows,
+                         date_from=request.args.get('date_from', ''),
+                         date_to=request.args.get('date_to', ''),
+                         current_balance=current_balance)
+
+@stock_entry_bp.route('/history/<int:item_id>/<int:location_id>/export')
+@login_required
+def export_stock_history(item_id, location_id):
+    """Stream the whole filtered history as CSV, not just the page on screen"""
+    item, location, denied = _history_access(item_id, location_id)
+    if denied:
+        return denied
+
+    date_from, date_to = _history_range()
+    filename = f'stock_history_{item.code}_{get_ist_now().strftime("%Y%m%d")}.csv'
+    return csv_response(filename, STOCK_HISTORY_HEADER,
+                        stock_history_rows(item_id, location_id, date_from, date_to))
+
+def _history_access(item_id, location_id):
+    """Load the item and location, or return a redirect if the user may not see their history"""
     # Check if user has permission to view this location
     if not current_user.can_access_warehouse(location_id):
         flash('You do not have permission to access this warehouse.', 'error')
-        return redirect(url_for('stock_entry.balances'))
+        return None, None, redirect(url_for('stock_entry.balances'))
 
     item = Item.query.get_or_404(item_id)
     location = Location.query.get_or_404(location_id)
@@ -204,47 +247,32 @@ def stock_history(item_id, location_id):
         if current_user.managed_department:
             if item.department_id and item.department_id != current_user.managed_department.id:
                 flash('You can only view items from your department.', 'error')
-                return redirect(url_for('stock_entry.balances'))
+                return None, None, redirect(url_for('stock_entry.balances'))
         else:
             flash('You do not have permission to view this item.', 'error')
-            return redirect(url_for('stock_entry.balances'))
+            return None, None, redirect(url_for('stock_entry.balances'))
     elif current_user.role.value == 'employee':
         if current_user.department_id:
             if item.department_id and item.department_id != current_user.department_id:
                 flash('You can only view items from your department.', 'error')
-                return redirect(url_for('stock_entry.balances'))
+                return None, None, redirect(url_for('stock_entry.balances'))
         else:
             flash('You do not have permission to view this item.', 'error')
-            return redirect(url_for('stock_entry.balances'))
+            return None, None, redirect(url_for('stock_entry.balances'))
 
-    # Get stock entries (additions)
-    stock_entries = StockEntry.query.filter_by(
-        item_id=item_id,
-        location_id=location_id
-    ).order_by(StockEntry.created_at.desc()).all()
-
-    # Get stock issues (deductions) - from StockIssueLine joined with StockIssueRequest
-    stock_issues = db.session.query(StockIssueLine, StockIssueRequest).join(
-        StockIssueRequest, StockIssueLine.request_id == StockIssueRequest.id
-    ).filter(
-        StockIssueLine.item_id == item_id,
-        StockIssueRequest.location_id == location_id,
-        StockIssueRequest.status == 'Issued',
-        StockIssueLine.quantity_issued.isnot(None)
-    ).order_by(StockIssueRequest.issued_at.desc()).all()
+    return item, location, None
 
-    # Get current stock balance
-    current_balance = StockBalance.query.filter_by(
-        item_id=item_id,
-        location_id=location_id
-    ).first()
+def _history_range():
+    """The date_from/date_to filter as [start, end) datetimes; the end day is inclusive"""
+    date_from = _parse_day(request.args.get('date_from'))
+    date_to = _parse_day(request.args.get('date_to'))
+    return date_from, date_to + timedelta(days=1) if date_to else None
 
-    return render_template('stock/history.html',
-                         item=item,
-                         location=location,
-                         stock_entries=stock_entries,
-                         stock_issues=stock_issues,
-                         current_balance=current_balance)
+def _parse_day(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d') if value else None
+    except ValueError:
+        return None
 
 @stock_entry_bp.route('/api/stock-balance/<int:item_id>/<int:location_id>')
 @login_required
@@ -1,10 +1,15 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort
 from flask_login import login_required, current_user
-from models import StockIssueRequest, StockIssueLine, Item, Location, Department, StockBalance, RequestStatus, Audit, UserRole
+from models import (StockIssueRequest, StockIssueLine, Item, Location, Department, StockBalance, RequestStatus, Audit, UserRole,
+                    REQUEST_FULL, REQUEST_LIST)
 from database import db
 from decimal import Decimal
 from utils import get_ist_now
 from auth import role_required
+from inventory import deduct_many, claim
+from request_validation import validate_lines
+from numbering import next_number, REQUEST
+import metrics
 from datetime import datetime
 stock_issue_bp = Blueprint('stock_issue', __name__)
 
@@ -17,10 +22,10 @@ def create_request():
 
     from forms import StockIssueRequestForm
     form = StockIssueRequestForm(user=current_user)
-    items = Item.query.order_by(Item.code).all()
+    # Items are loaded on demand from /api/items/search
     # Filter locations based on user's warehouse access
     locations = current_user.get_accessible_warehouses()
-    return render_template('stock/request_form.html', form=form, items=items, locations=locations)
+    return render_template('stock/request_form.html', form=form, locations=locations)
 
 @stock_issue_bp.route('/create', methods=['POST'])
 @login_required
@@ -42,7 +47,6 @@ def submit_request():
     # Get item data
     item_ids = request.form.getlist('item_id[]')
     quantities = request.form.getlist('quantity[]')
-    item_remarks = request.form.getlist('item_remarks[]')
 
     if not location_id or not purpose:
         flash('Location and purpose are required.', 'error')
@@ -52,67 +56,17 @@ def submit_request():
         flash('At least one item must be requested.', 'error')
         return redirect(url_for('stock_issue.create_request'))
 
-    # Validate quantities
-    valid_items = []
-    for i, (item_id, qty) in enumerate(zip(item_ids, quantities)):
-        if not item_id or not qty:
-            continue
-        try:
-            qty_decimal = Decimal(qty)
-            if qty_decimal <= 0:
-                flash(f'Invalid quantity for item {i+1}.', 'error')
-                return redirect(url_for('stock_issue.create_request'))
-            valid_items.append((int(item_id), qty_decimal, item_remarks[i] if i < len(item_remarks) else ''))
-        except (ValueError, TypeError):
-            flash(f'Invalid quantity for item {i+1}.', 'error')
-            return redirect(url_for('stock_issue.create_request'))
-
-    if not valid_items:
-        flash('No valid items found in the request.', 'error')
-        return redirect(url_for('stock_issue.create_request'))
-
-    # Validate stock availability for each item
-    stock_validation_errors = []
-    for item_id, quantity, _ in valid_items:
-        stock_balance = StockBalance.query.filter_by(
-            item_id=item_id,
-            location_id=int(location_id)
-        ).first()
-
-        available_qty = stock_balance.quantity if stock_balance else Decimal('0')
-        item = Item.query.get(item_id)
-
-        if available_qty <= 0:
-            stock_validation_errors.append(f"{item.name} ({item.code}) is out of stock at the selected location.")
-        elif available_qty < quantity:
-            stock_validation_errors.append(f"{item.name} ({item.code}) has insufficient stock. Available: {available_qty}, Requested: {quantity}")
-
-    if stock_validation_errors:
-        for error in stock_validation_errors:
+    # Validate quantities and stock for all lines at once
+    valid_items, errors = validate_lines(request.form, int(location_id))
+    if errors:
+        for error in errors:
             flash(error, 'error')
         return redirect(url_for('stock_issue.create_request'))
 
     try:
-        # Generate request number first
-        today = datetime.utcnow()
-        prefix = f"REQ{today.strftime('%Y%m%d')}"
-
-        # Find the last request number for today
-        last_request = db.session.query(StockIssueRequest).filter(
-            StockIssueRequest.request_no.like(f"{prefix}%")
-        ).order_by(StockIssueRequest.request_no.desc()).first()
-
-        if last_request:
-            last_seq = int(last_request.request_no[-3:])
-            new_seq = last_seq + 1
-        else:
-            new_seq = 1
-
-        request_no = f"{prefix}{new_seq:03d}"
-
         # Create the request
         request_obj = StockIssueRequest(
-            request_no=request_no,
+            request_no=next_number(REQUEST),
             requester_id=current_user.id,
             department_id=current_user.department_id or 1,  # Default to first department for admin
             location_id=int(location_id),
@@ -160,8 +114,10 @@ def submit_request():
         )
 
         db.session.commit()
+        metrics.record_event(metrics.CREATED)
 
         if request_obj.status == RequestStatus.APPROVED:
+            metrics.record_event(metrics.APPROVED)
             flash(f'Request {request_obj.request_no} created and auto-approved.', 'success')
         else:
             flash(f'Request {request_obj.request_no} created successfully.', 'success')
@@ -176,11 +132,7 @@ def submit_request():
 @stock_issue_bp.route('/<int:request_id>')
 @login_required
 def view_request(request_id):
-    from sqlalchemy.orm import joinedload
-    from models import StockIssueLine, StockReturn
-    request_obj = StockIssueRequest.query.options(
-        joinedload(StockIssueRequest.issue_lines).joinedload(StockIssueLine.returns)
-    ).get_or_404(request_id)
+    request_obj = StockIssueRequest.query.options(*REQUEST_FULL).get_or_404(request_id)
 
     # Check access permissions
     if (current_user.role == UserRole.EMPLOYEE and
@@ -275,6 +227,11 @@ def process_issue(request_id):
         flash('Only approved requests can be issued.', 'error')
         return redirect(url_for('stock_issue.view_request', request_id=request_id))
 
+    # Hold the request for this transaction so it cannot be issued twice
+    if claim(StockIssueRequest.query.filter_by(id=request_id, status=RequestStatus.APPROVED)) is None:
+        flash('This request is already being issued.', 'error')
+        return redirect(url_for('stock_issue.view_request', request_id=request_id))
+
     # Get issued quantities
     line_ids = request.form.getlist('line_id[]')
     issued_quantities = request.form.getlist('quantity_issued[]')
@@ -284,7 +241,9 @@ def process_issue(request_id):
         return redirect(url_for('stock_issue.issue_form', request_id=request_id))
 
     try:
-        # Validate and process each line
+        # Validate each line and collect the deductions
+        deductions = []
+        lines_by_id = {}
         for line_id, issued_qty in zip(line_ids, issued_quantities):
             if not line_id or not issued_qty:
                 continue
@@ -302,46 +261,22 @@ def process_issue(request_id):
                 flash(f'Issued quantity cannot exceed requested quantity for {line.item.name}.', 'error')
                 return redirect(url_for('stock_issue.issue_form', request_id=request_id))
 
-            # Check stock availability
-            stock_balance = StockBalance.query.filter_by(
-                item_id=line.item_id,
-                location_id=request_obj.location_id
-            ).first()
-
-            available_qty = stock_balance.quantity if stock_balance else Decimal('0')
-
-            # Prevent issuing if no stock or insufficient stock
-            if available_qty <= 0:
-                flash(f'{line.item.name} ({line.item.code}) is out of stock at the selected location.', 'error')
-                return redirect(url_for('stock_issue.issue_form', request_id=request_id))
-
-            if available_qty < issued_decimal:
-                flash(f'Insufficient stock for {line.item.name} ({line.item.code}). Available: {available_qty}, Requested: {issued_decimal}', 'error')
-                return redirect(url_for('stock_issue.issue_form', request_id=request_id))
-
-            # Only proceed if we have sufficient stock
             if issued_decimal > 0:
-                # Update line with issued quantity
                 line.quantity_issued = issued_decimal
+                deductions.append((line.item_id, issued_decimal, line.id))
+                lines_by_id[line.id] = line
 
-                # Deduct from stock balance
-                stock_balance.quantity -= issued_decimal
-
-        # Final validation: ensure no negative stock balances before committing
-        negative_stock_items = []
-        for line in request_obj.issue_lines:
-            if line.quantity_issued and line.quantity_issued > 0:
-                stock_balance = StockBalance.query.filter_by(
-                    item_id=line.item_id,
-                    location_id=request_obj.location_id
-                ).first()
-
-                if stock_balance and stock_balance.quantity < 0:
-                    negative_stock_items.append(line.item.name)
-
-        if negative_stock_items:
+        # Each deduction is a conditional UPDATE, so a concurrent issue can never overdraw stock
+        shortages = deduct_many(request_obj.location_id, deductions,
+                                user_id=current_user.id, reference_type='StockIssueLine')
+        if shortages:
             db.session.rollback()
-            flash(f'Cannot complete issue: would result in negative stock for {", ".join(negative_stock_items)}', 'error')
+            for shortage in shortages:
+                item = lines_by_id[shortage.reference].item
+                if shortage.available <= 0:
+                    flash(f'{item.name} ({item.code}) is out of stock at the selected location.', 'error')
+                else:
+                    flash(f'Insufficient stock for {item.name} ({item.code}). Available: {shortage.available}, Requested: {shortage.requested}', 'error')
             return redirect(url_for('stock_issue.issue_form', request_id=request_id))
 
         # Update request status
@@ -359,6 +294,7 @@ def process_issue(request_id):
         )
 
         db.session.commit()
+        metrics.record_event(metrics.ISSUED)
         flash('Stock issued successfully.', 'success')
         return redirect(url_for('stock_issue.view_request', request_id=request_id))
 
@@ -426,11 +362,9 @@ def edit_request(request_id):
         flash('Only draft requests can be edited.', 'error')
         return redirect(url_for('stock_issue.view_request', request_id=request_id))
 
-    items = Item.query.order_by(Item.code).all()
     locations = current_user.get_accessible_warehouses()
     return render_template('stock/edit_request.html',
                          request=request_obj,
-                         items=items,
                          locations=locations)
 
 @stock_issue_bp.route('/<int:request_id>/edit', methods=['POST'])
@@ -460,7 +394,6 @@ def update_request(request_id):
     # Get item data
     item_ids = request.form.getlist('item_id[]')
     quantities = request.form.getlist('quantity[]')
-    item_remarks = request.form.getlist('item_remarks[]')
 
     if not location_id or not purpose:
         flash('Location and purpose are required.', 'error')
@@ -470,43 +403,10 @@ def update_request(request_id):
         flash('At least one item must be requested.', 'error')
         return redirect(url_for('stock_issue.edit_request', request_id=request_id))
 
-    # Validate quantities
-    valid_items = []
-    for i, (item_id, qty) in enumerate(zip(item_ids, quantities)):
-        if not item_id or not qty:
-            continue
-        try:
-            qty_decimal = Decimal(qty)
-            if qty_decimal <= 0:
-                flash(f'Invalid quantity for item {i+1}.', 'error')
-                return redirect(url_for('stock_issue.edit_request', request_id=request_id))
-            valid_items.append((int(item_id), qty_decimal, item_remarks[i] if i < len(item_remarks) else ''))
-        except (ValueError, TypeError):
-            flash(f'Invalid quantity for item {i+1}.', 'error')
-            return redirect(url_for('stock_issue.edit_request', request_id=request_id))
-
-    if not valid_items:
-        flash('No valid items found in the request.', 'error')
-        return redirect(url_for('stock_issue.edit_request', request_id=request_id))
-
-    # Validate stock availability for each item
-    stock_validation_errors = []
-    for item_id, quantity, _ in valid_items:
-        stock_balance = StockBalance.query.filter_by(
-            item_id=item_id,
-            location_id=int(location_id)
-        ).first()
-
-        available_qty = stock_balance.quantity if stock_balance else Decimal('0')
-        item = Item.query.get(item_id)
-
-        if available_qty <= 0:
-            stock_validation_errors.append(f"{item.name} ({item.code}) is out of stock at the selected location.")
-        elif available_qty < quantity:
-            stock_validation_errors.append(f"{item.name} ({item.code}) has insufficient stock. Available: {available_qty}, Requested: {quantity}")
-
-    if stock_validation_errors:
-        for error in stock_validation_errors:
+    # Validate quantities and stock for all lines at once
+    valid_items, errors = validate_lines(request.form, int(location_id))
+    if errors:
+        for error in errors:
             flash(error, 'error')
         return redirect(url_for('stock_issue.edit_request', request_id=request_id))
 
@@ -630,7 +530,7 @@ def delete_request(request_id):
 @login_required
 def my_requests():
     page = request.args.get('page', 1, type=int)
-    requests = StockIssueRequest.query.filter_by(
+    requests = StockIssueRequest.query.options(*REQUEST_LIST).filter_by(
         requester_id=current_user.id
     ).order_by(StockIssueRequest.created_at.desc()).paginate(
         page=page, per_page=20, error_out=False
@@ -640,7 +540,7 @@ def my_requests():
 @stock_issue_bp.route('/<int:request_id>/print')
 @login_required
 def print_approved_request(request_id):
-    request_obj = StockIssueRequest.query.get_or_404(request_id)
+    request_obj = StockIssueRequest.query.options(*REQUEST_FULL).get_or_404(request_id)
 
     # Check if the request is approved or issued
     if request_obj.status not in [RequestStatus.APPROVED, RequestStatus.ISSUED]:
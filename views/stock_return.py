@@ -1,10 +1,15 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort
 from flask_login import login_required, current_user
-from models import StockReturn, StockIssueLine, StockIssueRequest, Item, Location, StockBalance, ReturnStatus, RequestStatus, Audit, UserRole
+from models import (StockReturn, StockIssueLine, StockIssueRequest, Item, Location, StockBalance, ReturnStatus, RequestStatus,
+                    Audit, UserRole)
+from sqlalchemy.orm import joinedload
 from database import db
 from decimal import Decimal
 from utils import get_ist_now
 from auth import role_required
+from inventory import complete_return, claim
+from numbering import next_number, RETURN
+import metrics
 from datetime import datetime, timedelta
 
 stock_return_bp = Blueprint('stock_return', __name__)
@@ -13,35 +18,26 @@ stock_return_bp = Blueprint('stock_return', __name__)
 @login_required
 def create_return():
     """Show form to create a new stock return"""
-    # Get issued requests for current user or all if superadmin
-    if current_user.role == UserRole.SUPERADMIN:
-        issued_requests = StockIssueRequest.query.filter_by(
-            status=RequestStatus.ISSUED
-        ).order_by(StockIssueRequest.issued_at.desc()).all()
-    else:
-        issued_requests = StockIssueRequest.query.filter_by(
-            requester_id=current_user.id,
-            status=RequestStatus.ISSUED
-        ).order_by(StockIssueRequest.issued_at.desc()).all()
+    # Issued requests (the user's own, or all for superadmin) with at least one returnable line
+    returnable_lines = StockIssueLine.returnable_query(
+        requester_id=None if current_user.role == UserRole.SUPERADMIN else current_user.id
+    )
+    issued_requests = StockIssueRequest.query.options(joinedload(StockIssueRequest.location)).filter(
+        StockIssueRequest.id.in_(returnable_lines.with_entities(StockIssueLine.request_id))
+    ).order_by(StockIssueRequest.issued_at.desc()).all()
 
-    # Filter out requests that have returnable items and calculate days since issue
-    returnable_requests = []
+    # Calculate days since issue
     current_time = get_ist_now()
     for request in issued_requests:
-        returnable_lines = [line for line in request.issue_lines if line.is_returnable]
-        if returnable_lines:
-            # Calculate days since issue in IST
-            if request.issued_at:
-                # Convert issued_at to IST and calculate difference
-                from utils import convert_to_ist
-                issued_at_ist = convert_to_ist(request.issued_at)
-                days_diff = (current_time - issued_at_ist).days
-                request.days_since_issue = days_diff
-            else:
-                request.days_since_issue = 0
-            returnable_requests.append(request)
-
-    return render_template('stock/return_form.html', issued_requests=returnable_requests)
+        if request.issued_at:
+            # Convert issued_at to IST and calculate difference
+            from utils import convert_to_ist
+            issued_at_ist = convert_to_ist(request.issued_at)
+            request.days_since_issue = (current_time - issued_at_ist).days
+        else:
+            request.days_since_issue = 0
+
+    return render_template('stock/return_form.html', issued_requests=issued_requests)
 
 @stock_return_bp.route('/select-issue', methods=['POST'])
 @login_required
@@ -72,7 +68,9 @@ def select_issue():
         return redirect(url_for('stock_return.create_return'))
 
     # Get returnable items
-    returnable_lines = [line for line in stock_request.issue_lines if line.is_returnable]
+    returnable_lines = StockIssueLine.returnable_query().filter(
+        StockIssueLine.request_id == stock_request.id
+    ).options(joinedload(StockIssueLine.item)).order_by(StockIssueLine.id).all()
 
     if not returnable_lines:
         flash('No items are available for return from this request.', 'warning')
@@ -122,7 +120,9 @@ def search_issue():
         return redirect(url_for('stock_return.create_return'))
 
     # Get returnable items
-    returnable_lines = [line for line in stock_request.issue_lines if line.is_returnable]
+    returnable_lines = StockIssueLine.returnable_query().filter(
+        StockIssueLine.request_id == stock_request.id
+    ).options(joinedload(StockIssueLine.item)).order_by(StockIssueLine.id).all()
 
     if not returnable_lines:
         flash('No items are available for return from this request.', 'warning')
@@ -189,24 +189,8 @@ def submit_return():
         # Create return records
         return_records = []
         for issue_line, quantity in valid_returns:
-            # Generate return number
-            today = datetime.utcnow()
-            prefix = f"RET{today.strftime('%Y%m%d')}"
-
-            last_return = db.session.query(StockReturn).filter(
-                StockReturn.return_no.like(f"{prefix}%")
-            ).order_by(StockReturn.return_no.desc()).first()
-
-            if last_return:
-                last_seq = int(last_return.return_no[-3:])
-                new_seq = last_seq + 1
-            else:
-                new_seq = 1
-
-            return_no = f"{prefix}{new_seq:03d}"
-
             stock_return = StockReturn(
-                return_no=return_no,
+                return_no=next_number(RETURN),
                 issue_line_id=issue_line.id,
                 returned_by=current_user.id,
                 quantity_returned=quantity,
@@ -222,25 +206,11 @@ def submit_return():
         # Auto-process if user is superadmin
         if current_user.role == UserRole.SUPERADMIN:
             for stock_return in return_records:
-                stock_return.status = ReturnStatus.COMPLETED
-                stock_return.processed_by = current_user.id
-                stock_return.processed_at = datetime.utcnow()
-
-                # Update stock balance
-                stock_balance = StockBalance.query.filter_by(
-                    item_id=stock_return.issue_line.item_id,
-                    location_id=stock_return.issue_line.request.location_id
-                ).first()
-
-                if stock_balance:
-                    stock_balance.quantity += stock_return.quantity_returned
-                else:
-                    stock_balance = StockBalance(
-                        item_id=stock_return.issue_line.item_id,
-                        location_id=stock_return.issue_line.request.location_id,
-                        quantity=stock_return.quantity_returned
-                    )
-                    db.session.add(stock_balance)
+                if not complete_return(stock_return, current_user.id):
+                    db.session.rollback()
+                    flash(f'Cannot return {stock_return.quantity_returned} of {stock_return.issue_line.item.name}: '
+                          f'it exceeds the quantity still out.', 'error')
+                    return redirect(url_for('stock_return.create_return'))
 
         # Log audit
         for stock_return in return_records:
@@ -255,6 +225,7 @@ def submit_return():
         db.session.commit()
 
         if current_user.role == UserRole.SUPERADMIN:
+            metrics.record_event(metrics.RETURNED, len(return_records))
             flash(f'{len(return_records)} return(s) created and auto-processed.', 'success')
         else:
             flash(f'{len(return_records)} return(s) created and submitted for processing.', 'success')
@@ -321,26 +292,15 @@ def process_return(return_id):
 
     try:
         if action == 'approve':
-            stock_return.status = ReturnStatus.COMPLETED
-            stock_return.processed_by = current_user.id
-            stock_return.processed_at = datetime.utcnow()
-            stock_return.remarks = remarks
+            # Hold the return for this transaction so it cannot be credited twice
+            if claim(StockReturn.query.filter_by(id=return_id, status=ReturnStatus.PENDING)) is None:
+                flash(f'Return {stock_return.return_no} is already being processed.', 'error')
+                return redirect(url_for('stock_return.pending_returns'))
 
-            # Update stock balance
-            stock_balance = StockBalance.query.filter_by(
-                item_id=stock_return.issue_line.item_id,
-                location_id=stock_return.issue_line.request.location_id
-            ).first()
-
-            if stock_balance:
-                stock_balance.quantity += stock_return.quantity_returned
-            else:
-                stock_balance = StockBalance(
-                    item_id=stock_return.issue_line.item_id,
-                    location_id=stock_return.issue_line.request.location_id,
-                    quantity=stock_return.quantity_returned
-                )
-                db.session.add(stock_balance)
+            if not complete_return(stock_return, current_user.id, remarks=remarks):
+                db.session.rollback()
+                flash(f'Return {stock_return.return_no} exceeds the quantity still out on its issue line.', 'error')
+                return redirect(url_for('stock_return.pending_returns'))
 
             # Log audit
             Audit.log(
@@ -375,6 +335,8 @@ def process_return(return_id):
             flash(f'Return {stock_return.return_no} rejected.', 'success')
 
         db.session.commit()
+        if action == 'approve':
+            metrics.record_event(metrics.RETURNED)
 
     except Exception as e:
         db.session.rollback()